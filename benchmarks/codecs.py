@@ -0,0 +1,128 @@
+""" Measures User encode and decode throughput for every installed codec """
+
+import argparse
+import dataclasses
+import json
+import sys
+import time
+from typing import Any, Callable, Dict, List, Tuple
+
+from benchmarks import harness
+from data_types import User
+from storage.binary import decode_user, encode_user
+from storage.codec import CODECS, Codec
+
+
+def _best_of(repeat: int, run: Callable[[], Any]) -> Tuple[float, Any]:
+    """
+    Times a callable several times and keeps the fastest run
+    Args:
+        repeat: int number of runs
+        run: Callable[[], Any] to time
+
+    Returns:
+        Tuple[float, Any] fastest wall time in seconds and the last result
+    """
+    best: float = float("inf")
+    result: Any = None
+    for _ in range(repeat):
+        started: float = time.perf_counter()
+        result = run()
+        best = min(best, time.perf_counter() - started)
+    return best, result
+
+
+def _legacy_encode(users: List[User]) -> bytes:
+    # The stats file as it was written before codecs: asdict and indented stdlib JSON
+    records: Dict[str, Dict] = {}
+    for user in users:
+        data: Dict = dataclasses.asdict(user)
+        data.pop("name")
+        records[user.name] = data
+    return json.dumps(records, indent=4).encode("utf-8")
+
+
+def _codec_encode(codec: Codec, users: List[User]) -> bytes:
+    records: Dict[str, Dict] = {}
+    for user in users:
+        records.update(user.to_dict())
+    return codec.dumps(records)
+
+
+def _codec_decode(codec: Codec, data: bytes) -> List[User]:
+    return [User.from_dict(name, values) for name, values in codec.loads(data).items()]
+
+
+def _measure(
+    name: str,
+    encode: Callable[[], Any],
+    decode: Callable[[Any], Any],
+    size: Callable[[Any], int],
+    count: int,
+    repeat: int,
+) -> harness.Results:
+    encode_s, encoded = _best_of(repeat, encode)
+    decode_s, _ = _best_of(repeat, lambda: decode(encoded))
+    print(f"{name}: encode {encode_s:.3f}s decode {decode_s:.3f}s", file=sys.stderr)
+    return {
+        f"encode[{name}]": {
+            "users_per_s": count / encode_s,
+            "bytes_per_user": size(encoded) / count,
+        },
+        f"decode[{name}]": {"users_per_s": count / decode_s},
+    }
+
+
+def main() -> None:
+    """
+    Encodes and decodes a full set of synthetic users with each installed codec,
+    the pre-codec asdict path, and the binary record format, reporting users per
+    second and encoded size
+    Returns:
+        None
+    """
+    parser = harness.argument_parser("Benchmark stats codecs.")
+    parser.add_argument("--users", type=int, default=100000, help="Users to encode")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per measurement")
+    args: argparse.Namespace = parser.parse_args()
+
+    users: List[User] = [User(f"chatter_{index}") for index in range(args.users)]
+    results: harness.Results = {}
+
+    results.update(
+        _measure(
+            "legacy",
+            lambda: _legacy_encode(users),
+            lambda data: _codec_decode(CODECS["json"], data),
+            len,
+            args.users,
+            args.repeat,
+        )
+    )
+    for name, codec in CODECS.items():
+        results.update(
+            _measure(
+                name,
+                lambda codec=codec: _codec_encode(codec, users),
+                lambda data, codec=codec: _codec_decode(codec, data),
+                len,
+                args.users,
+                args.repeat,
+            )
+        )
+    results.update(
+        _measure(
+            "binary",
+            lambda: [(user.name, encode_user(user)) for user in users],
+            lambda records: [decode_user(name, data) for name, data in records],
+            lambda records: sum(len(data) for _, data in records),
+            args.users,
+            args.repeat,
+        )
+    )
+
+    sys.exit(harness.finish(results, args))
+
+
+if __name__ == "__main__":
+    main()
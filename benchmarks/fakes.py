@@ -0,0 +1,220 @@
+""" Stand-ins for twitch.Chat and twitch.Helix so the bot can run without Twitch """
+
+import itertools
+import os
+import tempfile
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import dataclass
+from threading import Lock
+from typing import Callable, Deque, Dict, Iterator, List, Optional
+
+import twitch
+
+from bot import Twitchy
+from storage import UserStore
+from util.slots import slotted
+
+OWNER: str = "replay_owner"
+BOT_NAME: str = "replay_bot"
+CHANNEL: str = "#replay"
+# Chat lines that are not commands
+CHAT: List[str] = [
+    "hello chat",
+    "that was a great play",
+    "LUL",
+    "what game is this?",
+    "gg",
+]
+
+
+@slotted
+@dataclass
+class FakeUser:
+    """
+    The parts of a Helix user the bot reads
+    """
+
+    id: str
+    login: str
+    display_name: str
+
+
+class FakeApi:
+    """
+    Answers Helix API requests with canned responses
+    """
+
+    def __init__(self, chatters: List[str], user: Callable[[str], "FakeUser"]) -> None:
+        """
+        Args:
+            chatters: List[str] names listed by /chat/chatters
+            user: Callable[[str], FakeUser] giving each listed name its user
+        """
+        self.chatters: List[str] = chatters
+        self.requests: int = 0
+        self._user: Callable[[str], FakeUser] = user
+
+    def get(self, path: str, params: Optional[Dict] = None) -> Dict:
+        """
+        Serves a GET request
+        Args:
+            path: str API path
+            params: Optional[Dict] query parameters, paginating /chat/chatters
+
+        Returns:
+            Dict response body
+        """
+        self.requests += 1
+        if path != "/chat/chatters":
+            return {"data": []}
+        params = params or {}
+        start: int = int(params.get("after", 0))
+        end: int = start + int(params.get("first", 100))
+        return {
+            "data": [
+                {
+                    "user_id": user.id,
+                    "user_login": user.login,
+                    "user_name": user.display_name,
+                }
+                for user in map(self._user, self.chatters[start:end])
+            ],
+            "pagination": {"cursor": str(end)} if end < len(self.chatters) else {},
+            "total": len(self.chatters),
+        }
+
+
+class FakeHelix:
+    """
+    Helix client handing out users without any network requests
+    """
+
+    def __init__(self, chatters: Optional[List[str]] = None) -> None:
+        """
+        Args:
+            chatters: Optional[List[str]] names listed by /chat/chatters
+        """
+        self._users: Dict[str, FakeUser] = {}
+        self._ids = itertools.count(1)
+        self._mutex: Lock = Lock()
+        self.api: FakeApi = FakeApi(chatters or [], self.user)
+
+    def user(self, name: str) -> FakeUser:
+        """
+        Gets a user by name, creating it on first use
+        Args:
+            name: str display name
+
+        Returns:
+            FakeUser
+        """
+        user: Optional[FakeUser] = self._users.get(name)
+        if user is None:
+            with self._mutex:
+                user = self._users.setdefault(
+                    name, FakeUser(str(next(self._ids)), name.lower(), name)
+                )
+        return user
+
+
+class FakeChat:
+    """
+    Chat connection that delivers injected messages to subscribers and records what
+    the bot sends instead of writing to IRC
+    """
+
+    def __init__(self, channel: str, helix: FakeHelix, keep: int = 1000) -> None:
+        """
+        Args:
+            channel: str channel name
+            helix: FakeHelix attached to messages
+            keep: int most recent sent lines to remember
+        """
+        self.channel: str = channel
+        self.helix: FakeHelix = helix
+        self.sent: Deque[str] = deque(maxlen=keep)
+        self.sent_count: int = 0
+        self._subscribers: List[Callable[[twitch.chat.Message], None]] = []
+
+    def subscribe(self, callback: Callable[[twitch.chat.Message], None]) -> None:
+        """
+        Registers a callback for incoming messages
+        Args:
+            callback: Callable[[twitch.chat.Message], None]
+
+        Returns:
+            None
+        """
+        self._subscribers.append(callback)
+
+    def send(self, text: str) -> None:
+        """
+        Records a line the bot sent to chat
+        Args:
+            text: str line
+
+        Returns:
+            None
+        """
+        self.sent.append(text)
+        self.sent_count += 1
+
+    def inject(self, sender: str, text: str) -> None:
+        """
+        Delivers a message to every subscriber as if it arrived from chat
+        Args:
+            sender: str name of the chatter
+            text: str message
+
+        Returns:
+            None
+        """
+        message: twitch.chat.Message = twitch.chat.Message(
+            self.channel, sender, text, self.helix, self
+        )
+        for callback in self._subscribers:
+            callback(message)
+
+
+def fake_bot(chat: FakeChat, store: UserStore, moderator: bool = False) -> Twitchy:
+    """
+    Starts a Twitchy connected to a fake chat. Its stats are written relative to the
+    working directory.
+    Args:
+        chat: FakeChat to connect to
+        store: UserStore for the bot's stats, not yet loaded
+        moderator: bool whether the bot sends at the moderator rate
+
+    Returns:
+        Twitchy
+    """
+    return Twitchy(
+        OWNER,
+        chat.channel,
+        BOT_NAME,
+        "oauth",
+        "client_id",
+        "client_secret",
+        store,
+        moderator,
+        chat,
+    )
+
+
+@contextmanager
+def scratch_directory() -> Iterator[str]:
+    """
+    Runs the enclosed code in a temporary working directory with an empty .data
+    directory, so a bot's stats never touch the real ones
+    Returns:
+        Iterator[str] path of the directory
+    """
+    working_directory: str = os.getcwd()
+    with tempfile.TemporaryDirectory() as directory:
+        os.makedirs(os.path.join(directory, ".data"))
+        os.chdir(directory)
+        try:
+            yield directory
+        finally:
+            os.chdir(working_directory)
@@ -0,0 +1,168 @@
+""" Shared plumbing for the benchmark suites: isolation, result files, comparison """
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+from typing import Dict, List, Optional, Sequence
+
+Results = Dict[str, Dict[str, float]]
+
+REPO_ROOT: str = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def peak_rss_kb() -> int:
+    """
+    Gets the peak resident set size of the current process
+    Returns:
+        int kilobytes
+    """
+    usage: int = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return usage // 1024 if sys.platform == "darwin" else usage
+
+
+def run_isolated(module: str, args: Sequence[str], cwd: str) -> Dict[str, float]:
+    """
+    Runs one measurement in a fresh interpreter so import caches and peak RSS from
+    earlier measurements cannot leak into it. The child must print its measurement
+    as a JSON object on its last line of output.
+    Args:
+        module: str module to run with 'python -m'
+        args: Sequence[str] arguments for the module
+        cwd: str working directory of the child
+
+    Returns:
+        Dict[str, float]
+    """
+    env: Dict[str, str] = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(
+        path for path in (REPO_ROOT, env.get("PYTHONPATH")) if path
+    )
+    completed = subprocess.run(
+        [sys.executable, "-m", module, *args],
+        cwd=cwd,
+        env=env,
+        check=True,
+        stdout=subprocess.PIPE,
+        universal_newlines=True,
+    )
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def save(results: Results, path: str) -> None:
+    """
+    Writes benchmark results as JSON
+    Args:
+        results: Results to write
+        path: str output file
+
+    Returns:
+        None
+    """
+    with open(path, "w") as file:
+        file.write(json.dumps(results, indent=4, sort_keys=True))
+
+
+def load(path: str) -> Results:
+    """
+    Reads benchmark results written by save
+    Args:
+        path: str results file
+
+    Returns:
+        Results
+    """
+    with open(path, "r") as file:
+        return json.loads(file.read())
+
+
+def compare(current: Results, baseline: Results, threshold: float) -> List[str]:
+    """
+    Finds metrics that got worse than the baseline by more than a threshold. Every
+    metric is treated as lower-is-better unless its name ends in '_per_s'.
+    Args:
+        current: Results just measured
+        baseline: Results to compare against
+        threshold: float allowed relative change, e.g. 0.1 for 10%
+
+    Returns:
+        List[str] describing each regression
+    """
+    regressions: List[str] = []
+    for name, metrics in sorted(current.items()):
+        for metric, value in sorted(metrics.items()):
+            previous: Optional[float] = baseline.get(name, {}).get(metric)
+            if not previous:
+                continue
+            change: float = (value - previous) / previous
+            if metric.endswith("_per_s"):
+                change = -change
+            if change > threshold:
+                regressions.append(
+                    f"{name} {metric}: {previous:.6g} -> {value:.6g} "
+                    f"({change:+.1%} worse)"
+                )
+    return regressions
+
+
+def report(results: Results, baseline: Optional[Results] = None) -> None:
+    """
+    Prints results as a table, with the relative change against a baseline
+    Args:
+        results: Results to print
+        baseline: Optional[Results] to show changes against
+
+    Returns:
+        None
+    """
+    for name, metrics in sorted(results.items()):
+        cells: List[str] = []
+        for metric, value in sorted(metrics.items()):
+            cell: str = f"{metric}={value:.6g}"
+            previous: Optional[float] = (baseline or {}).get(name, {}).get(metric)
+            if previous:
+                cell += f" ({(value - previous) / previous:+.1%})"
+            cells.append(cell)
+        print(f"{name:<40} {'  '.join(cells)}")
+
+
+def argument_parser(description: str) -> argparse.ArgumentParser:
+    """
+    Common head of every suite: a parser with the options finish() reads
+    Args:
+        description: str what the suite measures
+
+    Returns:
+        argparse.ArgumentParser
+    """
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument("--output", type=str, help="Write results to this file")
+    parser.add_argument("--baseline", type=str, help="Compare against this file")
+    parser.add_argument(
+        "--threshold", type=float, default=0.2, help="Allowed relative regression"
+    )
+    return parser
+
+
+def finish(results: Results, args: argparse.Namespace) -> int:
+    """
+    Common tail of every suite: print, optionally save, and compare to a baseline
+    Args:
+        results: Results measured
+        args: argparse.Namespace parsed by a parser from argument_parser()
+
+    Returns:
+        int process exit code, 1 if any regression was found
+    """
+    baseline: Optional[Results] = load(args.baseline) if args.baseline else None
+    report(results, baseline)
+    if args.output:
+        save(results, args.output)
+    if baseline is None:
+        return 0
+    regressions: List[str] = compare(results, baseline, args.threshold)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    return 1 if regressions else 0
@@ -0,0 +1,202 @@
+""" Micro-benchmarks of the code that runs for every message, command and flush """
+
+# pylint: disable=protected-access
+import argparse
+import itertools
+import logging
+import sys
+import time
+from typing import Any, Callable, Dict, Iterator, List, Tuple
+
+import twitch
+
+from benchmarks import harness
+from benchmarks.fakes import FakeChat, FakeHelix, fake_bot, scratch_directory
+from bot import Twitchy
+from data_types import PlayerStats, User
+from data_types.commands import _roll_dice
+from data_types.events import PollBotEvent
+from data_types.rpg.dice import Dice
+from data_types.user import Level
+from storage import STORE_BACKENDS, FlushScheduler, create_store
+from util.constants import STORAGE_BACKEND
+
+CHAT: str = "that was a great play"
+COMMAND: str = "!roll 2d20"
+
+
+def _ops_per_s(run: Callable[[], None], number: int, repeat: int) -> float:
+    """
+    Times a function, keeping the best of several batches
+    Args:
+        run: Callable[[], None] one operation
+        number: int operations per batch
+        repeat: int batches
+
+    Returns:
+        float operations per second
+    """
+    best: float = float("inf")
+    for _ in range(repeat):
+        started: float = time.perf_counter()
+        for _ in range(number):
+            run()
+        best = min(best, time.perf_counter() - started)
+    return number / best
+
+
+def _standalone(number: int, repeat: int) -> harness.Results:
+    """
+    Benchmarks the paths that do not depend on how many users the bot knows
+    Args:
+        number: int operations per batch
+        repeat: int batches
+
+    Returns:
+        harness.Results
+    """
+    stats: PlayerStats = PlayerStats.new()
+    encoded: Dict = stats.to_dict()
+    dice: Dice = Dice(20, 2)
+    return {
+        name: {"ops_per_s": _ops_per_s(run, number, repeat)}
+        for name, run in (
+            ("PlayerStats.new", PlayerStats.new),
+            ("PlayerStats.from_dict", lambda: PlayerStats.from_dict(encoded)),
+            ("PlayerStats.pretty", stats.pretty),
+            ("Dice.roll", dice.roll),
+            ("_roll_dice", lambda: _roll_dice(20, 2)),
+        )
+    }
+
+
+def _with_users(users: int, backend: str, number: int, repeat: int) -> harness.Results:
+    """
+    Benchmarks the paths whose cost can grow with the number of known users, against
+    a bot on fake Twitch holding that many users
+    Args:
+        users: int users in the store
+        backend: str storage backend
+        number: int operations per batch
+        repeat: int batches
+
+    Returns:
+        harness.Results
+    """
+    names: List[str] = [f"chatter_{index}" for index in range(users)]
+    chat: FakeChat = FakeChat("#bench", FakeHelix(names))
+    bot: Twitchy = fake_bot(chat, create_store(backend))
+    for name in names:
+        bot.add_user(User(name))
+    bot.stats.flush()
+
+    suffix: str = f"[users={users}]"
+    results: harness.Results = {}
+    for name, run, scale, batch in _user_paths(bot, chat, names, number):
+        results[name + suffix] = {"ops_per_s": _ops_per_s(run, batch, repeat) * scale}
+        print(f"{name}{suffix}: done", file=sys.stderr)
+    bot.stop()
+    return results
+
+
+def _messages(
+    chat: FakeChat, names: List[str], text: str
+) -> Callable[[], twitch.chat.Message]:
+    """
+    Cycles through messages of the same text from every chatter
+    Args:
+        chat: FakeChat the messages arrive on
+        names: List[str] of chatters
+        text: str message text
+
+    Returns:
+        Callable[[], twitch.chat.Message] returning the next message
+    """
+    cycle: Iterator[twitch.chat.Message] = itertools.cycle(
+        [twitch.chat.Message(chat.channel, name, text, chat.helix) for name in names]
+    )
+    return lambda: next(cycle)
+
+
+def _user_paths(
+    bot: Twitchy, chat: FakeChat, names: List[str], number: int
+) -> List[Tuple[str, Callable[[], Any], int, int]]:
+    """
+    Builds the paths measured against a bot holding users
+    Args:
+        bot: Twitchy holding a user for every chatter
+        chat: FakeChat the bot reads
+        names: List[str] of chatters
+        number: int operations per batch
+
+    Returns:
+        List[Tuple[str, Callable[[], Any], int, int]] of name, operation, operations
+            per call and calls per batch
+    """
+    users: int = len(names)
+    chat_message: Callable[[], twitch.chat.Message] = _messages(chat, names, CHAT)
+    command_message: Callable[[], twitch.chat.Message] = _messages(chat, names, COMMAND)
+    user: User = bot.stats[names[0]]
+    encoded: Dict = user.to_dict()[user.key]
+    poll: PollBotEvent = PollBotEvent(bot, "Bench", ["yes", "no"])
+    flusher: FlushScheduler = FlushScheduler([bot.stats], bot._end_event, users, 60)
+
+    def handle_burst() -> None:
+        # Submits a burst, then waits for the pipeline to finish all of it
+        for _ in range(100):
+            bot._handle_message(chat_message())
+        received: int = bot.ingestion_counters.received
+        while bot.ingestion_counters.processed < received:
+            time.sleep(0)
+
+    def flush_all() -> None:
+        for name in names:
+            bot.mark_dirty(name)
+        flusher.flush()
+
+    return [
+        ("_handle_message", handle_burst, 100, max(1, number // 100)),
+        ("_process_message", lambda: bot._process_message(chat_message()), 1, number),
+        (
+            "_handle_command",
+            lambda: bot._handle_command(user, command_message(), Level.MOD),
+            1,
+            number,
+        ),
+        ("User.to_dict", user.to_dict, 1, number),
+        ("User.from_dict", lambda: User.from_dict(user.name, encoded), 1, number),
+        ("PollBotEvent.vote", lambda: poll.vote("1", "yes"), 1, number),
+        ("PollBotEvent.finish", poll.finish, 1, max(1, number // users)),
+        ("flush", flush_all, users, max(1, 10000 // users)),
+    ]
+
+
+def main() -> None:
+    """
+    Runs every hot path micro-benchmark, then saves and compares the results
+    Returns:
+        None
+    """
+    parser = harness.argument_parser("Benchmark the bot's hot paths.")
+    parser.add_argument(
+        "--users", type=int, nargs="+", default=[1000, 10000], help="User counts"
+    )
+    parser.add_argument(
+        "--storage", choices=list(STORE_BACKENDS), default=STORAGE_BACKEND
+    )
+    parser.add_argument("--number", type=int, default=5000, help="Calls per batch")
+    parser.add_argument("--repeat", type=int, default=5, help="Batches, best is kept")
+    args: argparse.Namespace = parser.parse_args()
+    # Replies pile up far faster than the send limit allows and are dropped
+    logging.basicConfig(level=logging.ERROR)
+
+    results: harness.Results = _standalone(args.number, args.repeat)
+    for users in args.users:
+        with scratch_directory():
+            results.update(_with_users(users, args.storage, args.number, args.repeat))
+
+    sys.exit(harness.finish(results, args))
+
+
+if __name__ == "__main__":
+    main()
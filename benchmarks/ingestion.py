@@ -0,0 +1,118 @@
+""" Measures how the message ingestion pipeline copes with bursts of chat """
+
+import argparse
+import random
+import sys
+import time
+from collections import defaultdict
+from threading import Lock
+from typing import Dict, List, Tuple
+
+from benchmarks import harness
+from bot.ingestion import IngestionCounters, IngestionPipeline
+
+Message = Tuple[str, int]
+
+
+def _burst(messages: int, users: int) -> List[Message]:
+    """
+    Builds a burst of (user, sequence number) messages from randomly chosen users
+    Args:
+        messages: int number of messages
+        users: int number of distinct chatters
+
+    Returns:
+        List[Message]
+    """
+    return [(f"chatter_{random.randrange(users)}", index) for index in range(messages)]
+
+
+def _run_pipeline(
+    burst: List[Message], workers: int, capacity: int, handler_s: float
+) -> Dict[str, float]:
+    """
+    Pushes a burst through a pipeline whose handler blocks for a fixed time, like a
+    command sending a chat message
+    Args:
+        burst: List[Message] to submit
+        workers: int pipeline workers
+        capacity: int pipeline queue capacity
+        handler_s: float seconds each message takes to handle
+
+    Returns:
+        Dict[str, float] metrics
+    """
+    seen: Dict[str, List[int]] = defaultdict(list)
+    seen_mutex: Lock = Lock()
+
+    def handle(message: Message) -> None:
+        time.sleep(handler_s)
+        with seen_mutex:
+            seen[message[0]].append(message[1])
+
+    pipeline: IngestionPipeline[Message] = IngestionPipeline(
+        handle, lambda message: message[0], workers, capacity
+    )
+    pipeline.start()
+    started: float = time.perf_counter()
+    submit_s: float = 0.0
+    for message in burst:
+        submit_started: float = time.perf_counter()
+        pipeline.submit(message)
+        submit_s = max(submit_s, time.perf_counter() - submit_started)
+    pipeline.stop()
+    elapsed: float = time.perf_counter() - started
+    counters: IngestionCounters = pipeline.counters
+
+    if any(sequence != sorted(sequence) for sequence in seen.values()):
+        raise AssertionError("Messages from one user were handled out of order")
+    return {
+        "messages_per_s": len(burst) / elapsed,
+        "max_queue_depth": counters.max_queue_depth,
+        "mean_latency_s": counters.total_latency_s / max(1, counters.processed),
+        "max_latency_s": counters.max_latency_s,
+        "max_submit_s": submit_s,
+    }
+
+
+def _run_inline(burst: List[Message], handler_s: float) -> Dict[str, float]:
+    # The pre-pipeline behaviour: every message handled on the reading thread
+    started: float = time.perf_counter()
+    for _ in burst:
+        time.sleep(handler_s)
+    return {"messages_per_s": len(burst) / (time.perf_counter() - started)}
+
+
+def main() -> None:
+    """
+    Replays a burst of messages inline and through pipelines of several sizes,
+    reporting throughput, queue depth and latency, and checking that every user's
+    messages were handled in order
+    Returns:
+        None
+    """
+    parser = harness.argument_parser("Benchmark message ingestion.")
+    parser.add_argument("--messages", type=int, default=5000, help="Burst size")
+    parser.add_argument("--users", type=int, default=500, help="Distinct chatters")
+    parser.add_argument(
+        "--handler-ms", type=float, default=2.0, help="Time to handle one message"
+    )
+    parser.add_argument(
+        "--workers", type=int, nargs="+", default=[1, 4, 16], help="Pool sizes"
+    )
+    parser.add_argument("--capacity", type=int, default=2000, help="Queue capacity")
+    args: argparse.Namespace = parser.parse_args()
+
+    burst: List[Message] = _burst(args.messages, args.users)
+    handler_s: float = args.handler_ms / 1000
+    results: harness.Results = {"inline": _run_inline(burst, handler_s)}
+    for workers in args.workers:
+        name: str = f"pipeline[{workers}]"
+        results[name] = _run_pipeline(burst, workers, args.capacity, handler_s)
+        print(f"{name}: {results[name]['messages_per_s']:.0f}/s", file=sys.stderr)
+
+    sys.exit(harness.finish(results, args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+""" Measures the resident memory cost of holding chat Users in RAM """
+
+import argparse
+import gc
+import tracemalloc
+from typing import Any, Callable, List
+
+from data_types import User
+from storage.binary import decode_user, encode_user
+
+
+def _bytes_per_item(build: Callable[[int], Any], count: int) -> float:
+    """
+    Measures the memory retained by building a number of items
+    Args:
+        build: Callable[[int], Any] creating the item at an index
+        count: int number of items to build
+
+    Returns:
+        float average bytes retained per item
+    """
+    gc.collect()
+    tracemalloc.start()
+    before: int = tracemalloc.get_traced_memory()[0]
+    items: List[Any] = [build(index) for index in range(count)]
+    gc.collect()
+    after: int = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del items
+    return (after - before) / count
+
+
+def main() -> None:
+    """
+    Reports bytes per user for freshly created users, users hydrated from stored
+    records, and the plain dict representation produced by User.to_dict
+    Returns:
+        None
+    """
+    parser = argparse.ArgumentParser(description="Measure per-user memory.")
+    parser.add_argument("--users", type=int, default=100000, help="Users to build")
+    args: argparse.Namespace = parser.parse_args()
+
+    records: List[bytes] = [
+        encode_user(User(f"user{index}")) for index in range(args.users)
+    ]
+    results = {
+        "new User": _bytes_per_item(lambda index: User(f"user{index}"), args.users),
+        "hydrated User": _bytes_per_item(
+            lambda index: decode_user(f"user{index}", records[index]), args.users
+        ),
+        "to_dict() dict": _bytes_per_item(
+            lambda index: decode_user(f"user{index}", records[index]).to_dict(),
+            args.users,
+        ),
+    }
+    print(f"{args.users} users")
+    for name, per_user in results.items():
+        print(
+            f"{name:>16}: {per_user:8.1f} bytes/user"
+            f"  {per_user * args.users / 2**20:8.1f} MiB total"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+""" Measures the overhead the metrics instrumentation adds to each chat message """
+
+import argparse
+import sys
+import time
+from typing import Callable, List
+
+from benchmarks import harness
+from util.metrics import Registry
+
+COMMANDS: List[str] = [f"!command_{index}" for index in range(20)]
+
+
+def _per_call_us(function: Callable[[int], None], calls: int) -> float:
+    """
+    Times a function called with every index up to calls, less the cost of an
+    empty call
+    Args:
+        function: Callable[[int], None] to time
+        calls: int number of calls
+
+    Returns:
+        float microseconds per call
+    """
+
+    def empty(_: int) -> None:
+        pass
+
+    timings: List[float] = []
+    for timed in (empty, function):
+        started: float = time.perf_counter()
+        for index in range(calls):
+            timed(index)
+        timings.append(time.perf_counter() - started)
+    return max(0.0, timings[1] - timings[0]) / calls * 1e6
+
+
+def main() -> None:
+    """
+    Times the individual metric operations, the full instrumentation of a message
+    that runs a command, and rendering a scrape
+    Returns:
+        None
+    """
+    parser = harness.argument_parser("Benchmark metrics overhead.")
+    parser.add_argument("--calls", type=int, default=500000, help="Calls per metric")
+    args: argparse.Namespace = parser.parse_args()
+
+    registry: Registry = Registry()
+    counter = registry.counter("bench_total", "Counter")
+    message_seconds = registry.histogram("bench_message_seconds", "Messages")
+    command_seconds = registry.histogram(
+        "bench_command_seconds", "Commands", ("command",)
+    )
+
+    def instrument(index: int) -> None:
+        # Everything _process_message and _handle_command add to one command
+        message_started: float = time.perf_counter()
+        command_started: float = time.perf_counter()
+        command_seconds.labels(COMMANDS[index % len(COMMANDS)]).observe(
+            time.perf_counter() - command_started
+        )
+        message_seconds.observe(time.perf_counter() - message_started)
+
+    results: harness.Results = {
+        "counter": {"inc_us": _per_call_us(lambda _: counter.inc(), args.calls)},
+        "histogram": {
+            "observe_us": _per_call_us(
+                lambda index: message_seconds.observe(index * 1e-7), args.calls
+            )
+        },
+        "message": {"overhead_us": _per_call_us(instrument, args.calls)},
+    }
+    started: float = time.perf_counter()
+    body: str = registry.render()
+    results["scrape"] = {
+        "render_ms": (time.perf_counter() - started) * 1000,
+        "bytes": len(body),
+    }
+    print(
+        f"message overhead: {results['message']['overhead_us']:.2f}us", file=sys.stderr
+    )
+
+    sys.exit(harness.finish(results, args))
+
+
+if __name__ == "__main__":
+    main()
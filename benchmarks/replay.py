@@ -0,0 +1,213 @@
+""" Replays recorded or synthetic chat through a Twitchy bot connected to fake Twitch """
+
+import argparse
+import functools
+import logging
+import random
+import sys
+import time
+from typing import List, Optional, Tuple, Union
+
+from benchmarks import harness
+from benchmarks.fakes import (
+    BOT_NAME,
+    CHANNEL,
+    CHAT,
+    OWNER,
+    FakeChat,
+    FakeHelix,
+    fake_bot,
+    scratch_directory,
+)
+from bot import PartitionedTwitchy, Twitchy
+from storage import STORE_BACKENDS, create_store
+from util.metrics import Histogram
+from util.constants import STORAGE_BACKEND
+
+COMMANDS: List[str] = [
+    "!roll 2d20",
+    "!bonk @chatter_{other}",
+    "!hug @chatter_{other}",
+    "!messages",
+    "!who_am_i",
+    "!bonked?",
+    "!vote yes",
+    "!roll help",
+    "!not_a_command",
+]
+
+Line = Tuple[str, str]
+
+
+def _read_log(path: str) -> List[Line]:
+    """
+    Reads a chat log with one 'user<TAB>message' line per message
+    Args:
+        path: str log file
+
+    Returns:
+        List[Line] of (user, text)
+    """
+    lines: List[Line] = []
+    with open(path, "r", encoding="utf-8") as file:
+        for row in file:
+            user, separator, text = row.rstrip("\n").partition("\t")
+            if separator and user:
+                lines.append((user, text))
+    return lines
+
+
+def _synthesize(messages: int, users: int, command_ratio: float) -> List[Line]:
+    """
+    Generates chat from randomly chosen chatters, a share of it commands
+    Args:
+        messages: int number of messages
+        users: int number of distinct chatters
+        command_ratio: float share of messages that are commands
+
+    Returns:
+        List[Line] of (user, text)
+    """
+    lines: List[Line] = []
+    for _ in range(messages):
+        user: str = f"chatter_{random.randrange(users)}"
+        if random.random() < command_ratio:
+            text: str = random.choice(COMMANDS).format(other=random.randrange(users))
+        else:
+            text = random.choice(CHAT)
+        lines.append((user, text))
+    return lines
+
+
+def _replay(
+    lines: List[Line], rate: float, backend: str, moderator: bool, workers: int
+) -> harness.Results:
+    """
+    Feeds chat lines to a fresh bot and waits until every one has been handled
+    Args:
+        lines: List[Line] to replay
+        rate: float messages per second to feed, 0 for as fast as possible
+        backend: str stats storage backend
+        moderator: bool whether the bot sends at the moderator rate
+        workers: int worker processes to partition chat across, 0 for none
+
+    Returns:
+        harness.Results
+    """
+    chatters: List[str] = sorted({user for user, _ in lines})
+    chat: FakeChat = FakeChat(CHANNEL, FakeHelix(chatters))
+    rss_before: int = harness.peak_rss_kb()
+    bot: Union[Twitchy, PartitionedTwitchy] = (
+        PartitionedTwitchy(
+            OWNER,
+            CHANNEL,
+            BOT_NAME,
+            "oauth",
+            "client_id",
+            "client_secret",
+            backend,
+            workers,
+            moderator,
+            chat,
+            functools.partial(FakeHelix, chatters),
+        )
+        if workers
+        else fake_bot(chat, create_store(backend), moderator)
+    )
+
+    started: float = time.perf_counter()
+    _feed(chat, lines, rate)
+    while bot.ingestion_counters.processed < len(lines):
+        time.sleep(0.001)
+    elapsed: float = time.perf_counter() - started
+    rss_growth_kb: int = harness.peak_rss_kb() - rss_before
+    bot.stop()
+
+    # A partitioned bot only collects its workers' latencies once they stop
+    latency: Optional[Histogram] = bot.metrics.get("twitchy_ingestion_latency_seconds")
+    results: harness.Results = {
+        "replay": {
+            "messages_per_s": len(lines) / elapsed,
+            "p50_latency_s": latency.quantile(0.5),
+            "p99_latency_s": latency.quantile(0.99),
+            "max_queue_depth": bot.ingestion_counters.max_queue_depth,
+            "rss_growth_kb": rss_growth_kb,
+        }
+    }
+    results["outbound"] = {
+        "chat_lines": chat.sent_count,
+        "dropped": bot.outbound_counters.dropped,
+    }
+    return results
+
+
+def _feed(chat: FakeChat, lines: List[Line], rate: float) -> None:
+    """
+    Injects chat lines into fake chat, paced to a rate
+    Args:
+        chat: FakeChat to inject into
+        lines: List[Line] to inject
+        rate: float messages per second, 0 for as fast as possible
+
+    Returns:
+        None
+    """
+    started: float = time.perf_counter()
+    for index, (user, text) in enumerate(lines):
+        if rate:
+            ahead: float = started + index / rate - time.perf_counter()
+            if ahead > 0:
+                time.sleep(ahead)
+        chat.inject(user, text)
+
+
+def main() -> None:
+    """
+    Replays a chat log, or synthetic chat, through the bot with fake Twitch
+    connections and reports sustained throughput, handling latency and memory
+    growth
+    Returns:
+        None
+    """
+    parser = harness.argument_parser("Replay chat through Twitchy.")
+    parser.add_argument("--log", type=str, help="Chat log of 'user<TAB>message' lines")
+    parser.add_argument("--messages", type=int, default=20000, help="Synthetic size")
+    parser.add_argument("--users", type=int, default=2000, help="Synthetic chatters")
+    parser.add_argument(
+        "--command-ratio", type=float, default=0.1, help="Share of commands"
+    )
+    parser.add_argument(
+        "--rate", type=float, default=0, help="Messages per second, 0 for unlimited"
+    )
+    parser.add_argument(
+        "--storage", choices=list(STORE_BACKENDS), default=STORAGE_BACKEND
+    )
+    parser.add_argument(
+        "--moderator", action="store_true", help="Send at the moderator rate"
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=0,
+        help="Partition chat across this many worker processes, 0 for none",
+    )
+    args: argparse.Namespace = parser.parse_args()
+    # Dropped replies are expected once chat outpaces the send limit
+    logging.basicConfig(level=logging.ERROR)
+
+    lines: List[Line] = (
+        _read_log(args.log)
+        if args.log
+        else _synthesize(args.messages, args.users, args.command_ratio)
+    )
+    with scratch_directory():
+        results: harness.Results = _replay(
+            lines, args.rate, args.storage, args.moderator, args.workers
+        )
+    print(f"replayed {len(lines)} messages", file=sys.stderr)
+
+    sys.exit(harness.finish(results, args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+""" Measures how many chat messages per second the command router resolves """
+
+import argparse
+import sys
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Optional
+
+from benchmarks import harness
+from benchmarks.fakes import CHAT
+from bot.commands import INVALID_COMMAND, commands, mod_commands, router
+from data_types.commands import Command
+from data_types.user import Level
+
+COMMANDS: List[str] = [
+    "!roll 2d20",
+    "!bonk @someone",
+    "!WHOAMI",
+    "!messages",
+    "!vote yes",
+    "!roll help",
+    "!not_a_command",
+    "!start_poll Best_Game a,b,c 5m",
+]
+
+
+def _legacy_route(text: str, level: Level) -> Optional[Command]:
+    # Routing as it was done before the router: split every command, pick a table
+    split_command: List[str] = text.split(" ") if text.startswith("!") else ""
+    if not split_command:
+        return None
+    table: Dict[str, Command] = mod_commands if level == Level.MOD else commands
+    return table.get(split_command[0], INVALID_COMMAND)
+
+
+def _throughput(route: Callable[[str, Level], object], messages: List[str]) -> float:
+    """
+    Routes a list of messages repeatedly for a fixed amount of work
+    Args:
+        route: Callable[[str, Level], object] routing function
+        messages: List[str] to route
+
+    Returns:
+        float messages per second
+    """
+    rounds: int = max(1, 200000 // len(messages))
+    levels: List[Level] = [Level.USER, Level.MOD]
+    started: float = time.perf_counter()
+    for index in range(rounds):
+        level: Level = levels[index & 1]
+        for text in messages:
+            route(text, level)
+    return rounds * len(messages) / (time.perf_counter() - started)
+
+
+def _allocations(messages: List[str]) -> float:
+    """
+    Counts memory blocks still allocated after routing, per message
+    Args:
+        messages: List[str] to route
+
+    Returns:
+        float blocks per message
+    """
+    results: List[object] = [None] * len(messages)
+    tracemalloc.start()
+    before: int = tracemalloc.get_traced_memory()[0]
+    for index, text in enumerate(messages):
+        results[index] = router.route(text, Level.USER)
+    after: int = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return (after - before) / len(messages)
+
+
+def main() -> None:
+    """
+    Routes plain chat, commands and a realistic mix through the compiled router
+    and the old split-and-lookup path, reporting messages per second
+    Returns:
+        None
+    """
+    parser = harness.argument_parser("Benchmark command routing.")
+    args: argparse.Namespace = parser.parse_args()
+
+    # Roughly one message in ten in a busy chat is a command
+    mixed: List[str] = CHAT * 14 + COMMANDS
+    results: harness.Results = {}
+    for name, messages in (("chat", CHAT), ("commands", COMMANDS), ("mixed", mixed)):
+        results[f"router[{name}]"] = {
+            "messages_per_s": _throughput(router.route, messages)
+        }
+        results[f"legacy[{name}]"] = {
+            "messages_per_s": _throughput(_legacy_route, messages)
+        }
+        print(f"{name}: done", file=sys.stderr)
+    results["router[chat]"]["retained_bytes_per_message"] = _allocations(CHAT * 100)
+
+    sys.exit(harness.finish(results, args))
+
+
+if __name__ == "__main__":
+    main()
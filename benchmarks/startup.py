@@ -0,0 +1,225 @@
+""" Measures where boot time and memory go, phase by phase """
+
+import argparse
+import importlib
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import timedelta
+from typing import Callable, Dict, Iterator, List, Tuple
+
+from benchmarks import harness
+from data_types import User
+from storage import STORE_BACKENDS
+from storage.binary import encode_user
+from storage.indexed import write_indexed
+from storage.sharded_store import shard_for
+from util.constants import (
+    INDEX_PATH,
+    SHARD_COUNT,
+    SHARD_PATH_FORMAT,
+    SQLITE_PATH,
+    STATS_PATH,
+    TOKENS_PATH,
+)
+
+OWNER: str = "benchmark_owner"
+
+
+def _names(count: int) -> Iterator[str]:
+    return (f"chatter_{index}" for index in range(count))
+
+
+def _write_json(path: str, names: Iterator[str], record: str) -> None:
+    with open(path, "w") as file:
+        file.write("{")
+        file.write(",".join(f'"{name}":{record}' for name in names))
+        file.write("}")
+
+
+def _generate(directory: str, count: int) -> None:
+    """
+    Writes synthetic stats for every backend into directory/.data. Every user shares
+    one template record so generation stays fast at a million users.
+    Args:
+        directory: str working directory to populate
+        count: int number of users
+
+    Returns:
+        None
+    """
+    os.makedirs(os.path.join(directory, ".data"), exist_ok=True)
+    # Nameless, so each record takes the name of the login it is stored under
+    template: User = User("")
+    record: str = json.dumps(template.to_dict()[template.key], separators=(",", ":"))
+
+    _write_json(os.path.join(directory, STATS_PATH), _names(count), record)
+
+    for index in range(SHARD_COUNT):
+        _write_json(
+            os.path.join(
+                directory, SHARD_PATH_FORMAT.format(index=index, suffix="json")
+            ),
+            (name for name in _names(count) if shard_for(name, SHARD_COUNT) == index),
+            record,
+        )
+
+    encoded: bytes = encode_user(template)
+    write_indexed(
+        os.path.join(directory, INDEX_PATH),
+        ((name, encoded) for name in _names(count)),
+    )
+
+    connection: sqlite3.Connection = sqlite3.connect(
+        os.path.join(directory, SQLITE_PATH)
+    )
+    with connection:
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS users "
+            "(name TEXT PRIMARY KEY, data TEXT, login TEXT)"
+        )
+        connection.executemany(
+            "INSERT INTO users (name, login, data) VALUES (?, ?, ?)",
+            ((name, name, record) for name in _names(count)),
+        )
+    connection.close()
+
+    with open(os.path.join(directory, TOKENS_PATH), "w") as file:
+        file.write(json.dumps({"access_token": "a", "refresh_token": "r"}))
+
+
+def _phase_import(module: str) -> Callable[[argparse.Namespace], Callable]:
+    return lambda _: lambda: importlib.import_module(module)
+
+
+def _phase_load_tokens(_: argparse.Namespace) -> Callable:
+    from twitchy_boot import _load_tokens  # pylint: disable=import-outside-toplevel
+
+    return lambda: _load_tokens("client_id", "client_secret", "refresh_token")
+
+
+def _phase_load_stats(args: argparse.Namespace) -> Callable:
+    from storage import create_store  # pylint: disable=import-outside-toplevel
+
+    def load() -> None:
+        create_store(args.backend).load(User(OWNER))
+
+    return load
+
+
+def _phase_helix(_: argparse.Namespace) -> Callable:
+    import twitch  # pylint: disable=import-outside-toplevel
+
+    return lambda: twitch.Helix(
+        client_id="client_id",
+        client_secret="client_secret",
+        use_cache=True,
+        bearer_token="oauth",
+        cache_duration=timedelta(minutes=30),
+    )
+
+
+def _phase_chat(_: argparse.Namespace) -> Callable:
+    import twitch  # pylint: disable=import-outside-toplevel
+
+    return lambda: twitch.Chat(channel="#benchmark", nickname=OWNER, oauth="oauth")
+
+
+# Each phase does its own setup and returns the callable that is actually timed
+PHASES: Dict[str, Callable[[argparse.Namespace], Callable]] = {
+    "import_twitch": _phase_import("twitch"),
+    "import_bot_commands": _phase_import("bot.commands"),
+    "import_twitchy_boot": _phase_import("twitchy_boot"),
+    "load_tokens": _phase_load_tokens,
+    "load_stats": _phase_load_stats,
+    "helix_init": _phase_helix,
+    "chat_init": _phase_chat,
+}
+
+
+def _child(args: argparse.Namespace) -> None:
+    timed: Callable = PHASES[args.child](args)
+    started: float = time.perf_counter()
+    timed()
+    elapsed: float = time.perf_counter() - started
+    print(json.dumps({"wall_s": elapsed, "peak_rss_kb": harness.peak_rss_kb()}))
+
+
+def main() -> None:
+    """
+    Runs every boot phase in its own interpreter against synthetic stats files and
+    reports wall time and peak RSS, optionally comparing against a saved baseline
+    Returns:
+        None
+    """
+    parser = harness.argument_parser("Benchmark Twitchy startup.")
+    parser.add_argument(
+        "--users",
+        type=int,
+        nargs="+",
+        default=[1000, 100000, 1000000],
+        help="Synthetic user counts",
+    )
+    parser.add_argument(
+        "--backends",
+        type=str,
+        nargs="+",
+        default=list(STORE_BACKENDS),
+        choices=list(STORE_BACKENDS),
+        help="Storage backends to load",
+    )
+    parser.add_argument(
+        "--network",
+        action="store_true",
+        help="Also construct twitch.Chat, which connects to Twitch IRC",
+    )
+    parser.add_argument(
+        "--child", type=str, choices=list(PHASES), help=argparse.SUPPRESS
+    )
+    parser.add_argument("--backend", type=str, help=argparse.SUPPRESS)
+    args: argparse.Namespace = parser.parse_args()
+
+    if args.child:
+        _child(args)
+        return
+
+    results: harness.Results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        _generate(directory, 0)
+        fixed: List[str] = [
+            "import_twitch",
+            "import_bot_commands",
+            "import_twitchy_boot",
+            "load_tokens",
+            "helix_init",
+        ]
+        fixed += ["chat_init"] if args.network else []
+        for phase in fixed:
+            results[phase] = harness.run_isolated(
+                "benchmarks.startup", ["--child", phase], directory
+            )
+
+    for count in args.users:
+        with tempfile.TemporaryDirectory() as directory:
+            _generate(directory, count)
+            runs: List[Tuple[str, List[str]]] = [
+                (
+                    f"load_stats[{backend},{count}]",
+                    ["--child", "load_stats", "--backend", backend],
+                )
+                for backend in args.backends
+            ]
+            for name, child_args in runs:
+                results[name] = harness.run_isolated(
+                    "benchmarks.startup", child_args, directory
+                )
+                print(f"{name}: {results[name]['wall_s']:.3f}s", file=sys.stderr)
+
+    sys.exit(harness.finish(results, args))
+
+
+if __name__ == "__main__":
+    main()
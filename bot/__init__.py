@@ -1 +1,3 @@
 from .bot import Twitchy
+from .channels import ChannelGroup
+from .partitions import PartitionedTwitchy
@@ -1,40 +1,92 @@
-import json
+import itertools
 import logging
-import os
 import time
 from datetime import timedelta
-from threading import Thread, Event, Lock
-from typing import Dict, List, Optional, Union
+from threading import Thread, Event, RLock
+from typing import Dict, Hashable, Iterator, List, Optional, Set, Tuple, Union
 
 import twitch
 
 from bot.commands import (
-    owner_commands,
-    INVALID_COMMAND,
-    commands,
     DELAY_NOT_MET_COMMAND,
     HELP_COMMAND,
-    mod_commands,
+    INVALID_COMMAND,
+    USAGE_COMMAND,
+    router,
 )
+from bot.cooldowns import CooldownEngine
+from bot.ingestion import IngestionCounters, IngestionPipeline
+from bot.outbound import OutboundCounters, OutboundQueue
+from bot.presence import PresenceTracker
+from bot.router import Route
+from bot.scheduler import EventScheduler
+from bot.services import SharedServices
 from data_types import PlayerStats
 from data_types import User
-from data_types.chatter import Chatter
-from data_types.commands import (
-    Command,
+from data_types.commands import Command
+from data_types.cooldown import Cooldown
+from data_types.events import PollBotEvent, BotEvent, event_from_dict
+from data_types.priority import Priority
+from data_types.user import Level, normalize_login
+from storage import (
+    EventJournal,
+    FlushCounters,
+    FlushScheduler,
+    UserStore,
+    create_event_journal,
+    create_store,
 )
-from data_types.events import PollBotEvent, BotEvent
-from data_types.user import Level
 from util.constants import (
-    SPLIT_COMMAND_NAME,
-    SPLIT_COMMAND_ARGS,
+    CHATTERS_POLL_SECONDS,
     WRITE_DELAY_SECONDS,
-    STATS_PATH,
+    FLUSH_DIRTY_USERS,
+    INGESTION_WORKERS,
+    INGESTION_QUEUE_SIZE,
+    MAX_POLLS,
+    OUTBOUND_LIMIT,
+    OUTBOUND_MOD_LIMIT,
+    OUTBOUND_PERIOD_SECONDS,
+    OUTBOUND_QUEUE_SIZE,
+    POLL_STATUS_SECONDS,
+    STORAGE_BACKEND,
 )
+from util.metrics import COUNTER, GAUGE, Counter, Histogram, Registry
+
+# Name of a poll in the bot's events
+POLL_EVENT_FORMAT: str = "poll:{id}"
+
+# Limits on any commands from one chatter, moderators and the owner are exempt
+USER_COOLDOWNS: Dict[Level, Cooldown] = {
+    Level.USER: Cooldown(User.COMMAND_DELAY, User.COMMAND_BURST),
+    Level.VIP: Cooldown(User.VIP_COMMAND_DELAY, User.COMMAND_BURST),
+}
+
+
+def create_helix(client_id: str, client_secret: str, oauth: str) -> twitch.Helix:
+    """
+    Creates a caching Helix client for the bot account
+    Args:
+        client_id: str Helix client ID
+        client_secret: str Helix client secret
+        oauth: str OAuth token of the bot account
+
+    Returns:
+        twitch.Helix
+    """
+    return twitch.Helix(
+        client_id=client_id,
+        client_secret=client_secret,
+        use_cache=True,
+        bearer_token=oauth,
+        cache_duration=timedelta(minutes=30),
+    )
 
 
 class Twitchy:
     """
-    Core class for the Twitchy bot
+    Core class for the Twitchy bot, serving a single channel. Several instances can
+    run in one process by sharing a Helix client and SharedServices, see
+    bot.channels.ChannelGroup.
     """
 
     def __init__(
@@ -45,99 +97,241 @@ class Twitchy:
         oauth: str,
         client_id: str,
         client_secret: str,
+        store: Optional[UserStore] = None,
+        moderator: bool = False,
+        chat: Optional[twitch.Chat] = None,
+        helix: Optional[twitch.Helix] = None,
+        services: Optional[SharedServices] = None,
+        metrics: Optional[Registry] = None,
+        event_log: Optional[EventJournal] = None,
     ) -> None:
-        self._bot: twitch.Chat = twitch.Chat(
+        """
+        Args:
+            owner: str name of the channel owner
+            channel: str channel to join, e.g. '#name'
+            nickname: str name of the bot account
+            oauth: str OAuth token of the bot account
+            client_id: str Helix client ID
+            client_secret: str Helix client secret
+            store: Optional[UserStore] for the channel's stats, unloaded
+            moderator: bool whether the bot is a moderator of the channel
+            chat: Optional[twitch.Chat] already connected, e.g. a stand-in
+            helix: Optional[twitch.Helix] shared with other channels
+            services: Optional[SharedServices] shared with other channels, which
+                the caller starts and stops
+            metrics: Optional[Registry] for the channel's metrics
+            event_log: Optional[EventJournal] keeping the channel's polls and
+                broadcasts across restarts
+        """
+        self._bot: twitch.Chat = chat or twitch.Chat(
             channel=channel,
             nickname=nickname,
             oauth=oauth,
-            helix=twitch.Helix(
-                client_id=client_id,
-                client_secret=client_secret,
-                use_cache=True,
-                bearer_token=oauth,
-                cache_duration=timedelta(minutes=30),
-            ),
+            helix=helix or create_helix(client_id, client_secret, oauth),
         )
         self._owner: str = owner
-        self._stats: Dict[str, User] = {}
-        self._bot.subscribe(self._handle_message)
+        self._stats: UserStore = (
+            store if store is not None else create_store(STORAGE_BACKEND)
+        )
+        self._metrics: Registry = metrics or Registry()
+        self._ingestion: IngestionPipeline[twitch.chat.Message] = IngestionPipeline(
+            self._process_message,
+            # The raw IRC login, as message.user is a Helix lookup that must not
+            # run on the reader thread
+            lambda message: message.sender,
+            INGESTION_WORKERS,
+            INGESTION_QUEUE_SIZE,
+            self._metrics.histogram(
+                "twitchy_ingestion_latency_seconds",
+                "Time from receiving a chat message to finishing with it",
+            ),
+            services.executor if services else None,
+        )
         self._bot_name: str = nickname
+        self._outbound: OutboundQueue = OutboundQueue(
+            self._bot.send, OUTBOUND_LIMIT, OUTBOUND_PERIOD_SECONDS, OUTBOUND_QUEUE_SIZE
+        )
+        self.set_moderator(moderator or nickname.lower() == owner.lower())
+        self._cooldowns: CooldownEngine = CooldownEngine()
         self._events: Dict[str, Union[BotEvent, PollBotEvent]] = {}
-        self._current_chatters: List[Chatter] = []
+        self._poll_ids: Iterator[int] = itertools.count(1)
+        # When each poll last announced its tallies, and the polls with an
+        # announcement scheduled
+        self._status_sent: Dict[str, float] = {}
+        self._status_pending: Set[str] = set()
+        self._event_log: EventJournal = (
+            event_log if event_log is not None else create_event_journal()
+        )
+        self._presence: PresenceTracker = PresenceTracker(
+            self._fetch_chatters,
+            lambda name: self._bot.helix.user(name).id,
+            owner,
+            nickname,
+        )
 
-        self._file_writer: Thread = Thread(target=self._file_write_loop)
-        self._watch_thread: Thread = Thread(target=self._monitor_loop)
+        self._owns_services: bool = services is None
+        self._scheduler: EventScheduler = (
+            services.scheduler if services else EventScheduler()
+        )
         self._chatter_thread: Thread = Thread(target=self._monitor_chatters)
-        self._file_mutex: Lock = Lock()
-        self._queue_mutex: Lock = Lock()
-        self._chatters_mutex: Lock = Lock()
+        self._queue_mutex: RLock = RLock()
 
         self._end_event: Event = Event()
+        self._message_seconds: Histogram = self._metrics.histogram(
+            "twitchy_message_seconds", "Time to process one chat message"
+        )
+        self._command_seconds: Histogram = self._metrics.histogram(
+            "twitchy_command_seconds", "Time to execute a command", ("command",)
+        )
+        self._command_errors: Counter = self._metrics.counter(
+            "twitchy_command_errors_total", "Commands that raised", ("command",)
+        )
+        self._cooldown_rejections: Counter = self._metrics.counter(
+            "twitchy_cooldown_rejections_total", "Commands refused by a cooldown"
+        )
+        self._helix_seconds: Histogram = self._metrics.histogram(
+            "twitchy_helix_request_seconds", "Helix API request time", ("endpoint",)
+        )
+        self._helix_errors: Counter = self._metrics.counter(
+            "twitchy_helix_errors_total",
+            "Helix API requests that failed",
+            ("endpoint",),
+        )
+        self._flusher: FlushScheduler = (
+            services.flusher
+            if services
+            else FlushScheduler(
+                [self._stats],
+                self._end_event,
+                FLUSH_DIRTY_USERS,
+                WRITE_DELAY_SECONDS,
+                self._metrics.histogram("twitchy_flush_seconds", "Time to flush stats"),
+            )
+        )
+        self._register_metrics()
 
         self._load_stats()
-        self._file_writer.start()
-        self._watch_thread.start()
+        self._restore_events()
+        if self._owns_services:
+            self._flusher.start()
+            self._scheduler.start()
+        else:
+            self._flusher.add_store(self._stats)
+        self._outbound.start()
+        self._ingestion.start()
+        self._bot.subscribe(self._handle_message)
         self._chatter_thread.start()
 
     @property
-    def stats(self) -> Dict[str, User]:
+    def stats(self) -> UserStore:
         """
-        Get the stats dict
+        Get the user stats store
         Returns:
-            Dict[str, User]
+            UserStore
         """
         return self._stats
 
     @property
-    def chatters(self) -> List[Chatter]:
+    def metrics(self) -> Registry:
         """
-        Gets the current chatters
+        Gets the registry of the bot's metrics
         Returns:
-            List[Chatter]
+            Registry
         """
-        return self._current_chatters
+        return self._metrics
 
     @property
-    def chatters_mutex(self) -> Lock:
+    def flush_counters(self) -> FlushCounters:
         """
-        Gets the current chatters mutex
+        Gets the counters of the stats flush scheduler
         Returns:
-            Lock
+            FlushCounters
         """
-        return self._chatters_mutex
+        return self._flusher.counters
+
+    @property
+    def ingestion_counters(self) -> IngestionCounters:
+        """
+        Gets the counters of the message ingestion pipeline
+        Returns:
+            IngestionCounters
+        """
+        return self._ingestion.counters
+
+    @property
+    def outbound_counters(self) -> OutboundCounters:
+        """
+        Gets the counters of the outbound message queue
+        Returns:
+            OutboundCounters
+        """
+        return self._outbound.counters
+
+    @property
+    def presence(self) -> PresenceTracker:
+        """
+        Gets the tracker of the channel's current chatters
+        Returns:
+            PresenceTracker
+        """
+        return self._presence
 
     def _handle_message(self, message: twitch.chat.Message) -> None:
         """
-        Logic for handling any incoming messages. If a user has not been added to the stats
-        recording they will be added with default parameters.
+        Chat subscription callback, queueing the message so a slow command never
+        holds up reading the next one
         Args:
             message: Message that was received
 
         Returns:
             None
         """
-        username: str = message.user.display_name
-        logging.info("Received message: %s", message.text)
-        if username not in self._stats:
-            self.add_user(User(username))
+        self._ingestion.submit(message)
+
+    def _process_message(self, message: twitch.chat.Message) -> None:
+        """
+        Logic for handling any incoming messages. Users are identified by their
+        Twitch user id, and one that has not been added to the stats recording will
+        be added with default parameters.
+        Args:
+            message: Message that was received
 
-        user: User = self._stats[username]
-        split_command: List[str] = (
-            message.text.split(" ") if message.text.startswith("!") else ""
+        Returns:
+            None
+        """
+        started: float = time.perf_counter()
+        chatter: twitch.helix.User = message.user
+        logging.info("Received message: %s", message.text)
+        user: Optional[User] = self._stats.identify(
+            chatter.id, chatter.display_name, chatter.login
         )
-        if username == self._owner:
-            self._handle_command(user, message, split_command, Level.OWNER)
-        elif self._stats[username].level == Level.MOD:
-            self._handle_command(user, message, split_command, Level.MOD)
-        else:
-            self._handle_command(user, message, split_command, Level.USER)
+        if user is None:
+            user = User(chatter.display_name, id=chatter.id, twitch_login=chatter.login)
+            self.add_user(user)
+
+        self._handle_command(user, message, self._level_of(user))
         self._update_user(user)
+        self._message_seconds.observe(time.perf_counter() - started)
+
+    def _level_of(self, user: User) -> Level:
+        """
+        Gets the level a chatter's commands run at
+        Args:
+            user: User that sent a message
+
+        Returns:
+            Level
+        """
+        if user.login == normalize_login(self._owner):
+            return Level.OWNER
+        if user.level in (Level.MOD, Level.VIP):
+            return user.level
+        return Level.USER
 
     def _handle_command(
         self,
         user: User,
         message: twitch.chat.Message,
-        split_command: List[str],
         level: Level,
     ) -> None:
         """
@@ -145,50 +339,73 @@ class Twitchy:
         Args:
             user: User that invoked the command
             message: Message holding the command
-            split_command: List[str] of the command type and any subsequent args
             level: Level of the command
 
         Returns:
             None
         """
-        if not split_command:
+        route: Optional[Route] = router.route(message.text, level)
+        if route is None:
             return
 
-        user_command_delta: float = time.time() - user.last_command
-        command_name: str = split_command[SPLIT_COMMAND_NAME]
-
-        def execute_command(command_to_execute: Command) -> None:
-            try:
-                if (
-                    len(split_command) > 1
-                    and HELP_COMMAND.description
-                    in split_command[SPLIT_COMMAND_ARGS].upper()
-                ):
-                    HELP_COMMAND(
-                        self,
-                        message,
-                        command_to_execute,
-                    )
-                else:
-                    command_to_execute(
-                        self, message, *split_command[SPLIT_COMMAND_ARGS:]
-                    )
-            except Exception as e:
-                logging.error("Error executing command: %s", e)
-
-        if level == Level.OWNER:
-            command: Command = owner_commands.get(command_name, INVALID_COMMAND)
-        elif level == Level.MOD:
-            command: Command = mod_commands.get(command_name, INVALID_COMMAND)
-        else:
-            delay: float = (
-                User.VIP_COMMAND_DELAY if level == Level.VIP else User.COMMAND_DELAY
+        if level in USER_COOLDOWNS:
+            remaining: float = self._cooldowns.acquire(
+                self._cooldown_limits(user, route, level)
             )
-            if user_command_delta <= delay:
-                DELAY_NOT_MET_COMMAND(self, message, user_command_delta, level)
+            if remaining:
+                self._cooldown_rejections.inc()
+                DELAY_NOT_MET_COMMAND(self, message, remaining, level)
                 return
-            command: Command = commands.get(command_name, INVALID_COMMAND)
-        execute_command(command)
+        self._execute(route, message)
+
+    def _execute(self, route: Route, message: twitch.chat.Message) -> None:
+        """
+        Runs a routed command once its cooldowns have been charged
+        Args:
+            route: Route the message resolved to
+            message: Message holding the command
+
+        Returns:
+            None
+        """
+        name: str = route.name or "invalid"
+        started: float = time.perf_counter()
+        try:
+            if route.help_for:
+                HELP_COMMAND(self, message, route.help_for)
+            elif route.error:
+                USAGE_COMMAND(self, message, route.usage_for, route.error)
+            else:
+                route.command(self, message, *route.args)
+        except Exception as e:
+            self._command_errors.labels(name).inc()
+            logging.error("Error executing command: %s", e)
+        self._command_seconds.labels(name).observe(time.perf_counter() - started)
+
+    @staticmethod
+    def _cooldown_limits(
+        user: User, route: Route, level: Level
+    ) -> List[Tuple[Hashable, Optional[Cooldown]]]:
+        """
+        Builds the cooldown keys charged when a chatter uses a command. Help requests,
+        usage errors and unknown commands only count against the chatter's own limit.
+        Chatters are charged under their key, so changing name keeps their cooldowns.
+        Args:
+            user: User that invoked the command
+            route: Route the command resolved to
+            level: Level of the command
+
+        Returns:
+            List[Tuple[Hashable, Optional[Cooldown]]]
+        """
+        limits: List[Tuple[Hashable, Optional[Cooldown]]] = [
+            (("user", user.key), USER_COOLDOWNS[level])
+        ]
+        command: Optional[Command] = route.command
+        if command is not None and command is not INVALID_COMMAND:
+            limits.append((("command", user.key, command), command.COOLDOWN))
+            limits.append((("global", command), command.GLOBAL_COOLDOWN))
+        return limits
 
     def _update_user(self, user: User) -> None:
         """
@@ -199,46 +416,33 @@ class Twitchy:
         Returns:
             None
         """
-        with self._file_mutex:
+        with self._stats.mutex:
             user.last_chat = time.time()
             user.messages_sent += 1
-            self._stats[user.name] = user
+            self._stats.mark_dirty(user.key)
 
-    def _file_write_loop(self) -> None:
+    def _finish_event(self, name: str, event: BotEvent) -> Optional[float]:
         """
-        Function to be run in a thread, writing the current user stats to file after
-        a certain sleep period.
-        Returns:
-            None
-        """
-        while not self._end_event.is_set():
-            time.sleep(WRITE_DELAY_SECONDS)
-            with self._file_mutex:
-                with open(STATS_PATH, "w") as file:
-                    user_list: List[Dict] = [
-                        user.to_dict() for user in self._stats.values()
-                    ]
-                    data: Dict = {}
-                    for user in user_list:
-                        key: str = list(user.keys())[0]
-                        data[key] = user[key]
-                    file.write(json.dumps(data, indent=4))
-
-    def _monitor_loop(self) -> None:
-        """
-        Function to be run in a thread, monitoring for something to happen.
+        Scheduler callback running an event that came due
+        Args:
+            name: str name the event was added under
+            event: BotEvent that came due
+
         Returns:
-            None
+            Optional[float] deadline to run it again at, or None once it is over
         """
-        while not self._end_event.is_set():
-            time.sleep(1)
-            with self._queue_mutex:
-                to_clear: List[str] = []
-                for name, event in self._events.items():
-                    event: Optional[BotEvent] = event.finish()
-                    if event:
-                        to_clear.append(name)
-                [self._events.pop(name) for name in to_clear].clear()
+        with self._queue_mutex:
+            if self._events.get(name) is not event:
+                return None
+            if event.finish():
+                self._events.pop(name)
+                self._status_sent.pop(name, None)
+                self._status_pending.discard(name)
+                self._scheduler.cancel((self, name, "status"))
+                self._event_log.remove(name)
+                return None
+            self._event_log.put(name, event.to_dict())
+            return event.deadline
 
     def _monitor_chatters(self) -> None:
         """
@@ -247,39 +451,139 @@ class Twitchy:
             None
         """
         while not self._end_event.is_set():
-            with self._chatters_mutex:
+            try:
                 self._get_chatters()
-            time.sleep(5)
+            except Exception as e:
+                logging.error("Error getting chatters: %s", e)
+            self._end_event.wait(CHATTERS_POLL_SECONDS)
 
-    def _load_stats(self) -> None:
+    def _register_metrics(self) -> None:
         """
-        Opens 'stats,json' and loads user statistics data
+        Exports the totals the bot's components already keep, read at scrape time
         Returns:
             None
         """
-        stats: Dict[str, User] = {}
-        if not os.path.exists(STATS_PATH):
-            with open(STATS_PATH, "w+") as file:
-                default_user = User(self._owner, Level.OWNER, time.time())
-                file.write(json.dumps(default_user.to_dict(), indent=4))
+        for name, kind, description, read in (
+            (
+                "twitchy_messages_received_total",
+                COUNTER,
+                "Chat messages received",
+                lambda: self._ingestion.counters.received,
+            ),
+            (
+                "twitchy_messages_failed_total",
+                COUNTER,
+                "Chat messages whose handling raised",
+                lambda: self._ingestion.counters.failed,
+            ),
+            (
+                "twitchy_ingestion_queue_depth",
+                GAUGE,
+                "Chat messages waiting to be processed",
+                lambda: self._ingestion.counters.queue_depth,
+            ),
+            (
+                "twitchy_dirty_users",
+                GAUGE,
+                "Users changed since the last flush",
+                lambda: self._stats.dirty_count,
+            ),
+            (
+                "twitchy_cooldown_keys",
+                GAUGE,
+                "Cooldown windows currently tracked",
+                lambda: len(self._cooldowns),
+            ),
+        ):
+            self._metrics.callback(name, description, kind, read)
+        self._outbound.register_metrics(self._metrics)
+        self._presence.register_metrics(self._metrics)
+        if self._owns_services:
+            self._flusher.register_metrics(self._metrics)
 
-        with open(STATS_PATH, "r+") as file:
-            data = json.loads(file.read())
-            for key, value in data.items():
-                stats[key] = User.from_dict(key, value)
+    def _load_stats(self) -> None:
+        """
+        Opens the user stats store, seeding it with the owner if it is empty
+        Returns:
+            None
+        """
+        self._stats.load(User(self._owner, Level.OWNER, time.time()))
 
-        self._stats = stats
+    def _restore_events(self) -> None:
+        """
+        Reschedules the polls and broadcasts that were running when the bot last
+        stopped. Any that came due while it was down run straight away.
+        Returns:
+            None
+        """
+        with self._queue_mutex:
+            poll_id: int = 0
+            for name, values in self._event_log.load().items():
+                try:
+                    event: BotEvent = event_from_dict(self, values)
+                except (KeyError, TypeError, ValueError) as e:
+                    logging.error("Dropping unreadable event %s: %s", name, e)
+                    self._event_log.remove(name)
+                    continue
+                if isinstance(event, PollBotEvent):
+                    poll_id = max(poll_id, event.id)
+                    self._status_sent[name] = time.monotonic()
+                self._schedule_event(name, event)
+            self._poll_ids = itertools.count(poll_id + 1)
+            if self._events:
+                logging.info("Restored %s events", len(self._events))
+
+    def stop(self) -> None:
+        """
+        Stops the background threads and synchronously flushes any unsaved stats
+        Returns:
+            None
+        """
+        logging.info("Stopping Twitchy")
+        self._ingestion.stop()
+        self._outbound.stop()
+        if self._owns_services:
+            self._flusher.stop()
+            self._scheduler.stop()
+        else:
+            self._end_event.set()
+            self._flusher.remove_store(self._stats)
+            with self._queue_mutex:
+                for name in self._events:
+                    self._scheduler.cancel((self, name))
+                    self._scheduler.cancel((self, name, "status"))
+        self._event_log.close()
+        self._chatter_thread.join()
+        self._stats.close()
 
     def _get_chatters(self) -> None:
-        data: Dict = self._bot.helix.api.get(
-            "/chat/chatters",
-            params={
-                "broadcaster_id": self._bot.helix.user(self._owner).id,
-                "moderator_id": self._bot.helix.user(self._bot_name).id,
-            },
-        )
-        self._current_chatters = [Chatter.from_data(user) for user in data["data"]]
-        logging.debug("Current chatters: %s", self._current_chatters)
+        joined, parted = self._presence.poll()
+        if joined or parted:
+            logging.debug(
+                "Joined chat: %s, left chat: %s",
+                [chatter.name for chatter in joined],
+                [chatter.name for chatter in parted],
+            )
+
+    def _fetch_chatters(self, params: Dict[str, str]) -> Dict:
+        """
+        Requests one page of the channel's chatters from Helix
+        Args:
+            params: Dict[str, str] query parameters
+
+        Returns:
+            Dict response body
+        """
+        started: float = time.perf_counter()
+        try:
+            return self._bot.helix.api.get("/chat/chatters", params=params)
+        except Exception:
+            self._helix_errors.labels("chatters").inc()
+            raise
+        finally:
+            self._helix_seconds.labels("chatters").observe(
+                time.perf_counter() - started
+            )
 
     def add_user(self, user: User) -> None:
         """
@@ -291,7 +595,18 @@ class Twitchy:
             None
         """
         logging.info("Adding user: %s", user.name)
-        self._stats[user.name] = user
+        self._stats.add(user)
+
+    def mark_dirty(self, username: str) -> None:
+        """
+        Flags a user as changed so it is written out on the next flush
+        Args:
+            username: str name of the changed user
+
+        Returns:
+            None
+        """
+        self._stats.mark_dirty(username)
 
     def set_user_level(self, username: str, level: Level) -> None:
         """
@@ -306,6 +621,7 @@ class Twitchy:
         if self._stats[username].level not in (Level.MOD, Level.OWNER):
             logging.info("Setting User: %s 's level to %s", username, level)
             self._stats[username].level = level
+            self.mark_dirty(username)
 
     def reroll_user_stats(self, username: str):
         """
@@ -319,32 +635,53 @@ class Twitchy:
         logging.info("Rerolling User: %s 's stats", username)
         self._stats[username].player_stats = PlayerStats.new()
         self._stats[username].last_reroll = time.time()
+        self.mark_dirty(username)
 
-    def send(self, message: str) -> None:
+    def set_moderator(self, moderator: bool) -> None:
         """
-        Sends a provided message to the chat channel
+        Sets whether the bot is a moderator or the broadcaster, which raises the
+        number of messages Twitch lets it send
+        Args:
+            moderator: bool moderator status of the bot
+
+        Returns:
+            None
+        """
+        self._outbound.set_limit(OUTBOUND_MOD_LIMIT if moderator else OUTBOUND_LIMIT)
+
+    def send(self, message: str, priority: Priority = Priority.NORMAL) -> None:
+        """
+        Queues a provided message to be sent to the chat channel within Twitch's
+        rate limits
         Args:
             message: str message to be sent
+            priority: Priority of the message, HIGH for moderation actions and LOW
+                for messages nobody is waiting on
 
         Returns:
             None
         """
         logging.debug("Sending message: %s", message)
-        self._bot.send(message)
+        self._outbound.put(message, priority)
 
     def add_poll(self, event: PollBotEvent) -> None:
         """
-
+        Starts a poll alongside any already running, giving it the next poll id
         Args:
-            event:
+            event: PollBotEvent to start
 
         Returns:
-
+            None
         """
-        if self.add_event("current_poll", event):
-            self.send(f"Created a new poll for: {event.title}")
-        else:
-            self.send("There is already a poll running!")
+        with self._queue_mutex:
+            if len(self.polls()) >= MAX_POLLS:
+                self.send(f"There are already {MAX_POLLS} polls running!")
+                return
+            event.id = next(self._poll_ids)
+            name: str = POLL_EVENT_FORMAT.format(id=event.id)
+            self._status_sent[name] = time.monotonic()
+            if self.add_event(name, event):
+                self.send(f"Created poll #{event.id} for: {event.title}")
 
     def add_event(self, name: str, event: BotEvent) -> bool:
         """
@@ -358,37 +695,160 @@ class Twitchy:
 
         with self._queue_mutex:
             try:
-                self._events[name] = event
+                self._schedule_event(name, event)
+                self._event_log.put(name, event.to_dict())
                 return True
             except KeyError as e:
                 logging.error("Error inserting event: %s", e)
                 return False
 
-    def update_poll(self, user: str, choice: str) -> None:
+    def _schedule_event(self, name: str, event: BotEvent) -> None:
         """
-
+        Adds an event and schedules it for its deadline. Must be called holding the
+        queue mutex.
         Args:
-            user (str):
-            choice (str):
+            name: str name of the event, replacing any event of the same name
+            event: BotEvent to run
 
         Returns:
+            None
+        """
+        self._events[name] = event
+        self._scheduler.schedule(
+            (self, name), event.deadline, lambda: self._finish_event(name, event)
+        )
+
+    def update_poll(self, voter: str, user: str, choice: str, poll_id: int = 0) -> None:
+        """
+        Votes in a poll, changing the voter's earlier vote if they had one. Votes are
+        not acknowledged one by one; the poll's tallies are announced at most once
+        every POLL_STATUS_SECONDS instead.
+        Args:
+            voter (str): Twitch user id of the voter
+            user (str): display name of the voter
+            choice (str): choice voted for
+            poll_id (int): id of the poll, 0 for the newest one
 
+        Returns:
+            None
         """
         with self._queue_mutex:
+            poll: Optional[PollBotEvent] = self._poll(poll_id)
+            if poll is None:
+                self.send(f"@{user} there is no such poll running!")
+                return
             try:
-                self._events["current_poll"].vote(choice)
-                self.send(f"Thank you @{user} for voting for {choice}!")
-            except KeyError as e:
-                self._bot.send(f"{choice} isn't in this poll...")
-                logging.error("Error getting current poll: %s", e)
+                previous: Optional[str] = poll.vote(voter, choice)
+            except KeyError:
+                self.send(f"{choice} isn't in poll #{poll.id}...")
+                return
+            if previous != choice:
+                self._event_log.vote(
+                    POLL_EVENT_FORMAT.format(id=poll.id), voter, choice
+                )
+                self._announce(poll)
+
+    def retract_vote(self, voter: str, user: str, poll_id: int = 0) -> None:
+        """
+        Withdraws a vote from a poll
+        Args:
+            voter (str): Twitch user id of the voter
+            user (str): display name of the voter
+            poll_id (int): id of the poll, 0 for the newest one
+
+        Returns:
+            None
+        """
+        with self._queue_mutex:
+            poll: Optional[PollBotEvent] = self._poll(poll_id)
+            previous: Optional[str] = poll.retract(voter) if poll else None
+            if previous is not None:
+                self._event_log.retract(POLL_EVENT_FORMAT.format(id=poll.id), voter)
+                self._announce(poll)
+        if previous is None:
+            self.send(f"@{user} you haven't voted!")
+        else:
+            self.send(f"@{user} took back their vote for {previous}.")
+
+    def polls(self, poll_id: int = 0) -> List[PollBotEvent]:
+        """
+        Gets the running polls
+        Args:
+            poll_id (int): id of one poll to get, 0 for all of them
 
-    def get_current_poll_info(self) -> Optional[PollBotEvent]:
+        Returns:
+            List[PollBotEvent] oldest first
         """
+        with self._queue_mutex:
+            if poll_id:
+                poll: Optional[BotEvent] = self._events.get(
+                    POLL_EVENT_FORMAT.format(id=poll_id)
+                )
+                return [poll] if isinstance(poll, PollBotEvent) else []
+            return [
+                event
+                for event in self._events.values()
+                if isinstance(event, PollBotEvent)
+            ]
+
+    def _poll(self, poll_id: int) -> Optional[PollBotEvent]:
+        """
+        Finds a running poll, the newest one if no id is given. Must be called
+        holding the queue mutex.
+        Args:
+            poll_id (int): id of the poll, 0 for the newest one
 
         Returns:
+            Optional[PollBotEvent]
+        """
+        if poll_id:
+            poll: Optional[BotEvent] = self._events.get(
+                POLL_EVENT_FORMAT.format(id=poll_id)
+            )
+            return poll if isinstance(poll, PollBotEvent) else None
+        for event in reversed(list(self._events.values())):
+            if isinstance(event, PollBotEvent):
+                return event
+        return None
+
+    def _announce(self, poll: PollBotEvent) -> None:
+        """
+        Schedules a status message for a poll whose tallies changed, unless one is
+        already pending. It is sent POLL_STATUS_SECONDS after the previous one, so
+        however many votes arrive in between they cost a single chat message. Must
+        be called holding the queue mutex.
+        Args:
+            poll: PollBotEvent that changed
 
+        Returns:
+            None
         """
-        return self._events.get("current_poll")
+        name: str = POLL_EVENT_FORMAT.format(id=poll.id)
+        if name in self._status_pending:
+            return
+        self._status_pending.add(name)
+        self._scheduler.schedule(
+            (self, name, "status"),
+            self._status_sent.get(name, 0) + POLL_STATUS_SECONDS,
+            lambda: self._send_status(name, poll),
+        )
+
+    def _send_status(self, name: str, poll: PollBotEvent) -> None:
+        """
+        Scheduler callback announcing the tallies of a poll
+        Args:
+            name: str name the poll was added under
+            poll: PollBotEvent to announce
+
+        Returns:
+            None
+        """
+        with self._queue_mutex:
+            self._status_pending.discard(name)
+            if self._events.get(name) is not poll:
+                return
+            self._status_sent[name] = time.monotonic()
+            poll.current_status()
 
     def update_user(self, user: User) -> None:
         """
@@ -401,5 +861,5 @@ class Twitchy:
         """
         logging.debug("Updating %s", user.name)
         print("pre", self._stats[user.name])
-        self._stats.update({user.name: user})
+        self._stats.add(user)
         print("post", self._stats[user.name])
@@ -0,0 +1,128 @@
+""" Runs the bot in several channels from one process """
+
+import logging
+import os
+from typing import Callable, Dict, List, Optional
+
+import twitch
+
+from bot.bot import Twitchy, create_helix
+from bot.services import SharedServices
+from bot.shared_chat import SharedChat
+from storage import create_event_journal, create_store
+from util.constants import CHANNEL_DIRECTORY_FORMAT, DATA_DIRECTORY
+from util.metrics import Registry
+
+ChatFactory = Callable[[str, str, str, twitch.Helix], twitch.Chat]
+
+
+class ChannelGroup:
+    """
+    One Twitchy per channel, each with its own commands, events, cooldowns,
+    chatters and outbound queue, sharing everything that does not need to be
+    separate: the Helix client and its cache, the thread pool running message
+    handlers, the thread flushing stats and the thread timing events. Chat is read
+    over one connection joined to every channel, see bot.shared_chat.SharedChat.
+
+    Each channel keeps its users in its own store, so levels granted in one channel
+    never apply in another. The first channel uses the default data directory,
+    which keeps a single channel deployment's existing stats, and every other
+    channel gets a directory of its own.
+    """
+
+    def __init__(
+        self,
+        channels: Dict[str, str],
+        nickname: str,
+        oauth: str,
+        client_id: str,
+        client_secret: str,
+        backend: str,
+        moderator: bool = False,
+        connect: Optional[ChatFactory] = None,
+        helix: Optional[twitch.Helix] = None,
+    ) -> None:
+        """
+        Args:
+            channels: Dict[str, str] of channel name to the name of its owner
+            nickname: str name of the bot account
+            oauth: str OAuth token of the bot account
+            client_id: str Helix client ID
+            client_secret: str Helix client secret
+            backend: str stats storage backend
+            moderator: bool whether the bot is a moderator in every channel
+            connect: Optional[ChatFactory] opening a stand-in chat connection per
+                channel, every channel shares one connection if not given
+            helix: Optional[twitch.Helix] to share, created if not given
+        """
+        if not channels:
+            raise ValueError("At least one channel is required")
+        self._helix: twitch.Helix = helix or create_helix(
+            client_id, client_secret, oauth
+        )
+        self._metrics: Registry = Registry()
+        self._services: SharedServices = SharedServices.start(self._metrics)
+        self._connection: Optional[SharedChat] = (
+            None if connect else SharedChat(nickname, oauth, self._helix)
+        )
+
+        self._bots: Dict[str, Twitchy] = {}
+        for index, (channel, owner) in enumerate(channels.items()):
+            name: str = channel.lstrip("#").lower()
+            directory: str = (
+                DATA_DIRECTORY
+                if index == 0
+                else CHANNEL_DIRECTORY_FORMAT.format(channel=name)
+            )
+            os.makedirs(directory, exist_ok=True)
+            self._bots[name] = Twitchy(
+                owner,
+                f"#{name}",
+                nickname,
+                oauth,
+                client_id,
+                client_secret,
+                create_store(backend, directory),
+                moderator,
+                (
+                    connect(f"#{name}", nickname, oauth, self._helix)
+                    if connect
+                    else self._connection.join(name)
+                ),
+                self._helix,
+                self._services,
+                Registry({"channel": name}),
+                create_event_journal(directory),
+            )
+            logging.info("Started in #%s", name)
+
+    @property
+    def bots(self) -> Dict[str, Twitchy]:
+        """
+        Gets the bot of every channel, keyed by channel name without the '#'
+        Returns:
+            Dict[str, Twitchy]
+        """
+        return dict(self._bots)
+
+    @property
+    def registries(self) -> List[Registry]:
+        """
+        Gets the shared metrics followed by those of every channel
+        Returns:
+            List[Registry]
+        """
+        return [self._metrics, *(bot.metrics for bot in self._bots.values())]
+
+    def stop(self) -> None:
+        """
+        Stops every channel, then flushes and stops the shared services and closes
+        the chat connection
+        Returns:
+            None
+        """
+        for bot in self._bots.values():
+            bot.stop()
+        self._services.stop()
+        if self._connection:
+            self._connection.close()
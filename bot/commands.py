@@ -1,6 +1,7 @@
 import os
-from typing import Dict
+from typing import Dict, List
 
+from bot.router import CommandRouter
 from data_types.commands import (
     Command,
     OnInvalidCommand,
@@ -10,6 +11,7 @@ from data_types.commands import (
     OnMessagesCommand,
     OnRollCommand,
     OnVoteCommand,
+    OnRetractVoteCommand,
     OnHelpCommand,
     OnBonkCommand,
     OnGetBonksCommand,
@@ -23,11 +25,15 @@ from data_types.commands import (
     OnGetPointsCommand,
     OnGetCommands,
     OnSetBroadcastCommand,
+    OnUsageErrorCommand,
 )
+from data_types.cooldown import Cooldown
+from data_types.user import Level
 
 INVALID_COMMAND: Command = OnInvalidCommand("ERROR", "")
 DELAY_NOT_MET_COMMAND: Command = OnDelayNotMetCommand("ERROR", "")
 HELP_COMMAND: Command = OnHelpCommand("HELP", "")
+USAGE_COMMAND: Command = OnUsageErrorCommand("ERROR", "")
 
 commands: Dict[str, Command] = {
     "!messages": OnMessagesCommand(
@@ -48,9 +54,15 @@ commands: Dict[str, Command] = {
     "!hug": OnHugCommand("Hugs someone!", "!hug [user]"),
     "!hugged?": OnGetHugsCommand("How many times have you been hugged?", "!hugged?"),
     "!points?": OnGetPointsCommand("How many points do you have?", "!points?"),
-    "!vote": OnVoteCommand("Votes for a poll choice!", "!vote [choice]"),
+    "!vote": OnVoteCommand(
+        "Votes for a poll choice, or changes your vote! Votes in the newest poll "
+        "unless given a poll number",
+        "!vote [choice] [poll]",
+    ),
+    "!unvote": OnRetractVoteCommand("Takes back your poll vote.", "!unvote [poll]"),
     "!current_poll": OnGetCurrentPoll(
-        "Gets the current poll information!", "!current_poll"
+        "Gets the leading choices of every running poll, or of one poll!",
+        "!current_poll [poll]",
     ),
     "!commands": OnGetCommands(
         "Returns a link to the current user command sheet!"
@@ -84,6 +96,36 @@ owner_commands: Dict[str, Command] = {
 mod_commands.update(commands)
 owner_commands.update(mod_commands)
 
+aliases: Dict[str, str] = {
+    "!whoami": "!who_am_i",
+    "!reroll": "!reroll_me",
+    "!bonks": "!bonked?",
+    "!hugs": "!hugged?",
+    "!points": "!points?",
+    "!poll": "!current_poll",
+    "!help": "!commands",
+    "!vips": "!set_vips",
+    "!mods": "!set_mods",
+    "!poll_start": "!start_poll",
+    "!broadcast": "!start_broadcast",
+}
+
+router: CommandRouter = CommandRouter(
+    {
+        Level.USER: commands,
+        Level.VIP: commands,
+        Level.MOD: mod_commands,
+        Level.OWNER: owner_commands,
+    },
+    aliases,
+    INVALID_COMMAND,
+)
+
+
+def _describe(cooldown: Cooldown) -> str:
+    uses: str = "once" if cooldown.burst == 1 else f"{cooldown.burst} times"
+    return f"{uses} every {cooldown.window:g} seconds"
+
 
 def generate_markdown(our_dicts: Dict[str, Dict[str, Command]]) -> None:
     """
@@ -100,9 +142,24 @@ def generate_markdown(our_dicts: Dict[str, Dict[str, Command]]) -> None:
         with open(filename, "w") as file:
             file.write(f"# {dict_name.replace('_', ' ').title()}\n\n")
             for command, details in command_dict.items():
+                alternatives: List[str] = [
+                    alias for alias, name in aliases.items() if name == command
+                ]
                 file.write(f"## {command}\n")
                 file.write(f"**Description:** {details.description}\n")
-                file.write(f"**Usage:** `{details.example}`\n\n")
+                file.write(f"**Usage:** `{details.example}`\n")
+                if alternatives:
+                    file.write(f"**Aliases:** `{'`, `'.join(alternatives)}`\n")
+                # Moderators and the owner are exempt from cooldowns
+                if details.COOLDOWN and command_dict is commands:
+                    file.write(
+                        f"**Cooldown:** {_describe(details.COOLDOWN)} per user\n"
+                    )
+                if details.GLOBAL_COOLDOWN and command_dict is commands:
+                    file.write(
+                        f"**Cooldown:** {_describe(details.GLOBAL_COOLDOWN)} per channel\n"
+                    )
+                file.write("\n")
 
 
 dictionaries = {
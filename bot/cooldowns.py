@@ -0,0 +1,93 @@
+""" Sliding-window cooldowns with expiries tracked on a heap """
+
+import heapq
+import time
+from collections import deque
+from threading import Lock
+from typing import Deque, Dict, Hashable, List, Optional, Sequence, Tuple
+
+from data_types.cooldown import Cooldown
+
+
+class CooldownEngine:
+    """
+    Tracks recent uses for any number of independent cooldown keys, such as one
+    chatter, one chatter using one command, or one command across the channel.
+    Each key remembers at most burst use times, and is forgotten as soon as its
+    newest use falls out of its window. Expiries are kept on a min-heap so
+    eviction only ever looks at keys that are due, and memory stays proportional
+    to the keys used recently rather than to every chatter ever seen.
+    """
+
+    def __init__(self) -> None:
+        self._uses: Dict[Hashable, Deque[float]] = {}
+        self._expires: Dict[Hashable, float] = {}
+        self._expiries: List[Tuple[float, int, Hashable]] = []
+        self._sequence: int = 0
+        self._mutex: Lock = Lock()
+
+    def acquire(
+        self,
+        limits: Sequence[Tuple[Hashable, Optional[Cooldown]]],
+        now: Optional[float] = None,
+    ) -> float:
+        """
+        Records a use against every key if none of their cooldowns is active. Either
+        all keys are charged or none are.
+        Args:
+            limits: Sequence[Tuple[Hashable, Optional[Cooldown]]] keys with their
+                cooldowns, None meaning the key is not limited
+            now: Optional[float] current monotonic time, for testing
+
+        Returns:
+            float 0 if the use was allowed, otherwise seconds until it would be
+        """
+        now = time.monotonic() if now is None else now
+        with self._mutex:
+            self._evict(now)
+            wait: float = 0.0
+            for key, cooldown in limits:
+                if cooldown:
+                    wait = max(wait, self._remaining(key, cooldown, now))
+            if wait:
+                return wait
+            for key, cooldown in limits:
+                if cooldown:
+                    self._record(key, cooldown, now)
+            return 0.0
+
+    def _remaining(self, key: Hashable, cooldown: Cooldown, now: float) -> float:
+        uses: Optional[Deque[float]] = self._uses.get(key)
+        if not uses or len(uses) < cooldown.burst:
+            return 0.0
+        return max(0.0, uses[0] + cooldown.window - now)
+
+    def _record(self, key: Hashable, cooldown: Cooldown, now: float) -> None:
+        uses: Optional[Deque[float]] = self._uses.get(key)
+        if uses is None or uses.maxlen != cooldown.burst:
+            uses = deque(uses or (), maxlen=cooldown.burst)
+            self._uses[key] = uses
+        uses.append(now)
+        self._expires[key] = now + cooldown.window
+        self._sequence += 1
+        heapq.heappush(self._expiries, (now + cooldown.window, self._sequence, key))
+
+    def _evict(self, now: float) -> None:
+        """
+        Forgets every key whose newest use has left its window. Heap entries for
+        keys used again since are stale and simply discarded.
+        Args:
+            now: float current monotonic time
+
+        Returns:
+            None
+        """
+        while self._expiries and self._expiries[0][0] <= now:
+            _, _, key = heapq.heappop(self._expiries)
+            if self._expires.get(key, now) <= now:
+                self._uses.pop(key, None)
+                self._expires.pop(key, None)
+
+    def __len__(self) -> int:
+        with self._mutex:
+            return len(self._uses)
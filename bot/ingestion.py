@@ -0,0 +1,213 @@
+""" Bounded, per-user ordered processing of incoming chat messages """
+
+import asyncio
+import logging
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from threading import Event, Lock, Thread
+from typing import Callable, Generic, List, Optional, Tuple, TypeVar
+
+from util.metrics import Histogram
+from util.slots import slotted
+
+T = TypeVar("T")
+
+
+@slotted
+@dataclass
+class IngestionCounters:
+    """
+    Running totals describing the work done by an IngestionPipeline
+    """
+
+    received: int = 0
+    processed: int = 0
+    failed: int = 0
+    queue_depth: int = 0
+    max_queue_depth: int = 0
+    total_latency_s: float = 0.0
+    max_latency_s: float = 0.0
+
+
+class IngestionPipeline(Generic[T]):
+    """
+    Moves message handling off the thread that reads from chat. Submitted items are
+    routed by a stable hash of their key to one of several bounded asyncio queues,
+    each drained in order by its own worker, so items sharing a key (the chatter)
+    are handled one at a time and in arrival order while different chatters are
+    handled concurrently. Handlers are ordinary blocking functions and run on a
+    thread pool with one thread per worker.
+
+    When a queue is full, submit blocks the reader until there is room rather than
+    dropping the message. Items submitted once the pipeline has stopped are dropped.
+
+    Several pipelines may share one executor, e.g. one per channel. Each pipeline
+    keeps at most one item per worker in flight, so a busy pipeline can never hold
+    more than its share of the executor's first-in first-out work queue and a quiet
+    one's items are reached within a round of the others.
+    """
+
+    def __init__(
+        self,
+        handler: Callable[[T], None],
+        key: Callable[[T], str],
+        workers: int,
+        capacity: int,
+        latency: Optional[Histogram] = None,
+        executor: Optional[ThreadPoolExecutor] = None,
+    ) -> None:
+        """
+        Args:
+            handler: Callable[[T], None] processing one item
+            key: Callable[[T], str] giving the ordering key of an item, called on
+                the submitting thread so it must not block
+            workers: int number of concurrent workers
+            capacity: int total number of items that may wait across all queues
+            latency: Optional[Histogram] recording each item's time from submit to
+                handled
+            executor: Optional[ThreadPoolExecutor] shared with other pipelines,
+                otherwise one with a thread per worker is created and owned
+        """
+        self._handler: Callable[[T], None] = handler
+        self._key: Callable[[T], str] = key
+        self._workers: int = workers
+        self._latency: Optional[Histogram] = latency
+        self._queue_size: int = max(1, capacity // workers)
+        self._loop: asyncio.AbstractEventLoop = asyncio.new_event_loop()
+        self._queues: List[asyncio.Queue] = []
+        self._tasks: List[asyncio.Task] = []
+        self._owns_executor: bool = executor is None
+        self._executor: ThreadPoolExecutor = executor or ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="ingestion"
+        )
+        self._ready: Event = Event()
+        self._thread: Thread = Thread(target=self._run, name="ingestion-loop")
+        self._counters: IngestionCounters = IngestionCounters()
+        self._counters_mutex: Lock = Lock()
+        # Held while submitting, so stop() never closes the loop under a submit
+        self._submit_mutex: Lock = Lock()
+        self._stopped: bool = False
+
+    @property
+    def counters(self) -> IngestionCounters:
+        """
+        Gets a copy of the ingestion counters
+        Returns:
+            IngestionCounters
+        """
+        with self._counters_mutex:
+            return IngestionCounters(
+                self._counters.received,
+                self._counters.processed,
+                self._counters.failed,
+                sum(queue.qsize() for queue in self._queues),
+                self._counters.max_queue_depth,
+                self._counters.total_latency_s,
+                self._counters.max_latency_s,
+            )
+
+    def start(self) -> None:
+        """
+        Starts the event loop thread and its workers
+        Returns:
+            None
+        """
+        self._thread.start()
+        self._ready.wait()
+
+    def submit(self, item: T) -> None:
+        """
+        Queues an item for processing, blocking while its queue is full. Safe to call
+        from any thread other than the pipeline's own. Once the pipeline has stopped
+        the item is dropped.
+        Args:
+            item: T to process
+
+        Returns:
+            None
+        """
+        index: int = zlib.crc32(self._key(item).encode("utf-8")) % self._workers
+        with self._submit_mutex:
+            if self._stopped:
+                logging.warning("Dropped message submitted after ingestion stopped")
+                return
+            queue: asyncio.Queue = self._queues[index]
+            asyncio.run_coroutine_threadsafe(
+                queue.put((item, time.perf_counter())), self._loop
+            ).result()
+        with self._counters_mutex:
+            self._counters.received += 1
+            self._counters.max_queue_depth = max(
+                self._counters.max_queue_depth,
+                sum(queue.qsize() for queue in self._queues),
+            )
+
+    def stop(self) -> None:
+        """
+        Processes everything already queued, then stops the workers and the loop
+        Returns:
+            None
+        """
+        with self._submit_mutex:
+            self._stopped = True
+        if not self._thread.is_alive():
+            return
+        asyncio.run_coroutine_threadsafe(self._drain(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        if self._owns_executor:
+            self._executor.shutdown()
+
+    def _run(self) -> None:
+        asyncio.set_event_loop(self._loop)
+        self._queues = [
+            asyncio.Queue(maxsize=self._queue_size) for _ in range(self._workers)
+        ]
+        self._tasks = [
+            self._loop.create_task(self._work(queue)) for queue in self._queues
+        ]
+        self._ready.set()
+        try:
+            self._loop.run_forever()
+        finally:
+            self._loop.close()
+
+    async def _drain(self) -> None:
+        for queue in self._queues:
+            await queue.join()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    async def _work(self, queue: asyncio.Queue) -> None:
+        """
+        Handles the items of one queue strictly in order
+        Args:
+            queue: asyncio.Queue of (item, enqueue time) pairs
+
+        Returns:
+            None
+        """
+        while True:
+            entry: Tuple[T, float] = await queue.get()
+            item, queued_at = entry
+            failed: bool = False
+            try:
+                await self._loop.run_in_executor(self._executor, self._handler, item)
+            except Exception as e:
+                failed = True
+                logging.error("Error handling message: %s", e)
+            finally:
+                queue.task_done()
+            latency: float = time.perf_counter() - queued_at
+            if self._latency:
+                self._latency.observe(latency)
+            with self._counters_mutex:
+                self._counters.processed += 1
+                self._counters.failed += failed
+                self._counters.total_latency_s += latency
+                self._counters.max_latency_s = max(
+                    self._counters.max_latency_s, latency
+                )
@@ -0,0 +1,314 @@
+""" Rate-limited, prioritised queue for messages the bot sends to chat """
+
+import logging
+import time
+from collections import deque
+from dataclasses import dataclass
+from threading import Condition, Thread
+from typing import Callable, Deque, Dict, List, Tuple
+
+from data_types.priority import Priority
+from util.metrics import COUNTER, GAUGE, Registry
+from util.slots import slotted
+
+MESSAGE_LIMIT: int = 500
+COALESCE_SEPARATOR: str = " | "
+# Chat commands like /vip or .mod must be sent on their own
+COMMAND_PREFIXES: Tuple[str, ...] = ("/", ".")
+
+
+@slotted
+@dataclass
+class OutboundCounters:
+    """
+    Running totals describing the messages handled by an OutboundQueue
+    """
+
+    queued: int = 0
+    sent: int = 0
+    chat_lines: int = 0
+    coalesced: int = 0
+    dropped: int = 0
+    pending: int = 0
+    total_latency_s: float = 0.0
+    max_latency_s: float = 0.0
+
+
+class SlidingWindow:
+    """
+    Allows no more than limit actions in any period long window, however they are
+    spread out, by remembering when each of the latest limit actions happened
+    """
+
+    def __init__(self, limit: int, period: float) -> None:
+        self._limit: int = limit
+        self._period: float = period
+        self._times: Deque[float] = deque()
+
+    def set_limit(self, limit: int, period: float) -> None:
+        """
+        Changes the limit. Actions already taken in the window count against the
+        new limit.
+        Args:
+            limit: int actions allowed per period
+            period: float seconds
+
+        Returns:
+            None
+        """
+        self._limit = limit
+        self._period = period
+
+    def take(self) -> float:
+        """
+        Records an action if the window has room for one
+        Returns:
+            float 0 if the action was recorded, otherwise seconds until there is room
+        """
+        now: float = time.monotonic()
+        while self._times and self._times[0] <= now - self._period:
+            self._times.popleft()
+        if len(self._times) < self._limit:
+            self._times.append(now)
+            return 0.0
+        # Room opens once all but limit - 1 of the recorded actions have expired
+        return self._times[len(self._times) - self._limit] + self._period - now
+
+
+class OutboundQueue:
+    """
+    Single sender for everything the bot says in chat. Messages wait in priority
+    lanes and are released through a sliding window matching Twitch's per-30 second
+    limits, which are higher while the bot is a moderator. Short replies waiting in
+    the same lane are joined into one chat line while it stays under Twitch's
+    500 character limit, so a burst of replies uses fewer lines of the limit.
+
+    When max_pending messages are already waiting the oldest message of the lowest
+    priority lane is dropped, or the new one if nothing waiting is less important.
+    """
+
+    def __init__(
+        self,
+        send: Callable[[str], None],
+        limit: int,
+        period: float,
+        max_pending: int,
+    ) -> None:
+        """
+        Args:
+            send: Callable[[str], None] writing one line to chat
+            limit: int chat lines allowed per period
+            period: float seconds of the rate limit window
+            max_pending: int messages allowed to wait before dropping
+        """
+        self._send: Callable[[str], None] = send
+        self._period: float = period
+        self._max_pending: int = max_pending
+        self._window: SlidingWindow = SlidingWindow(limit, period)
+        self._lanes: Dict[Priority, Deque[Tuple[str, float]]] = {
+            priority: deque() for priority in Priority
+        }
+        self._pending: int = 0
+        self._stopping: bool = False
+        self._condition: Condition = Condition()
+        self._counters: OutboundCounters = OutboundCounters()
+        self._thread: Thread = Thread(target=self._run, name="outbound")
+
+    @property
+    def counters(self) -> OutboundCounters:
+        """
+        Gets a copy of the outbound counters
+        Returns:
+            OutboundCounters
+        """
+        with self._condition:
+            return OutboundCounters(
+                self._counters.queued,
+                self._counters.sent,
+                self._counters.chat_lines,
+                self._counters.coalesced,
+                self._counters.dropped,
+                self._pending,
+                self._counters.total_latency_s,
+                self._counters.max_latency_s,
+            )
+
+    def register_metrics(self, registry: Registry) -> None:
+        """
+        Exports the outbound totals through a metrics registry
+        Args:
+            registry: Registry to export to
+
+        Returns:
+            None
+        """
+        registry.callback(
+            "twitchy_outbound_sent_total",
+            "Messages sent to chat",
+            COUNTER,
+            lambda: self.counters.sent,
+        )
+        registry.callback(
+            "twitchy_outbound_dropped_total",
+            "Messages dropped before reaching chat",
+            COUNTER,
+            lambda: self.counters.dropped,
+        )
+        registry.callback(
+            "twitchy_outbound_pending",
+            "Messages waiting for the chat rate limit",
+            GAUGE,
+            lambda: self.counters.pending,
+        )
+
+    def set_limit(self, limit: int) -> None:
+        """
+        Changes the number of chat lines allowed per period, e.g. when the bot is
+        made or unmade a moderator
+        Args:
+            limit: int chat lines per period
+
+        Returns:
+            None
+        """
+        with self._condition:
+            self._window.set_limit(limit, self._period)
+            self._condition.notify()
+
+    def start(self) -> None:
+        """
+        Starts the sending thread
+        Returns:
+            None
+        """
+        self._thread.start()
+
+    def stop(self) -> None:
+        """
+        Sends whatever the rate limit still allows right now, drops the rest and
+        stops the sending thread
+        Returns:
+            None
+        """
+        with self._condition:
+            self._stopping = True
+            self._condition.notify()
+        if self._thread.is_alive():
+            self._thread.join()
+
+    def put(self, text: str, priority: Priority = Priority.NORMAL) -> bool:
+        """
+        Queues a message to be sent. Messages over the chat length limit are queued
+        as several messages.
+        Args:
+            text: str message
+            priority: Priority lane of the message
+
+        Returns:
+            bool False if any part of the message was dropped straight away
+        """
+        queued: bool = True
+        with self._condition:
+            for start in range(0, max(1, len(text)), MESSAGE_LIMIT):
+                part: str = text[start : start + MESSAGE_LIMIT]
+                self._counters.queued += 1
+                if self._pending >= self._max_pending and not self._drop_below(
+                    priority
+                ):
+                    self._counters.dropped += 1
+                    logging.warning("Dropped outbound message: %s", part)
+                    queued = False
+                    continue
+                self._lanes[priority].append((part, time.monotonic()))
+                self._pending += 1
+            self._condition.notify()
+        return queued
+
+    def _drop_below(self, priority: Priority) -> bool:
+        """
+        Drops the oldest waiting message no more important than a priority
+        Args:
+            priority: Priority of the message that needs room
+
+        Returns:
+            bool True if a message was dropped
+        """
+        for lane in reversed(Priority):
+            if lane < priority:
+                return False
+            if self._lanes[lane]:
+                text, _ = self._lanes[lane].popleft()
+                self._pending -= 1
+                self._counters.dropped += 1
+                logging.warning("Dropped outbound message: %s", text)
+                return True
+        return False
+
+    def _next_line(self) -> Tuple[str, List[float]]:
+        """
+        Pops the next chat line from the most important non-empty lane, coalescing
+        the short messages behind it
+        Returns:
+            Tuple[str, List[float]] line and the queue times of its messages
+        """
+        lane: Deque[Tuple[str, float]] = next(
+            self._lanes[priority] for priority in Priority if self._lanes[priority]
+        )
+        text, queued_at = lane.popleft()
+        parts: List[str] = [text]
+        queued: List[float] = [queued_at]
+        length: int = len(text)
+        while (
+            lane
+            and not parts[0].startswith(COMMAND_PREFIXES)
+            and not lane[0][0].startswith(COMMAND_PREFIXES)
+            and length + len(COALESCE_SEPARATOR) + len(lane[0][0]) <= MESSAGE_LIMIT
+        ):
+            text, queued_at = lane.popleft()
+            parts.append(text)
+            queued.append(queued_at)
+            length += len(COALESCE_SEPARATOR) + len(text)
+        self._pending -= len(parts)
+        return COALESCE_SEPARATOR.join(parts), queued
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                while not self._pending and not self._stopping:
+                    self._condition.wait()
+                if not self._pending:
+                    return
+                wait: float = self._window.take()
+                if wait:
+                    if self._stopping:
+                        self._counters.dropped += self._pending
+                        logging.warning(
+                            "Dropped %s outbound messages on shutdown", self._pending
+                        )
+                        for lane in self._lanes.values():
+                            lane.clear()
+                        self._pending = 0
+                        return
+                    self._condition.wait(wait)
+                    continue
+                line, queued = self._next_line()
+
+            try:
+                self._send(line)
+            except Exception as e:
+                logging.error("Error sending message: %s", e)
+                with self._condition:
+                    self._counters.dropped += len(queued)
+                continue
+
+            sent_at: float = time.monotonic()
+            with self._condition:
+                self._counters.sent += len(queued)
+                self._counters.chat_lines += 1
+                self._counters.coalesced += len(queued) - 1
+                for queued_at in queued:
+                    latency: float = sent_at - queued_at
+                    self._counters.total_latency_s += latency
+                    self._counters.max_latency_s = max(
+                        self._counters.max_latency_s, latency
+                    )
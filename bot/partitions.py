@@ -0,0 +1,828 @@
+""" Runs one channel's chat across several worker processes, partitioned by user """
+
+import functools
+import logging
+import multiprocessing
+import os
+import queue
+import shutil
+import time
+from dataclasses import dataclass
+from threading import Event, Lock, Thread
+from typing import Any, Callable, Dict, Hashable, List, Optional, Sequence, Tuple
+
+import twitch
+
+from bot.bot import USER_COOLDOWNS, Twitchy, create_helix
+from bot.commands import DELAY_NOT_MET_COMMAND, INVALID_COMMAND, router
+from bot.ingestion import IngestionCounters
+from bot.outbound import OutboundCounters, OutboundQueue
+from bot.presence import PresenceTracker
+from bot.router import Route
+from data_types import User
+from data_types.commands import Command
+from data_types.cooldown import Cooldown
+from data_types.priority import Priority
+from data_types.scope import Scope
+from data_types.user import Level, normalize_login
+from storage import UserStore, create_event_journal, create_store
+from storage.sharded_store import shard_for
+from util.constants import (
+    CHATTERS_POLL_SECONDS,
+    INGESTION_QUEUE_SIZE,
+    OUTBOUND_LIMIT,
+    OUTBOUND_MOD_LIMIT,
+    OUTBOUND_PERIOD_SECONDS,
+    OUTBOUND_QUEUE_SIZE,
+    PARTITION_BATCH_SIZE,
+    PARTITION_DIRECTORY_FORMAT,
+    PARTITIONS_DIRECTORY,
+)
+from util.metrics import COUNTER, GAUGE, Histogram, Registry
+from util.slots import slotted
+
+# The partition holding the channel's events, such as polls and broadcasts
+COORDINATOR: int = 0
+
+# Jobs one partition hands another
+COMMAND_JOB: str = "command"
+# Chatters who joined and parted, handed to every partition by the reader
+PRESENCE_JOB: str = "presence"
+
+
+def partition_for(name: str, partitions: int) -> int:
+    """
+    Gets the partition owning a user by their login, the one value chat, commands
+    and stored users all know. Display names are never used, as they can change
+    case or be localized. A user renaming their login starts over in the partition
+    of the new login.
+    Args:
+        name: str login of the user, ignoring case and a leading '@'
+        partitions: int number of partitions
+
+    Returns:
+        int partition index
+    """
+    return shard_for(normalize_login(name), partitions)
+
+
+def split_stats(backend: str, partitions: int) -> None:
+    """
+    Splits the single process stats into one store per partition, the first time
+    the bot runs partitioned. The partitions are built next to the final directory
+    and moved into place once complete, so an interrupted split starts over.
+    Args:
+        backend: str stats storage backend
+        partitions: int number of partitions
+
+    Returns:
+        None
+    """
+    if os.path.isdir(PARTITIONS_DIRECTORY):
+        existing: int = sum(
+            1 for name in os.listdir(PARTITIONS_DIRECTORY) if name.isdigit()
+        )
+        if existing != partitions:
+            raise ValueError(
+                f"Stats are split across {existing} workers, run with that many "
+                f"workers or remove {PARTITIONS_DIRECTORY}"
+            )
+        return
+
+    building: str = f"{PARTITIONS_DIRECTORY}.tmp"
+    shutil.rmtree(building, ignore_errors=True)
+    stores: List[UserStore] = []
+    for index in range(partitions):
+        directory: str = os.path.join(building, str(index))
+        os.makedirs(directory)
+        stores.append(create_store(backend, directory))
+        stores[-1].load(None)
+    source: UserStore = create_store(backend)
+    source.load(None)
+    moved: int = 0
+    for user in source.values():
+        stores[partition_for(user.login, partitions)].add(user)
+        moved += 1
+    source.close()
+    for store in stores:
+        store.flush()
+        store.close()
+    os.rename(building, PARTITIONS_DIRECTORY)
+    logging.info("Split %s users across %s partitions", moved, partitions)
+
+
+@slotted
+@dataclass
+class PartitionSettings:
+    """
+    What a worker process needs to start its partition. Everything here is pickled
+    into the new process, so helix is a factory rather than a client.
+    """
+
+    owner: str
+    channel: str
+    nickname: str
+    backend: str
+    helix: Callable[[], Any]
+    log_level: int = logging.INFO
+
+
+@slotted
+@dataclass
+class PartitionQueues:
+    """
+    The queues the reader shares with its worker processes
+    """
+
+    # multiprocessing.Queue per partition of lists of (sender, text, routed at) from
+    # the reader
+    inboxes: List[Any]
+    # multiprocessing.Queue per partition of jobs handed to it
+    mailboxes: List[Any]
+    # multiprocessing.Queue of (text, priority) for the reader
+    replies: Any
+    # multiprocessing.Queue of (partition, report) for the reader
+    results: Any
+    # multiprocessing.RawArray of messages handled per partition
+    processed: Any
+
+
+class _RoutedMessage(twitch.chat.Message):
+    """
+    Chat message rebuilt in a worker process, stamped with when the reader routed it
+    """
+
+    def __init__(
+        self,
+        channel: str,
+        sender: str,
+        text: str,
+        helix: Any,
+        chat: Any,
+        routed_at: float,
+    ) -> None:
+        super().__init__(channel, sender, text, helix, chat)
+        self.routed_at: float = routed_at
+
+
+class _PartitionChat:
+    """
+    The chat connection of a worker process: messages arrive from the reader, and
+    replies go back through Twitchy.send rather than this object
+    """
+
+    def __init__(self, channel: str, helix: Any) -> None:
+        self.channel: str = channel
+        self.helix: Any = helix
+        self._subscribers: List[Callable[[twitch.chat.Message], None]] = []
+
+    def subscribe(self, callback: Callable[[twitch.chat.Message], None]) -> None:
+        """
+        Registers a callback for incoming messages
+        Args:
+            callback: Callable[[twitch.chat.Message], None]
+
+        Returns:
+            None
+        """
+        self._subscribers.append(callback)
+
+    def send(self, text: str) -> None:
+        """
+        Never used, replies are sent by the reader
+        Args:
+            text: str line
+
+        Returns:
+            None
+        """
+        logging.warning("Partition chat cannot send: %s", text)
+
+    def deliver(self, message: twitch.chat.Message) -> None:
+        """
+        Hands a message routed to this partition to every subscriber
+        Args:
+            message: twitch.chat.Message
+
+        Returns:
+            None
+        """
+        for callback in self._subscribers:
+            callback(message)
+
+
+class _PartitionTwitchy(Twitchy):
+    """
+    Twitchy running inside a worker process, the only writer of the users in its
+    partition. Work that changes anyone else's state is handed to the partition that
+    owns it: commands on other users go to the users' partitions, and commands on
+    the channel's events, or limited by a channel-wide cooldown, to the coordinator.
+    Replies are passed back to the reader instead of being sent from here.
+    """
+
+    def __init__(
+        self, partition: int, queues: PartitionQueues, *args: Any, **kwargs: Any
+    ) -> None:
+        """
+        Args:
+            partition: int index of this partition
+            queues: PartitionQueues shared with the reader and other partitions
+            *args: Any passed to Twitchy
+            **kwargs: Any passed to Twitchy
+        """
+        self._partition: int = partition
+        self._mailboxes: Sequence[Any] = queues.mailboxes
+        self._replies: Any = queues.replies
+        self._processed: Any = queues.processed
+        self._processed_mutex: Lock = Lock()
+        super().__init__(*args, **kwargs)
+        self._latency: Histogram = self.metrics.histogram(
+            "twitchy_partition_latency_seconds",
+            "Time from the reader routing a chat message to finishing with it",
+        )
+
+    @property
+    def latency(self) -> Histogram:
+        """
+        Gets the end to end handling time of the partition's messages
+        Returns:
+            Histogram
+        """
+        return self._latency
+
+    def deliver(self, sender: str, text: str, routed_at: float) -> None:
+        """
+        Handles a chat message the reader routed to this partition
+        Args:
+            sender: str login name of the chatter
+            text: str message
+            routed_at: float time.monotonic() time the reader routed it
+
+        Returns:
+            None
+        """
+        chat: _PartitionChat = self._bot
+        chat.deliver(
+            _RoutedMessage(chat.channel, sender, text, chat.helix, chat, routed_at)
+        )
+
+    def _monitor_chatters(self) -> None:
+        """
+        Leaves presence to the reader, which polls the chatters once for every
+        partition and hands over who joined and parted
+        Returns:
+            None
+        """
+
+    def _owns(self, name: str) -> bool:
+        return partition_for(name, len(self._mailboxes)) == self._partition
+
+    def _load_stats(self) -> None:
+        # Only the owner's partition seeds the owner, so it is written by one process
+        self._stats.load(
+            User(self._owner, Level.OWNER, time.time())
+            if self._owns(self._owner)
+            else None
+        )
+
+    def _process_message(self, message: twitch.chat.Message) -> None:
+        try:
+            super()._process_message(message)
+        finally:
+            self._latency.observe(time.monotonic() - message.routed_at)
+            with self._processed_mutex:
+                self._processed[self._partition] += 1
+
+    @staticmethod
+    def _cooldown_limits(
+        user: User, route: Route, level: Level
+    ) -> List[Tuple[Hashable, Optional[Cooldown]]]:
+        # Channel-wide limits are charged by the coordinator, which runs every
+        # command that has one
+        return [
+            limit
+            for limit in Twitchy._cooldown_limits(user, route, level)
+            if limit[0][0] != "global"
+        ]
+
+    def _execute(self, route: Route, message: twitch.chat.Message) -> None:
+        command: Optional[Command] = route.command
+        if command is None or command is INVALID_COMMAND:
+            super()._execute(route, message)
+        elif command.SCOPE is Scope.TARGETS:
+            self._execute_on_targets(route, message)
+        elif command.SCOPE is Scope.CHANNEL or command.GLOBAL_COOLDOWN:
+            self._hand_off(COORDINATOR, route.name, route.args, message)
+        else:
+            super()._execute(route, message)
+
+    def _execute_on_targets(self, route: Route, message: twitch.chat.Message) -> None:
+        """
+        Runs a command once in each partition owning some of the users it names
+        Args:
+            route: Route of a TARGETS command
+            message: Message holding the command
+
+        Returns:
+            None
+        """
+        targets: Any = route.args[0]
+        names: List[str] = targets if isinstance(targets, list) else [targets]
+        groups: Dict[int, List[str]] = {}
+        for name in names:
+            groups.setdefault(partition_for(name, len(self._mailboxes)), []).append(
+                name
+            )
+        for partition, group in groups.items():
+            first: Any = group if isinstance(targets, list) else group[0]
+            self._hand_off(partition, route.name, [first, *route.args[1:]], message)
+
+    def _hand_off(
+        self,
+        partition: int,
+        name: str,
+        args: List[Any],
+        message: twitch.chat.Message,
+    ) -> None:
+        """
+        Runs a command in the partition that owns its state
+        Args:
+            partition: int owning partition
+            name: str canonical name of the command
+            args: List[Any] parsed arguments
+            message: Message holding the command
+
+        Returns:
+            None
+        """
+        level: Level = self._level_of(self._stats[message.sender])
+        if partition == self._partition:
+            self.run_command(message.sender, name, args, level)
+        else:
+            self._mailboxes[partition].put(
+                (COMMAND_JOB, (message.sender, name, args, level))
+            )
+
+    def run_command(
+        self, sender: str, name: str, args: List[Any], level: Level
+    ) -> None:
+        """
+        Runs a command handed over by the sender's partition, charging its
+        channel-wide cooldown if this is the coordinator
+        Args:
+            sender: str login name of the chatter
+            name: str canonical name of the command
+            args: List[Any] parsed arguments
+            level: Level of the chatter
+
+        Returns:
+            None
+        """
+        command: Optional[Command] = router.command(name)
+        if command is None:
+            logging.error("Partition %s got unknown command %s", self._partition, name)
+            return
+        message: twitch.chat.Message = twitch.chat.Message(
+            self._bot.channel, sender, "", self._bot.helix, self._bot
+        )
+        if (
+            self._partition == COORDINATOR
+            and command.GLOBAL_COOLDOWN
+            and level in USER_COOLDOWNS
+        ):
+            remaining: float = self._cooldowns.acquire(
+                [(("global", command), command.GLOBAL_COOLDOWN)]
+            )
+            if remaining:
+                self._cooldown_rejections.inc()
+                DELAY_NOT_MET_COMMAND(self, message, remaining, level)
+                return
+        super()._execute(Route(name=name, command=command, args=args), message)
+
+    def serve(self, mailbox: Any) -> None:
+        """
+        Runs the jobs other partitions hand this one until a None arrives
+        Args:
+            mailbox: multiprocessing.Queue of this partition's jobs
+
+        Returns:
+            None
+        """
+        while True:
+            job: Optional[Tuple[str, Tuple]] = mailbox.get()
+            if job is None:
+                return
+            kind, args = job
+            try:
+                if kind == COMMAND_JOB:
+                    self.run_command(*args)
+                elif kind == PRESENCE_JOB:
+                    self._presence.update(*args)
+            except Exception as e:
+                logging.error("Error running %s job %s: %s", kind, args, e)
+
+    def drain(self) -> None:
+        """
+        Finishes every message already routed to this partition, then waits until
+        the jobs it handed other partitions are written to their mailboxes, so they
+        arrive ahead of the reader's shutdown sentinel. Jobs run from the mailbox
+        never hand off again.
+        Returns:
+            None
+        """
+        self._ingestion.stop()
+        for partition, mailbox in enumerate(self._mailboxes):
+            if partition != self._partition:
+                mailbox.close()
+                mailbox.join_thread()
+
+    def send(self, message: str, priority: Priority = Priority.NORMAL) -> None:
+        """
+        Passes a reply back to the reader, which sends it to chat
+        Args:
+            message: str message to send
+            priority: Priority of the message
+
+        Returns:
+            None
+        """
+        self._replies.put((message, int(priority)))
+
+
+def _run_partition(
+    settings: PartitionSettings, partition: int, queues: PartitionQueues
+) -> None:
+    """
+    Entry point of a worker process. Reports once it is ready, handles batches of
+    routed messages until the reader sends None, reports that it is drained, then keeps
+    serving jobs from other partitions until they have drained too.
+    Args:
+        settings: PartitionSettings of the bot
+        partition: int index of this partition
+        queues: PartitionQueues shared with the reader and other partitions
+
+    Returns:
+        None
+    """
+    logging.basicConfig(level=settings.log_level)
+    directory: str = PARTITION_DIRECTORY_FORMAT.format(index=partition)
+    bot: _PartitionTwitchy = _PartitionTwitchy(
+        partition,
+        queues,
+        settings.owner,
+        settings.channel,
+        settings.nickname,
+        "",
+        "",
+        "",
+        create_store(settings.backend, directory),
+        chat=_PartitionChat(settings.channel, settings.helix()),
+        event_log=create_event_journal(directory),
+    )
+    server: Thread = Thread(target=bot.serve, args=(queues.mailboxes[partition],))
+    server.start()
+    queues.results.put((partition, None))
+    try:
+        while True:
+            batch: Optional[List[Tuple[str, str, float]]] = queues.inboxes[
+                partition
+            ].get()
+            if batch is None:
+                break
+            for job in batch:
+                bot.deliver(*job)
+        bot.drain()
+    finally:
+        queues.results.put((partition, None))
+        server.join()
+        bot.stop()
+        queues.results.put((partition, bot.latency.labels().snapshot()))
+
+
+class PartitionedTwitchy:
+    """
+    Runs one channel across several worker processes so CPU-bound handling is not
+    limited to a single interpreter. This process reads chat and routes each message
+    to a worker by a stable hash of its sender, so every user's state has a single
+    writer. Each worker is a Twitchy over its own share of the users, and the
+    replies of all of them are merged into one rate-limited outbound queue here.
+    The chatters are polled here too, once for all workers, and every worker is
+    handed who joined and parted.
+
+    Messages cross to the workers in batches, but a single Twitchy is still faster
+    unless it cannot keep up with the channel and every worker has a core of its own.
+    """
+
+    def __init__(
+        self,
+        owner: str,
+        channel: str,
+        nickname: str,
+        oauth: str,
+        client_id: str,
+        client_secret: str,
+        backend: str,
+        workers: int,
+        moderator: bool = False,
+        chat: Optional[twitch.Chat] = None,
+        helix: Optional[Callable[[], Any]] = None,
+    ) -> None:
+        """
+        Args:
+            owner: str name of the channel owner
+            channel: str channel to join, e.g. '#name'
+            nickname: str name of the bot account
+            oauth: str OAuth token of the bot account
+            client_id: str Helix client ID
+            client_secret: str Helix client secret
+            backend: str stats storage backend
+            workers: int number of worker processes
+            moderator: bool whether the bot is a moderator of the channel
+            chat: Optional[twitch.Chat] already connected, e.g. a stand-in
+            helix: Optional[Callable[[], Any]] picklable factory of the Helix client
+                each worker uses
+        """
+        if workers < 1:
+            raise ValueError("At least one worker is required")
+        helix = helix or functools.partial(
+            create_helix, client_id, client_secret, oauth
+        )
+        self._chat: twitch.Chat = chat or twitch.Chat(
+            channel=channel, nickname=nickname, oauth=oauth, helix=helix()
+        )
+        split_stats(backend, workers)
+
+        # Spawned rather than forked, as forking copies a process with threads
+        # holding locks
+        context = multiprocessing.get_context("spawn")
+        # Messages wait here for their partition's forwarder, which passes them on
+        # in batches while the worker has room for at most one more
+        self._pending: List[queue.Queue] = [
+            queue.Queue(max(1, INGESTION_QUEUE_SIZE // workers)) for _ in range(workers)
+        ]
+        self._queues: PartitionQueues = PartitionQueues(
+            [context.Queue(1) for _ in range(workers)],
+            [context.Queue() for _ in range(workers)],
+            context.Queue(),
+            context.Queue(),
+            context.RawArray("q", workers),
+        )
+        settings: PartitionSettings = PartitionSettings(
+            owner, channel, nickname, backend, helix, logging.getLogger().level
+        )
+        self._workers: List[Any] = [
+            context.Process(
+                target=_run_partition,
+                args=(settings, index, self._queues),
+                name=f"partition-{index}",
+            )
+            for index in range(workers)
+        ]
+        self._presence: PresenceTracker = PresenceTracker(
+            lambda params: self._chat.helix.api.get("/chat/chatters", params=params),
+            lambda name: self._chat.helix.user(name).id,
+            owner,
+            nickname,
+        )
+
+        self._outbound: OutboundQueue = OutboundQueue(
+            self._chat.send,
+            OUTBOUND_LIMIT,
+            OUTBOUND_PERIOD_SECONDS,
+            OUTBOUND_QUEUE_SIZE,
+        )
+        self._outbound.set_limit(
+            OUTBOUND_MOD_LIMIT
+            if moderator or nickname.lower() == owner.lower()
+            else OUTBOUND_LIMIT
+        )
+        self._forwarders: List[Thread] = [
+            Thread(target=self._forward, args=(index,), name=f"forward-{index}")
+            for index in range(workers)
+        ]
+        self._relay: Thread = Thread(target=self._relay_replies, name="replies")
+        self._presence_thread: Thread = Thread(
+            target=self._poll_presence, name="presence"
+        )
+        self._received: int = 0
+        self._max_queue_depth: int = 0
+        self._counters_mutex: Lock = Lock()
+        self._stopping: Event = Event()
+        self._metrics: Registry = Registry()
+        self._latency: Histogram = self._metrics.histogram(
+            "twitchy_ingestion_latency_seconds",
+            "Time from receiving a chat message to a worker finishing with it, "
+            "collected from the workers when they stop",
+        )
+        self._register_metrics()
+
+        # Forwarders only wait for messages until the workers are ready
+        for runner in [*self._workers, *self._forwarders]:
+            runner.start()
+        self._collect()
+        self._outbound.start()
+        self._relay.start()
+        self._presence_thread.start()
+        self._chat.subscribe(self._route)
+
+    @property
+    def metrics(self) -> Registry:
+        """
+        Gets the registry of the reader's metrics
+        Returns:
+            Registry
+        """
+        return self._metrics
+
+    @property
+    def registries(self) -> List[Registry]:
+        """
+        Gets every registry to serve, as a ChannelGroup does
+        Returns:
+            List[Registry]
+        """
+        return [self._metrics]
+
+    @property
+    def ingestion_counters(self) -> IngestionCounters:
+        """
+        Gets the message counts across every worker
+        Returns:
+            IngestionCounters
+        """
+        processed: int = sum(self._queues.processed)
+        with self._counters_mutex:
+            return IngestionCounters(
+                received=self._received,
+                processed=processed,
+                queue_depth=self._received - processed,
+                max_queue_depth=self._max_queue_depth,
+            )
+
+    @property
+    def outbound_counters(self) -> OutboundCounters:
+        """
+        Gets the counters of the merged outbound message queue
+        Returns:
+            OutboundCounters
+        """
+        return self._outbound.counters
+
+    def _route(self, message: twitch.chat.Message) -> None:
+        """
+        Chat subscription callback, handing the message to the partition of its
+        sender. Blocks while that partition's queue is full.
+        Args:
+            message: Message that was received
+
+        Returns:
+            None
+        """
+        if self._stopping.is_set():
+            return
+        self._pending[partition_for(message.sender, len(self._pending))].put(
+            (message.sender, message.text, time.monotonic())
+        )
+        processed: int = sum(self._queues.processed)
+        with self._counters_mutex:
+            self._received += 1
+            self._max_queue_depth = max(
+                self._max_queue_depth, self._received - processed
+            )
+
+    def _forward(self, partition: int) -> None:
+        """
+        Passes a partition's routed messages to its worker until a None arrives.
+        Everything that queued up while the last batch was being sent goes as one
+        batch, so under load the cost of pickling and crossing processes is shared
+        by many messages, while a quiet channel's messages are passed on at once.
+        Args:
+            partition: int index of the partition
+
+        Returns:
+            None
+        """
+        pending: queue.Queue = self._pending[partition]
+        inbox: Any = self._queues.inboxes[partition]
+        while True:
+            batch: List[Optional[Tuple[str, str, float]]] = [pending.get()]
+            while batch[-1] is not None and len(batch) < PARTITION_BATCH_SIZE:
+                try:
+                    batch.append(pending.get_nowait())
+                except queue.Empty:
+                    break
+            stopping: bool = batch[-1] is None
+            if stopping:
+                batch.pop()
+            if batch:
+                inbox.put(batch)
+            if stopping:
+                inbox.put(None)
+                return
+
+    def _relay_replies(self) -> None:
+        """
+        Moves the workers' replies into the outbound queue until a None arrives
+        Returns:
+            None
+        """
+        while True:
+            reply: Optional[Tuple[str, int]] = self._queues.replies.get()
+            if reply is None:
+                return
+            text, priority = reply
+            self._outbound.put(text, Priority(priority))
+
+    def _poll_presence(self) -> None:
+        """
+        Polls the channel's chatters until stopping, handing every partition who
+        joined and parted
+        Returns:
+            None
+        """
+        while not self._stopping.is_set():
+            try:
+                joined, parted = self._presence.poll()
+                if joined or parted:
+                    for mailbox in self._queues.mailboxes:
+                        mailbox.put((PRESENCE_JOB, (joined, parted)))
+            except Exception as e:
+                logging.error("Error getting chatters: %s", e)
+            self._stopping.wait(CHATTERS_POLL_SECONDS)
+
+    def _register_metrics(self) -> None:
+        """
+        Exports the reader's totals, read at scrape time
+        Returns:
+            None
+        """
+        for name, kind, description, read in (
+            (
+                "twitchy_messages_received_total",
+                COUNTER,
+                "Chat messages received",
+                lambda: self.ingestion_counters.received,
+            ),
+            (
+                "twitchy_messages_processed_total",
+                COUNTER,
+                "Chat messages the workers finished with",
+                lambda: self.ingestion_counters.processed,
+            ),
+            (
+                "twitchy_ingestion_queue_depth",
+                GAUGE,
+                "Chat messages waiting for a worker",
+                lambda: self.ingestion_counters.queue_depth,
+            ),
+        ):
+            self._metrics.callback(name, description, kind, read)
+        self._outbound.register_metrics(self._metrics)
+        self._presence.register_metrics(self._metrics)
+
+    def _collect(self) -> Dict[int, Any]:
+        """
+        Waits for one report from every worker, giving up on any that died
+        Returns:
+            Dict[int, Any] of partition to its report
+        """
+        reports: Dict[int, Any] = {}
+        while len(reports) < len(self._workers):
+            try:
+                partition, report = self._queues.results.get(timeout=1)
+                reports[partition] = report
+            except queue.Empty:
+                if all(
+                    index in reports or not worker.is_alive()
+                    for index, worker in enumerate(self._workers)
+                ):
+                    logging.error("A partition worker exited without reporting")
+                    break
+        return reports
+
+    def stop(self) -> None:
+        """
+        Lets every worker finish the messages it was given and the jobs other
+        workers handed it, flush its stats and exit, then sends the last replies
+        Returns:
+            None
+        """
+        logging.info("Stopping partitioned Twitchy")
+        self._stopping.set()
+        self._presence_thread.join()
+        for pending in self._pending:
+            pending.put(None)
+        # A worker reports drained only once the jobs it handed others are in their
+        # mailboxes, so the sentinels below are queued behind every one of them
+        self._collect()
+        for mailbox in self._queues.mailboxes:
+            mailbox.put(None)
+        for report in self._collect().values():
+            # A worker that failed before it stopped reports nothing to merge
+            if report is not None:
+                self._latency.labels().merge(*report)
+        for runner in [*self._workers, *self._forwarders]:
+            runner.join()
+        self._queues.replies.put(None)
+        self._relay.join()
+        self._outbound.stop()
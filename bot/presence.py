@@ -0,0 +1,227 @@
+""" Tracks who is in a channel's chat by diffing Helix chatter lists """
+
+import time
+from dataclasses import dataclass
+from threading import Lock
+from typing import Callable, Dict, List, Optional, Tuple
+
+from data_types.chatter import Chatter
+from data_types.user import normalize_login
+from util.metrics import COUNTER, GAUGE, Registry
+from util.slots import slotted
+
+# Most chatters Helix lists per page
+CHATTERS_PAGE_SIZE: int = 1000
+
+
+@slotted
+@dataclass
+class PresenceCounters:
+    """
+    Running totals describing the chatters seen by a PresenceTracker
+    """
+
+    chatters: int = 0
+    joins: int = 0
+    parts: int = 0
+    polls: int = 0
+    pages: int = 0
+
+
+class PresenceTracker:
+    """
+    Keeps the set of chatters in a channel up to date from the paginated
+    /chat/chatters endpoint, turning each snapshot into joins and parts.
+
+    The broadcaster and moderator ids are resolved on the first poll and reused.
+    Chatters still present keep their Chatter objects and are only stamped with the
+    poll's time, so anyone left with an older stamp has parted; a poll allocates
+    for the chatters that joined or left rather than for the whole audience. Pages
+    are fetched before anything is changed, so a failed request leaves the
+    previous snapshot in place.
+    """
+
+    def __init__(
+        self,
+        fetch_page: Callable[[Dict[str, str]], Dict],
+        resolve_id: Callable[[str], str],
+        broadcaster: str,
+        moderator: str,
+    ) -> None:
+        """
+        Args:
+            fetch_page: Callable[[Dict[str, str]], Dict] requesting one page of
+                /chat/chatters with the given query parameters
+            resolve_id: Callable[[str], str] looking up the user id of a name
+            broadcaster: str name of the channel owner
+            moderator: str name of the bot account
+        """
+        self._fetch_page: Callable[[Dict[str, str]], Dict] = fetch_page
+        self._resolve_id: Callable[[str], str] = resolve_id
+        self._broadcaster: str = broadcaster
+        self._moderator: str = moderator
+        self._params: Optional[Dict[str, str]] = None
+        self._chatters: Dict[str, Chatter] = {}
+        self._logins: Dict[str, Chatter] = {}
+        self._mutex: Lock = Lock()
+        self._counters: PresenceCounters = PresenceCounters()
+
+    @property
+    def mutex(self) -> Lock:
+        """
+        Gets the mutex held while the chatters change
+        Returns:
+            Lock
+        """
+        return self._mutex
+
+    @property
+    def counters(self) -> PresenceCounters:
+        """
+        Gets the running presence totals
+        Returns:
+            PresenceCounters
+        """
+        return self._counters
+
+    @property
+    def chatters(self) -> List[Chatter]:
+        """
+        Gets a copy of the current chatters
+        Returns:
+            List[Chatter]
+        """
+        with self._mutex:
+            return list(self._chatters.values())
+
+    def get(self, name: str) -> Optional[Chatter]:
+        """
+        Gets a current chatter by name, ignoring case and a leading '@'
+        Args:
+            name: str name of the chatter
+
+        Returns:
+            Optional[Chatter]
+        """
+        return self._logins.get(normalize_login(name))
+
+    def poll(self) -> Tuple[List[Chatter], List[Chatter]]:
+        """
+        Fetches every page of the chatter list and applies it
+        Returns:
+            Tuple[List[Chatter], List[Chatter]] chatters who joined and who parted
+                since the last poll
+        """
+        if self._params is None:
+            self._params = {
+                "broadcaster_id": self._resolve_id(self._broadcaster),
+                "moderator_id": self._resolve_id(self._moderator),
+                "first": str(CHATTERS_PAGE_SIZE),
+            }
+        pages: List[List[Dict[str, str]]] = []
+        cursor: Optional[str] = None
+        while True:
+            params: Dict[str, str] = (
+                dict(self._params, after=cursor) if cursor else self._params
+            )
+            data: Dict = self._fetch_page(params)
+            pages.append(data["data"])
+            cursor = (data.get("pagination") or {}).get("cursor")
+            if not cursor:
+                break
+        with self._mutex:
+            return self._apply(pages)
+
+    def update(self, joined: List[Chatter], parted: List[Chatter]) -> None:
+        """
+        Applies joins and parts seen by a tracker polling elsewhere, such as the
+        reader of a partitioned bot
+        Args:
+            joined: List[Chatter] who joined
+            parted: List[Chatter] who parted
+
+        Returns:
+            None
+        """
+        with self._mutex:
+            for chatter in parted:
+                self._chatters.pop(chatter.id, None)
+                self._logins.pop(chatter.login, None)
+            for chatter in joined:
+                self._chatters[chatter.id] = chatter
+                self._logins[chatter.login] = chatter
+            self._counters.chatters = len(self._chatters)
+            self._counters.joins += len(joined)
+            self._counters.parts += len(parted)
+
+    def register_metrics(self, registry: Registry) -> None:
+        """
+        Exports the presence totals through a metrics registry
+        Args:
+            registry: Registry to export to
+
+        Returns:
+            None
+        """
+        registry.callback(
+            "twitchy_chatters",
+            "Chatters in the channel as of the last presence poll",
+            GAUGE,
+            lambda: self._counters.chatters,
+        )
+        registry.callback(
+            "twitchy_chatter_joins_total",
+            "Chatters who joined the channel",
+            COUNTER,
+            lambda: self._counters.joins,
+        )
+        registry.callback(
+            "twitchy_chatter_parts_total",
+            "Chatters who left the channel",
+            COUNTER,
+            lambda: self._counters.parts,
+        )
+
+    def _apply(
+        self, pages: List[List[Dict[str, str]]]
+    ) -> Tuple[List[Chatter], List[Chatter]]:
+        """
+        Diffs a complete chatter list against the current chatters. Must be called
+        holding the mutex.
+        Args:
+            pages: List[List[Dict[str, str]]] of chatter entries from every page
+
+        Returns:
+            Tuple[List[Chatter], List[Chatter]] chatters who joined and who parted
+        """
+        now: float = time.time()
+        joined: List[Chatter] = []
+        for page in pages:
+            for entry in page:
+                chatter: Optional[Chatter] = self._chatters.get(entry.get("user_id"))
+                if chatter is None:
+                    chatter = Chatter.from_data(entry)
+                    self._chatters[chatter.id] = chatter
+                    self._logins[chatter.login] = chatter
+                    joined.append(chatter)
+                elif chatter.login != entry.get("user_login", chatter.login):
+                    self._logins.pop(chatter.login, None)
+                    chatter.login = entry["user_login"]
+                    chatter.name = entry.get("user_name", chatter.name)
+                    self._logins[chatter.login] = chatter
+                chatter.seen = now
+
+        parted: List[Chatter] = [
+            chatter for chatter in self._chatters.values() if chatter.seen != now
+        ]
+        for chatter in parted:
+            del self._chatters[chatter.id]
+            if self._logins.get(chatter.login) is chatter:
+                del self._logins[chatter.login]
+
+        self._counters.chatters = len(self._chatters)
+        self._counters.joins += len(joined)
+        self._counters.parts += len(parted)
+        self._counters.polls += 1
+        self._counters.pages += len(pages)
+        return joined, parted
@@ -0,0 +1,123 @@
+""" Resolves chat messages to commands and their parsed arguments """
+
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+from data_types.arguments import ArgumentError, parse_arguments
+from data_types.commands import Command
+from data_types.user import Level
+from util.slots import slotted
+
+COMMAND_PREFIX: str = "!"
+HELP_ARGUMENT: str = "HELP"
+
+
+@slotted
+@dataclass
+class Route:
+    """
+    Outcome of routing one command message: a command with its parsed args, a help
+    request for help_for, or a parse error with the command it was meant for. name
+    is the canonical name of the command, whichever alias was used, or None if the
+    command is unknown.
+    """
+
+    name: Optional[str] = None
+    command: Optional[Command] = None
+    args: List[Any] = field(default_factory=list)
+    help_for: Optional[Command] = None
+    error: Optional[str] = None
+    usage_for: Optional[Command] = None
+
+
+class CommandRouter:
+    """
+    Lookup tables of commands per user level, compiled once with every alias and
+    lower-cased name resolved up front. Routing a message that is not a command
+    costs a single prefix check and allocates nothing.
+    """
+
+    def __init__(
+        self,
+        tables: Dict[Level, Dict[str, Command]],
+        aliases: Dict[str, str],
+        invalid: Command,
+    ) -> None:
+        """
+        Args:
+            tables: Dict[Level, Dict[str, Command]] commands available to each level
+            aliases: Dict[str, str] of alias to the command name it stands for
+            invalid: Command routed to when a name is unknown
+        """
+        self._invalid: Command = invalid
+        self._tables: Dict[Level, Dict[str, Command]] = {}
+        self._names: Dict[Command, str] = {}
+        for level, table in tables.items():
+            for name, command in table.items():
+                self._names.setdefault(command, name.lower())
+            compiled: Dict[str, Command] = {
+                name.lower(): command for name, command in table.items()
+            }
+            for alias, name in aliases.items():
+                if name.lower() in compiled:
+                    compiled[alias.lower()] = compiled[name.lower()]
+            self._tables[level] = compiled
+        self._commands: Dict[str, Command] = {
+            name: command for command, name in self._names.items()
+        }
+
+    def command(self, name: str) -> Optional[Command]:
+        """
+        Gets a command by its canonical name, whatever level it is available to
+        Args:
+            name: str canonical name, as given by Route.name
+
+        Returns:
+            Optional[Command] or None if no command has that name
+        """
+        return self._commands.get(name)
+
+    def names(self, level: Level) -> List[str]:
+        """
+        Gets every name, including aliases, that resolves for a level
+        Args:
+            level: Level of the chatter
+
+        Returns:
+            List[str]
+        """
+        return sorted(self._tables.get(level, {}))
+
+    def route(self, text: str, level: Level) -> Optional[Route]:
+        """
+        Resolves a message to the command it invokes for a chatter of some level
+        Args:
+            text: str full message text
+            level: Level of the chatter
+
+        Returns:
+            Optional[Route] or None if the message is not a command
+        """
+        if not text.startswith(COMMAND_PREFIX):
+            return None
+
+        name, _, rest = text.partition(" ")
+        table: Dict[str, Command] = self._tables[level]
+        command: Optional[Command] = table.get(name)
+        if command is None:
+            command = table.get(name.lower(), self._invalid)
+        if command is self._invalid:
+            return Route(command=command)
+
+        canonical: str = self._names[command]
+        values: List[str] = rest.split()
+        if values and HELP_ARGUMENT in values[0].upper():
+            return Route(name=canonical, help_for=command)
+        try:
+            return Route(
+                name=canonical,
+                command=command,
+                args=parse_arguments(command.ARGUMENTS, values),
+            )
+        except ArgumentError as e:
+            return Route(name=canonical, error=str(e), usage_for=command)
@@ -0,0 +1,203 @@
+""" Runs timers from one thread, sleeping until the earliest deadline """
+
+import heapq
+import logging
+import time
+from threading import Condition, Thread
+from typing import Callable, Dict, Hashable, List, Optional
+
+# Deadlines are time.monotonic() values, a callback returns its next deadline to
+# run again or None to finish
+TimerCallback = Callable[[], Optional[float]]
+
+
+class _Timer:
+    """
+    Heap entry of a scheduled callback. A cancelled or rescheduled timer is only
+    marked dead and skipped once it reaches the top of the heap.
+    """
+
+    __slots__ = ("deadline", "sequence", "key", "callback")
+
+    def __init__(
+        self,
+        deadline: float,
+        sequence: int,
+        key: Hashable,
+        callback: Optional[TimerCallback],
+    ) -> None:
+        self.deadline: float = deadline
+        self.sequence: int = sequence
+        self.key: Hashable = key
+        self.callback: Optional[TimerCallback] = callback
+
+    def __lt__(self, other: "_Timer") -> bool:
+        return (self.deadline, self.sequence) < (other.deadline, other.sequence)
+
+
+class EventScheduler:
+    """
+    Background thread running timed callbacks, such as finishing a poll or sending
+    a broadcast, at their deadlines. Timers are kept in a min-heap by deadline and
+    the thread waits on a condition variable until the earliest one is due, or
+    without a timeout while there are none, so idle timers cost no CPU at all and
+    callbacks run as soon as they are due rather than on a polling tick.
+
+    Every timer has a key. Scheduling a key that is already pending replaces its
+    timer, and cancelling removes it; both are O(log n). Callbacks run on the
+    scheduler thread one at a time, so they must return quickly. One scheduler can
+    serve every channel of a multi-channel bot.
+    """
+
+    def __init__(self, clock: Callable[[], float] = time.monotonic) -> None:
+        """
+        Args:
+            clock: Callable[[], float] source of the time deadlines are measured in
+        """
+        self._clock: Callable[[], float] = clock
+        self._heap: List[_Timer] = []
+        self._timers: Dict[Hashable, _Timer] = {}
+        # Timer whose callback is running, and whether it was cancelled meanwhile
+        self._firing: Optional[_Timer] = None
+        self._firing_cancelled: bool = False
+        self._sequence: int = 0
+        self._wake: Condition = Condition()
+        self._stopping: bool = False
+        self._thread: Thread = Thread(target=self._run, name="event-scheduler")
+
+    @property
+    def pending(self) -> int:
+        """
+        Gets the number of scheduled timers
+        Returns:
+            int
+        """
+        return len(self._timers)
+
+    def start(self) -> None:
+        """
+        Starts the scheduler thread
+        Returns:
+            None
+        """
+        self._thread.start()
+
+    def stop(self) -> None:
+        """
+        Stops the scheduler thread, dropping any pending timers
+        Returns:
+            None
+        """
+        with self._wake:
+            self._stopping = True
+            self._wake.notify()
+        if self._thread.is_alive():
+            self._thread.join()
+
+    def schedule(self, key: Hashable, deadline: float, callback: TimerCallback) -> None:
+        """
+        Runs a callback at a deadline, replacing any timer pending under the key
+        Args:
+            key: Hashable identifying the timer
+            deadline: float time to run at, as measured by the scheduler's clock
+            callback: TimerCallback returning its next deadline or None
+
+        Returns:
+            None
+        """
+        with self._wake:
+            self._discard(key)
+            self._push(key, deadline, callback)
+            if self._heap[0].key == key:
+                self._wake.notify()
+
+    def cancel(self, key: Hashable) -> bool:
+        """
+        Removes a pending timer. Cancelling a timer whose callback is running keeps it
+        from running again, whatever deadline the callback returns.
+        Args:
+            key: Hashable identifying the timer
+
+        Returns:
+            bool True if a timer was pending or running under the key
+        """
+        with self._wake:
+            running: bool = self._firing is not None and self._firing.key == key
+            if running:
+                self._firing_cancelled = True
+            return self._discard(key) or running
+
+    def _push(self, key: Hashable, deadline: float, callback: TimerCallback) -> None:
+        self._sequence += 1
+        timer: _Timer = _Timer(deadline, self._sequence, key, callback)
+        self._timers[key] = timer
+        heapq.heappush(self._heap, timer)
+
+    def _discard(self, key: Hashable) -> bool:
+        timer: Optional[_Timer] = self._timers.pop(key, None)
+        if timer is None:
+            return False
+        timer.callback = None
+        # Rebuild once dead entries outnumber live ones so cancelled timers with
+        # distant deadlines cannot pile up in the heap
+        if len(self._heap) > 2 * len(self._timers) + 64:
+            self._heap = [entry for entry in self._heap if entry.callback]
+            heapq.heapify(self._heap)
+        return True
+
+    def _run(self) -> None:
+        while True:
+            with self._wake:
+                timer: Optional[_Timer] = self._next()
+                if timer is None:
+                    return
+            self._fire(timer)
+
+    def _next(self) -> Optional[_Timer]:
+        """
+        Waits for the earliest timer to come due and takes it off the heap. Must be
+        called holding the condition.
+        Returns:
+            Optional[_Timer] or None once the scheduler is stopping
+        """
+        while not self._stopping:
+            while self._heap and self._heap[0].callback is None:
+                heapq.heappop(self._heap)
+            if not self._heap:
+                self._wake.wait()
+                continue
+            delay: float = self._heap[0].deadline - self._clock()
+            if delay > 0:
+                self._wake.wait(delay)
+                continue
+            timer: _Timer = heapq.heappop(self._heap)
+            del self._timers[timer.key]
+            self._firing = timer
+            self._firing_cancelled = False
+            return timer
+        return None
+
+    def _fire(self, timer: _Timer) -> None:
+        """
+        Runs a due callback outside of the condition, so it may schedule or cancel
+        timers itself, and schedules it again if it asks to repeat
+        Args:
+            timer: _Timer that came due
+
+        Returns:
+            None
+        """
+        deadline: Optional[float] = None
+        try:
+            deadline = timer.callback()
+        except Exception as e:
+            logging.error("Timer %s failed: %s", timer.key, e)
+        with self._wake:
+            self._firing = None
+            # The callback may have been cancelled or replaced while it ran
+            if (
+                deadline is not None
+                and not self._firing_cancelled
+                and timer.key not in self._timers
+            ):
+                self._push(timer.key, deadline, timer.callback)
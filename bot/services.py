@@ -0,0 +1,69 @@
+""" Background services shared by several bots running in one process """
+
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from threading import Event
+
+from bot.scheduler import EventScheduler
+from storage import FlushScheduler
+from util.constants import (
+    FLUSH_DIRTY_USERS,
+    SHARED_HANDLER_THREADS,
+    WRITE_DELAY_SECONDS,
+)
+from util.metrics import Registry
+from util.slots import slotted
+
+
+@slotted
+@dataclass
+class SharedServices:
+    """
+    The thread pool running message handlers, the thread flushing stats and the
+    thread timing events, shared by every Twitchy given them. Their owner starts and
+    stops them, see bot.channels.ChannelGroup.
+    """
+
+    executor: ThreadPoolExecutor
+    flusher: FlushScheduler
+    scheduler: EventScheduler
+
+    @classmethod
+    def start(cls, metrics: Registry) -> "SharedServices":
+        """
+        Starts a set of services with no stores to flush yet
+        Args:
+            metrics: Registry for the flusher's metrics
+
+        Returns:
+            SharedServices
+        """
+        flusher: FlushScheduler = FlushScheduler(
+            [],
+            Event(),
+            FLUSH_DIRTY_USERS,
+            WRITE_DELAY_SECONDS,
+            metrics.histogram("twitchy_flush_seconds", "Time to flush stats"),
+        )
+        flusher.register_metrics(metrics)
+        flusher.start()
+        scheduler: EventScheduler = EventScheduler()
+        scheduler.start()
+        return cls(
+            ThreadPoolExecutor(
+                max_workers=SHARED_HANDLER_THREADS, thread_name_prefix="ingestion"
+            ),
+            flusher,
+            scheduler,
+        )
+
+    def stop(self) -> None:
+        """
+        Stops timing events, flushes and stops the flusher and shuts the thread
+        pool down
+        Returns:
+            None
+        """
+        self.scheduler.stop()
+        self.flusher.stop()
+        self.executor.shutdown()
@@ -0,0 +1,196 @@
+""" One Twitch chat connection carrying several channels """
+
+import logging
+import queue
+import socket
+import time
+from threading import Event, Lock, Thread
+from typing import Callable, Dict, List, Optional
+
+import twitch
+
+from bot.outbound import SlidingWindow
+from util.constants import JOIN_LIMIT, JOIN_PERIOD_SECONDS
+
+
+class ChannelChat:
+    """
+    One channel of a SharedChat, standing in for the twitch.Chat of a Twitchy:
+    it hands over the messages sent in its channel and sends replies to it
+    """
+
+    def __init__(self, channel: str, connection: "SharedChat") -> None:
+        """
+        Args:
+            channel: str channel name without the '#'
+            connection: SharedChat the channel is joined through
+        """
+        self.channel: str = channel
+        self.helix: twitch.Helix = connection.helix
+        self.joined: Event = Event()
+        self._connection: SharedChat = connection
+        self._subscribers: List[Callable[[twitch.chat.Message], None]] = []
+
+    def subscribe(self, callback: Callable[[twitch.chat.Message], None]) -> None:
+        """
+        Registers a callback for incoming messages
+        Args:
+            callback: Callable[[twitch.chat.Message], None]
+
+        Returns:
+            None
+        """
+        self._subscribers.append(callback)
+
+    def send(self, text: str) -> None:
+        """
+        Sends a line to the channel, waiting until it has been joined
+        Args:
+            text: str line
+
+        Returns:
+            None
+        """
+        self.joined.wait()
+        self._connection.send(self.channel, text)
+
+    def deliver(self, message: twitch.chat.Message) -> None:
+        """
+        Hands a message sent in the channel to every subscriber
+        Args:
+            message: twitch.chat.Message
+
+        Returns:
+            None
+        """
+        for callback in self._subscribers:
+            callback(message)
+
+
+class SharedChat:
+    """
+    A single IRC connection joined to every channel of a bot. Twitch limits how
+    often one account may log in and join channels, so rather than a twitch.Chat
+    per channel, each logging in on its own socket, the bot logs in once and joins
+    every channel over this connection, at most JOIN_LIMIT joins per
+    JOIN_PERIOD_SECONDS. Messages are dispatched to the ChannelChat of the channel
+    they were sent in.
+    """
+
+    def __init__(
+        self,
+        nickname: str,
+        oauth: str,
+        helix: twitch.Helix,
+        irc: Optional[twitch.chat.IRC] = None,
+    ) -> None:
+        """
+        Args:
+            nickname: str name of the bot account
+            oauth: str OAuth token of the bot account
+            helix: twitch.Helix attached to every message
+            irc: Optional[twitch.chat.IRC] not yet started, created if not given
+        """
+        self.helix: twitch.Helix = helix
+        self._channels: Dict[str, ChannelChat] = {}
+        self._channels_mutex: Lock = Lock()
+        self._connected: Event = Event()
+        self._closing: bool = False
+        self._joins: "queue.Queue[Optional[str]]" = queue.Queue()
+        self._window: SlidingWindow = SlidingWindow(JOIN_LIMIT, JOIN_PERIOD_SECONDS)
+        self._irc: twitch.chat.IRC = irc or twitch.chat.IRC(nickname, password=oauth)
+        self._irc.incoming.subscribe(self._on_line)
+        self._joiner: Thread = Thread(
+            target=self._join_channels, name="chat-joins", daemon=True
+        )
+        self._joiner.start()
+        self._irc.start()
+
+    def join(self, channel: str) -> ChannelChat:
+        """
+        Joins a channel once the connection is logged in and the join rate allows
+        Args:
+            channel: str channel name, with or without the '#'
+
+        Returns:
+            ChannelChat of the channel
+        """
+        name: str = channel.lstrip("#").lower()
+        with self._channels_mutex:
+            chat: Optional[ChannelChat] = self._channels.get(name)
+            if chat is None:
+                chat = self._channels[name] = ChannelChat(name, self)
+                self._joins.put(name)
+        return chat
+
+    def send(self, channel: str, text: str) -> None:
+        """
+        Sends a line to a channel
+        Args:
+            channel: str channel name without the '#'
+            text: str line
+
+        Returns:
+            None
+        """
+        self._irc.send_message(message=text, channel=channel)
+
+    def close(self) -> None:
+        """
+        Stops joining channels and reading chat, closing the socket so the IRC
+        thread's blocking read ends and the process can exit
+        Returns:
+            None
+        """
+        self._closing = True
+        self._joins.put(None)
+        self._connected.set()
+        self._irc.active = False
+        try:
+            self._irc.socket.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self._irc.socket.close()
+
+    def _join_channels(self) -> None:
+        """
+        Joins requested channels in order, once logged in, waiting whenever Twitch's
+        join rate limit would be exceeded
+        Returns:
+            None
+        """
+        self._connected.wait()
+        while True:
+            name: Optional[str] = self._joins.get()
+            if name is None or self._closing:
+                return
+            wait: float = self._window.take()
+            while wait:
+                time.sleep(wait)
+                wait = self._window.take()
+            self._irc.join_channel(name)
+            self._channels[name].joined.set()
+            logging.info("Joined #%s", name)
+
+    def _on_line(self, data: bytes) -> None:
+        """
+        IRC subscription callback, dispatching chat messages by their channel
+        Args:
+            data: bytes line read from the connection
+
+        Returns:
+            None
+        """
+        # The server only talks to a connection once it is logged in
+        self._connected.set()
+        text: str = data.decode("utf-8").strip("\r\n")
+        # :sender!sender@sender.tmi.twitch.tv PRIVMSG #channel :text
+        prefix, found, rest = text.partition(" PRIVMSG #")
+        if not found or not prefix.startswith(":"):
+            return
+        channel, _, body = rest.partition(" :")
+        chat: Optional[ChannelChat] = self._channels.get(channel)
+        if chat is None:
+            return
+        sender: str = prefix[1:].split("!", 1)[0]
+        chat.deliver(twitch.chat.Message(channel, sender, body, self.helix, chat))
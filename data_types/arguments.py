@@ -0,0 +1,137 @@
+""" Typed argument schemas for chat commands """
+
+import re
+from dataclasses import dataclass
+from enum import Enum
+from typing import Any, Callable, Dict, List, Pattern, Tuple
+
+from util.slots import slotted
+
+DURATION_PATTERN: Pattern = re.compile(r"^(\d+)([smhd]?)$")
+DURATION_UNITS: Dict[str, int] = {"": 1, "s": 1, "m": 60, "h": 3600, "d": 86400}
+DICE_PATTERN: Pattern = re.compile(r"^(\d+)d(\d+)$")
+
+
+class ArgumentError(ValueError):
+    """
+    Raised when a command argument is missing or cannot be parsed
+    """
+
+
+class ArgumentKind(str, Enum):
+    """
+    Enum of the types a command argument can be parsed into
+    """
+
+    INT = "int"
+    USER = "user"
+    USERS = "users"
+    LIST = "list"
+    DURATION = "duration"
+    DICE = "dice"
+    TEXT = "text"
+
+
+def _parse_int(value: str) -> int:
+    try:
+        return int(value)
+    except ValueError as e:
+        raise ArgumentError(f"'{value}' is not a whole number") from e
+
+
+def _parse_user(value: str) -> str:
+    name: str = value.lstrip("@")
+    if not name:
+        raise ArgumentError("expected a username")
+    return name
+
+
+def _parse_users(value: str) -> List[str]:
+    names: List[str] = [
+        item.lstrip("@") for item in value.split(",") if item.lstrip("@")
+    ]
+    if not names:
+        raise ArgumentError("expected a comma separated list of usernames")
+    return names
+
+
+def _parse_list(value: str) -> List[str]:
+    items: List[str] = [item for item in value.split(",") if item]
+    if not items:
+        raise ArgumentError("expected a comma separated list")
+    return items
+
+
+def _parse_duration(value: str) -> int:
+    match = DURATION_PATTERN.match(value.lower())
+    if not match:
+        raise ArgumentError(f"'{value}' is not a duration like 90, 30s, 5m or 1h")
+    return int(match.group(1)) * DURATION_UNITS[match.group(2)]
+
+
+def _parse_dice(value: str) -> Tuple[int, int]:
+    match = DICE_PATTERN.match(value.lower())
+    if not match or int(match.group(2)) < 1:
+        raise ArgumentError(f"'{value}' is not a roll like 2d20")
+    return int(match.group(1)), int(match.group(2))
+
+
+PARSERS: Dict[ArgumentKind, Callable[[str], Any]] = {
+    ArgumentKind.INT: _parse_int,
+    ArgumentKind.USER: _parse_user,
+    ArgumentKind.USERS: _parse_users,
+    ArgumentKind.LIST: _parse_list,
+    ArgumentKind.DURATION: _parse_duration,
+    ArgumentKind.DICE: _parse_dice,
+    ArgumentKind.TEXT: str,
+}
+
+
+@slotted
+@dataclass(frozen=True)
+class Argument:
+    """
+    One positional argument of a command. Optional arguments fall back to their
+    default when the chatter leaves them out.
+    """
+
+    name: str
+    kind: ArgumentKind = ArgumentKind.TEXT
+    required: bool = True
+    default: Any = None
+
+    def parse(self, value: str) -> Any:
+        """
+        Converts the raw text of the argument into its kind
+        Args:
+            value: str raw argument
+
+        Returns:
+            Any parsed value
+        """
+        return PARSERS[self.kind](value)
+
+
+def parse_arguments(schema: Tuple[Argument, ...], values: List[str]) -> List[Any]:
+    """
+    Parses raw command arguments against a schema. Values beyond the schema are
+    ignored.
+    Args:
+        schema: Tuple[Argument, ...] expected arguments, in order
+        values: List[str] raw arguments
+
+    Returns:
+        List[Any] parsed arguments
+    """
+    parsed: List[Any] = []
+    for index, argument in enumerate(schema):
+        if index < len(values):
+            try:
+                parsed.append(argument.parse(values[index]))
+            except ArgumentError as e:
+                raise ArgumentError(f"{argument.name}: {e}") from e
+        elif argument.required:
+            raise ArgumentError(f"missing {argument.name}")
+        else:
+            parsed.append(argument.default)
+    return parsed
@@ -3,7 +3,10 @@ import uuid
 from dataclasses import dataclass
 from typing import Dict
 
+from util.slots import slotted
 
+
+@slotted
 @dataclass
 class Chatter:
     """
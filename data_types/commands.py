@@ -3,14 +3,20 @@
 from __future__ import annotations
 
 import logging
+import math
 import random
 import time
 from abc import ABC, abstractmethod
-from typing import TYPE_CHECKING, Any, List, Optional
+from typing import TYPE_CHECKING, Any, List, Optional, Sequence, Tuple
 
 import twitch
 
+from data_types.arguments import Argument, ArgumentKind
+from data_types.cooldown import Cooldown
+from data_types.priority import Priority
+from data_types.scope import Scope
 from data_types.rpg.meta_game import PlayerStats
+from .chatter import Chatter
 from .events import PollBotEvent, BroadcastBotEvent
 from .user import Level
 from .user import User
@@ -26,8 +32,20 @@ class Command(ABC):
     Attributes:
         description (str): Description of the command.
         example (str): Example usage of the command.
+        ARGUMENTS (Tuple[Argument, ...]): Schema the router parses arguments with.
+        COOLDOWN (Optional[Cooldown]): Limit on each chatter using this command.
+        GLOBAL_COOLDOWN (Optional[Cooldown]): Limit on the whole channel using this
+            command.
+        SCOPE (Scope): Whose state the command changes. TARGETS commands change the
+            users named by their first argument, CHANNEL commands the channel's
+            events.
     """
 
+    ARGUMENTS: Tuple[Argument, ...] = ()
+    COOLDOWN: Optional[Cooldown] = None
+    GLOBAL_COOLDOWN: Optional[Cooldown] = None
+    SCOPE: Scope = Scope.SENDER
+
     def __init__(self, description: str, example: str) -> None:
         """
         Initializes the Command class with a description and an example.
@@ -75,6 +93,8 @@ class OnTargetCommand(Command, ABC):
 
     FORMAT: str = "@{target} was {verb} by @{user}!"
     VERB: str = ""
+    ARGUMENTS: Tuple[Argument, ...] = (Argument("target", ArgumentKind.USER),)
+    SCOPE: Scope = Scope.TARGETS
 
     @abstractmethod
     def _increment(self, bot: Twitchy, target: str) -> None:
@@ -100,11 +120,12 @@ class OnTargetCommand(Command, ABC):
         Returns:
             None
         """
-        if target in bot.stats:
+        user: Optional[User] = bot.stats.get(target)
+        if user:
             self._increment(bot, target)
             bot.send(
                 self.FORMAT.format(
-                    target=target, user=message.user.display_name, verb=self.VERB
+                    target=user.name, user=message.user.display_name, verb=self.VERB
                 )
             )
         else:
@@ -149,7 +170,7 @@ class OnGetCountCommand(Command, ABC):
             self.FORMAT.format(
                 user=message.user.display_name,
                 description=self.DESCRIPTION,
-                count=self._get(bot, message.user.display_name),
+                count=self._get(bot, message.sender),
                 post=self.POST,
             )
         )
@@ -171,9 +192,7 @@ class OnInvalidCommand(Command):
         Returns:
             None
         """
-        message.chat.send(
-            f"@{message.user.display_name} that was an invalid command..."
-        )
+        bot.send(f"@{message.user.display_name} that was an invalid command...")
 
 
 class OnHelpCommand(Command):
@@ -195,12 +214,39 @@ class OnHelpCommand(Command):
         Returns:
             None
         """
-        message.chat.send(
+        bot.send(
             f"Hey @{message.user.display_name} here's your help:"
             f" {command.description} - {command.example}"
         )
 
 
+class OnUsageErrorCommand(Command):
+    """
+    Class used when a Command's arguments could not be parsed
+    """
+
+    def execute(
+        self,
+        bot: Twitchy,
+        message: twitch.chat.Message,
+        command: Command = None,
+        error: str = "",
+    ) -> None:
+        """
+        Executes the usage error response.
+
+        Args:
+            bot (Twitchy): Twitchy bot instance.
+            message (twitch.chat.Message): Message received as part of the command.
+            command (Command, optional): Command that was invoked.
+            error (str, optional): What was wrong with the arguments.
+
+        Returns:
+            None
+        """
+        bot.send(f"@{message.user.display_name} {error}. Usage: {command.example}")
+
+
 class OnDelayNotMetCommand(Command):
     """
     Class representing a fallback command for if a user invokes a command too soon.
@@ -210,7 +256,7 @@ class OnDelayNotMetCommand(Command):
         self,
         bot: Twitchy,
         message: twitch.chat.Message,
-        user_command_delta: float = 0,
+        remaining: float = 0,
         level: Level = Level.USER,
     ) -> None:
         """
@@ -219,22 +265,22 @@ class OnDelayNotMetCommand(Command):
         Args:
             bot (Twitchy): Twitchy bot instance.
             message (twitch.chat.Message): Message received as part of the command.
-            user_command_delta (float, optional): Time difference since the last command.
+            remaining (float, optional): Seconds until the command can be used.
             level (Level, optional): User level.
 
         Returns:
             None
         """
         if level == Level.VIP:
-            message.chat.send(
+            bot.send(
                 f"@{message.user.display_name} we know you're important but you"
-                f" cannot use a command again that soon!"
-                f"Wait {int(User.VIP_COMMAND_DELAY - user_command_delta)} seconds"
+                f" cannot use a command again that soon! "
+                f"Wait {math.ceil(remaining)} seconds"
             )
         else:
-            message.chat.send(
-                f"@{message.user.display_name} you cannot use a command again that soon!"
-                f"Wait {int(User.COMMAND_DELAY - user_command_delta)} seconds"
+            bot.send(
+                f"@{message.user.display_name} you cannot use a command again that soon! "
+                f"Wait {math.ceil(remaining)} seconds"
             )
 
 
@@ -255,9 +301,9 @@ class OnMessagesCommand(Command):
         Returns:
             None
         """
-        message.chat.send(
+        bot.send(
             f"@{message.user.display_name}, you have sent "
-            f"{bot.stats[message.user.display_name].messages_sent} messages."
+            f"{bot.stats[message.sender].messages_sent} messages."
         )
 
 
@@ -266,8 +312,11 @@ class OnSetVipsCommand(Command):
     Class representing a Command that sets a list of users to VIP status
     """
 
+    ARGUMENTS: Tuple[Argument, ...] = (Argument("users", ArgumentKind.USERS),)
+    SCOPE: Scope = Scope.TARGETS
+
     def execute(
-        self, bot: Twitchy, message: twitch.chat.Message, to_vip: str = ""
+        self, bot: Twitchy, message: twitch.chat.Message, to_vip: Sequence[str] = ()
     ) -> None:
         """
         Executes the set VIPs command response.
@@ -275,12 +324,12 @@ class OnSetVipsCommand(Command):
         Args:
             bot (Twitchy): Twitchy bot instance.
             message (twitch.chat.Message): Message received as part of the command.
-            *to_vip (Any): Users to set as VIP.
+            to_vip (Sequence[str]): Users to set as VIP.
 
         Returns:
             None
         """
-        _set_levels(bot, to_vip.split(","), Level.VIP)
+        _set_levels(bot, to_vip, Level.VIP)
 
 
 class OnSetModsCommand(Command):
@@ -288,8 +337,11 @@ class OnSetModsCommand(Command):
     Class representing a Command that sets a list of users to MOD staus
     """
 
+    ARGUMENTS: Tuple[Argument, ...] = (Argument("users", ArgumentKind.USERS),)
+    SCOPE: Scope = Scope.TARGETS
+
     def execute(
-        self, bot: Twitchy, message: twitch.chat.Message, to_mod: str = ""
+        self, bot: Twitchy, message: twitch.chat.Message, to_mod: Sequence[str] = ()
     ) -> None:
         """
         Executes the set moderators command response.
@@ -297,12 +349,12 @@ class OnSetModsCommand(Command):
         Args:
             bot (Twitchy): Twitchy bot instance.
             message (twitch.chat.Message): Message received as part of the command.
-            *to_mod (Any): Users to set as moderators.
+            to_mod (Sequence[str]): Users to set as moderators.
 
         Returns:
             None
         """
-        _set_levels(bot, to_mod.split(","), Level.MOD)
+        _set_levels(bot, to_mod, Level.MOD)
 
 
 class OnRollCommand(Command):
@@ -310,8 +362,14 @@ class OnRollCommand(Command):
     Class that represents a Command that rolls n d[sides] dice.
     """
 
+    ARGUMENTS: Tuple[Argument, ...] = (Argument("roll", ArgumentKind.DICE),)
+    COOLDOWN: Optional[Cooldown] = Cooldown(10)
+
     def execute(
-        self, bot: Twitchy, message: twitch.chat.Message, roll_str: str = ""
+        self,
+        bot: Twitchy,
+        message: twitch.chat.Message,
+        roll: Tuple[int, int] = (1, 20),
     ) -> None:
         """
         Executes the roll command response.
@@ -319,29 +377,16 @@ class OnRollCommand(Command):
         Args:
             bot (Twitchy): Twitchy bot instance.
             message (twitch.chat.Message): Message received as part of the command.
-            roll_str (str, optional): Roll string.
+            roll (Tuple[int, int]): Number of dice and their sides.
 
         Returns:
             None
         """
-        try:
-            split_roll: List[str] = roll_str.split("d")
-            roll_string: str = _roll_dice(int(split_roll[1]), int(split_roll[0]))
-            message.chat.send(
-                f"@{message.user.display_name} rolled {roll_string} for: {roll_string}"
-            )
-        except IndexError as error:
-            logging.error("Error parsing roll command: %s", error)
-            message.chat.send(
-                f"@{message.user.display_name} sorry that wasn't"
-                f" a valid roll...{roll_str}"
-            )
-        except TypeError as error:
-            logging.error("Error parsing roll command: %s", error)
-            message.chat.send(
-                f"@{message.user.display_name} sorry that wasn't"
-                f" a valid roll...{roll_str}"
-            )
+        number, sides = roll
+        roll_string: str = _roll_dice(sides, number)
+        bot.send(
+            f"@{message.user.display_name} rolled {number}d{sides} for: {roll_string}"
+        )
 
 
 class OnFirstSightingCommand(Command):
@@ -360,7 +405,7 @@ class OnFirstSightingCommand(Command):
         Returns:
             None
         """
-        delta: float = time.time() - bot.stats[message.user.display_name].first_sighting
+        delta: float = time.time() - bot.stats[message.sender].first_sighting
         bot.send(
             f"@{message.user.display_name} you were first seen"
             f" {_seconds_to_dhms(delta)} ago! WOW!"
@@ -383,7 +428,7 @@ class OnWhoAmICommand(Command):
         Returns:
             None
         """
-        who_am_i: PlayerStats = bot.stats[message.user.display_name].player_stats
+        who_am_i: PlayerStats = bot.stats[message.sender].player_stats
         bot.send(f"@{message.user.display_name} {who_am_i.pretty()}")
 
 
@@ -403,9 +448,9 @@ class OnRerollMeCommand(Command):
         Returns:
             None
         """
-        delta: float = time.time() - bot.stats[message.user.display_name].last_reroll
+        delta: float = time.time() - bot.stats[message.sender].last_reroll
         if delta > User.REROLL_DELAY:
-            bot.reroll_user_stats(message.user.display_name)
+            bot.reroll_user_stats(message.sender)
         else:
             bot.send(
                 f"@{message.user.display_name} you can't reroll your character "
@@ -419,9 +464,12 @@ class OnBonkCommand(OnTargetCommand):
     """
 
     VERB: str = "bonked"
+    COOLDOWN: Optional[Cooldown] = Cooldown(30, 2)
 
     def _increment(self, bot: Twitchy, target: str) -> None:
-        bot.stats[target].bonks += 1
+        with bot.stats.mutex:
+            bot.stats[target].bonks += 1
+            bot.mark_dirty(target)
 
 
 class OnGetBonksCommand(OnGetCountCommand):
@@ -442,9 +490,12 @@ class OnHugCommand(OnTargetCommand):
     """
 
     VERB: str = "hugged"
+    COOLDOWN: Optional[Cooldown] = Cooldown(30, 2)
 
     def _increment(self, bot: Twitchy, target: str) -> None:
-        bot.stats[target].hugs += 1
+        with bot.stats.mutex:
+            bot.stats[target].hugs += 1
+            bot.mark_dirty(target)
 
 
 class OnGetHugsCommand(OnGetCountCommand):
@@ -476,16 +527,20 @@ class OnCreatePollCommand(Command):
     variable number of choices, and a timeout duration.
     """
 
-    TITLE: int = 0
-    DURATION: int = -1
+    ARGUMENTS: Tuple[Argument, ...] = (
+        Argument("title"),
+        Argument("choices", ArgumentKind.LIST),
+        Argument("duration", ArgumentKind.DURATION),
+    )
+    SCOPE: Scope = Scope.CHANNEL
 
     def execute(
         self,
         bot: Twitchy,
         message: twitch.chat.Message,
         title: str = "",
-        choices: str = "",
-        duration: str = "",
+        choices: Sequence[str] = (),
+        duration: int = 0,
     ) -> None:
         """
         Executes the create poll command response.
@@ -494,22 +549,15 @@ class OnCreatePollCommand(Command):
             bot (Twitchy): Twitchy bot instance.
             message (twitch.chat.Message): Message received as part of the command.
             title (str): str title of the poll
-            choices (str): str ',' seperated choices for the poll
-            duration (str): str representing the poll duration in seconds
+            choices (Sequence[str]): choices for the poll
+            duration (int): poll duration in seconds
 
         Returns:
             None
         """
-        try:
-            poll_name: str = title.replace("_", " ").title()
-            poll_choices: List[str] = choices.split(",")
-            poll_duration: int = int(duration)
-            poll: PollBotEvent = PollBotEvent(
-                bot, poll_name, poll_choices, poll_duration
-            )
-            bot.add_poll(poll)
-        except IndexError as e:
-            logging.error("Error creating poll event %s", e)
+        poll_name: str = title.replace("_", " ").title()
+        poll: PollBotEvent = PollBotEvent(bot, poll_name, list(choices), duration)
+        bot.add_poll(poll)
 
 
 class OnSetBroadcastCommand(Command):
@@ -518,35 +566,38 @@ class OnSetBroadcastCommand(Command):
     according to some message.
     """
 
+    ARGUMENTS: Tuple[Argument, ...] = (
+        Argument("message"),
+        Argument("delay", ArgumentKind.DURATION),
+        Argument("repetitions", ArgumentKind.INT, required=False, default=0),
+    )
+    SCOPE: Scope = Scope.CHANNEL
+
     def execute(
         self,
         bot: Twitchy,
         message: twitch.chat.Message,
         broadcast_message: str = "",
-        rate: str = "",
-        repetitions: str = "0",
+        rate: int = 60,
+        repetitions: int = 0,
     ) -> None:
         """
+        Executes the set broadcast command response.
 
         Args:
-            bot:
-            message:
-            broadcast_message:
-            rate:
-            repetitions:
+            bot (Twitchy): Twitchy bot instance.
+            message (twitch.chat.Message): Message received as part of the command.
+            broadcast_message (str): message to broadcast
+            rate (int): seconds between broadcasts
+            repetitions (int): number of times to broadcast
 
         Returns:
-
+            None
         """
-        try:
-            rate: int = int(rate)
-            repetitions: int = int(repetitions)
-            broadcast_event: BroadcastBotEvent = BroadcastBotEvent(
-                bot, broadcast_message, rate, bool(repetitions), repetitions
-            )
-            bot.add_event("current_broadcast", broadcast_event)
-        except TypeError as e:
-            logging.error("Error creating broadcast event: %s", e)
+        broadcast_event: BroadcastBotEvent = BroadcastBotEvent(
+            bot, broadcast_message, rate, bool(repetitions), repetitions
+        )
+        bot.add_event("current_broadcast", broadcast_event)
 
 
 class OnVoteCommand(Command):
@@ -554,8 +605,18 @@ class OnVoteCommand(Command):
     Class representing a Command that accepts a user's vote on the current poll
     """
 
+    ARGUMENTS: Tuple[Argument, ...] = (
+        Argument("choice"),
+        Argument("poll", ArgumentKind.INT, required=False, default=0),
+    )
+    SCOPE: Scope = Scope.CHANNEL
+
     def execute(
-        self, bot: Twitchy, message: twitch.chat.Message, choice: str = ""
+        self,
+        bot: Twitchy,
+        message: twitch.chat.Message,
+        choice: str = "",
+        poll: int = 0,
     ) -> None:
         """
         Executes the vote command response.
@@ -563,38 +624,71 @@ class OnVoteCommand(Command):
         Args:
             bot (Twitchy): Twitchy bot instance.
             message (twitch.chat.Message): Message received as part of the command.
-            choice (str, optional): Poll choice to vote for.
+            choice (str): Poll choice to vote for.
+            poll (int): id of the poll, 0 for the newest one
 
         Returns:
             None
         """
-        user: User = bot.stats.get(message.user.display_name)
-        delta: float = time.time() - user.last_vote
-        if delta > User.VOTE_DELAY:
-            bot.update_poll(user.name, choice)
-            bot.stats[message.user.display_name].last_vote = time.time()
-        else:
-            bot.send(f"@{message.user.display_name} you already voted!")
+        bot.update_poll(message.user.id, message.user.display_name, choice, poll)
+
+
+class OnRetractVoteCommand(Command):
+    """
+    Class representing a Command that withdraws a user's vote on a poll
+    """
+
+    ARGUMENTS: Tuple[Argument, ...] = (
+        Argument("poll", ArgumentKind.INT, required=False, default=0),
+    )
+    SCOPE: Scope = Scope.CHANNEL
+
+    def execute(
+        self, bot: Twitchy, message: twitch.chat.Message, poll: int = 0
+    ) -> None:
+        """
+        Executes the retract vote command response.
+
+        Args:
+            bot (Twitchy): Twitchy bot instance.
+            message (twitch.chat.Message): Message received as part of the command.
+            poll (int): id of the poll, 0 for the newest one
+
+        Returns:
+            None
+        """
+        bot.retract_vote(message.user.id, message.user.display_name, poll)
 
 
 class OnGetCurrentPoll(Command):
     """
-    Class representing a Command that returns the currently active poll
+    Class representing a Command that returns the leading choices of the running polls
     """
 
-    def execute(self, bot: Twitchy, message: twitch.chat.Message) -> None:
+    ARGUMENTS: Tuple[Argument, ...] = (
+        Argument("poll", ArgumentKind.INT, required=False, default=0),
+    )
+    GLOBAL_COOLDOWN: Optional[Cooldown] = Cooldown(15)
+    SCOPE: Scope = Scope.CHANNEL
+
+    def execute(
+        self, bot: Twitchy, message: twitch.chat.Message, poll: int = 0
+    ) -> None:
         """
         Executes the get current poll command response.
 
         Args:
             bot (Twitchy): Twitchy bot instance.
             message (twitch.chat.Message): Message received as part of the command.
+            poll (int): id of one poll, 0 for every running poll
 
         Returns:
             None
         """
-        poll_event: Optional[PollBotEvent] = bot.get_current_poll_info()
-        if poll_event:
+        polls: List[PollBotEvent] = bot.polls(poll)
+        if not polls:
+            bot.send(f"@{message.user.display_name} there is no such poll running!")
+        for poll_event in polls:
             poll_event.current_status()
 
 
@@ -605,6 +699,8 @@ class OnGetCommands(Command):
     TODO Should return a list instead of a link-- come up with a good way to do this
     """
 
+    GLOBAL_COOLDOWN: Optional[Cooldown] = Cooldown(30)
+
     def execute(self, bot: Twitchy, message: twitch.chat.Message) -> None:
         """
         Executes the get commands response.
@@ -642,27 +738,34 @@ def _roll_dice(sides: int, number: int) -> str:
     return roll_string
 
 
-def _set_levels(bot: Twitchy, to_list: List[str], level: Level) -> None:
+def _set_levels(bot: Twitchy, to_list: Sequence[str], level: Level) -> None:
     """
     Sets user levels for a list of users.
 
     Args:
         bot (Twitchy): Twitchy bot instance.
-        to_list (Tuple[str, ...]): List of users to set levels for.
+        to_list (Sequence[str]): Users to set levels for.
         level (Level): Level to set for the users.
 
     Returns:
         None
     """
     for user in to_list:
-        if user in bot.chatters:
+        chatter: Optional[Chatter] = bot.presence.get(user)
+        if chatter:
             if user not in bot.stats:
-                bot.add_user(User(name=user, level=level))
+                bot.add_user(
+                    User(
+                        name=chatter.name,
+                        level=level,
+                        id=chatter.id,
+                        twitch_login=chatter.login,
+                    )
+                )
             else:
                 bot.set_user_level(user, level)
-            bot.send(f"/{level.value} {user}")
+            bot.send(f"/{level.value} {user}", Priority.HIGH)
             bot.send(f"@{user}, you are recognized as a {level.value}!")
-            time.sleep(1)
 
 
 def _seconds_to_dhms(elapsed: float) -> str:
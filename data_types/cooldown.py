@@ -0,0 +1,14 @@
+from dataclasses import dataclass
+
+from util.slots import slotted
+
+
+@slotted
+@dataclass(frozen=True)
+class Cooldown:
+    """
+    Rate limit allowing up to burst uses within any window of seconds
+    """
+
+    window: float
+    burst: int = 1
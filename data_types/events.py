@@ -2,7 +2,9 @@ from __future__ import annotations
 
 import time
 from abc import ABC, abstractmethod
-from typing import TYPE_CHECKING, List, Dict, Tuple, Optional
+from typing import TYPE_CHECKING, Any, List, Dict, Tuple, Optional, Type
+
+from data_types.priority import Priority
 
 if TYPE_CHECKING:
     from bot.bot import Twitchy
@@ -10,15 +12,29 @@ if TYPE_CHECKING:
 
 class BotEvent(ABC):
     """
-    Abstract base class for Events to be handled by the Twitchy bot
+    Abstract base class for Events to be handled by the Twitchy bot. The bot's
+    scheduler calls finish() at the event's deadline and again at every later
+    deadline until finish() returns the event.
     """
 
+    # Names the event's class in its serialized form, see EVENT_KINDS
+    KIND: str = ""
+
     def __init__(self, bot: Twitchy, timeout: float = 0, one_shot: bool = True):
         self._bot: Twitchy = bot
         self._timeout: float = timeout
-        self._spawn_time: float = time.time()
+        self._spawn_time: float = time.monotonic()
         self._one_shot: bool = one_shot
 
+    @property
+    def deadline(self) -> float:
+        """
+        Gets the time.monotonic() time the event is next due
+        Returns:
+            float
+        """
+        return self._spawn_time + self._timeout
+
     def timed_out(self) -> bool:
         """
 
@@ -26,9 +42,50 @@ class BotEvent(ABC):
 
         """
         if self._timeout != 0:
-            return time.time() - self._spawn_time >= self._timeout
+            return time.monotonic() >= self.deadline
         return False
 
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Serializes the event so it can be restored after a restart. Its deadline is
+        stored as a time.time() time, since time.monotonic() restarts with the
+        process.
+        Returns:
+            Dict[str, Any]
+        """
+        return {
+            "kind": self.KIND,
+            "timeout": self._timeout,
+            "one_shot": self._one_shot,
+            "deadline": time.time() + self.deadline - time.monotonic(),
+        }
+
+    @classmethod
+    @abstractmethod
+    def from_dict(cls, bot: Twitchy, vals: Dict[str, Any]) -> "BotEvent":
+        """
+        Deserializes an event serialized by to_dict(), see event_from_dict() for
+        events of any kind
+        Args:
+            bot: Twitchy bot running the event
+            vals: Dict[str, Any] serialized event
+
+        Returns:
+            BotEvent
+        """
+        raise NotImplementedError
+
+    def _restore_deadline(self, deadline: float) -> None:
+        """
+        Moves the event's deadline to a time.time() time it was serialized with
+        Args:
+            deadline: float time.time() time the event is due
+
+        Returns:
+            None
+        """
+        self._spawn_time = time.monotonic() + deadline - time.time() - self._timeout
+
     @abstractmethod
     def finish(self) -> Optional["BotEvent"]:
         """
@@ -44,6 +101,8 @@ class BroadcastBotEvent(BotEvent):
     BotEvent for handling BroadcastEvents
     """
 
+    KIND: str = "broadcast"
+
     def __init__(
         self,
         bot: Twitchy,
@@ -57,11 +116,36 @@ class BroadcastBotEvent(BotEvent):
         self._repeats: int = repeats
         self._iterations: int = 0
 
+    def to_dict(self) -> Dict[str, Any]:
+        values: Dict[str, Any] = super().to_dict()
+        values.update(
+            message=self._message, repeats=self._repeats, iterations=self._iterations
+        )
+        return values
+
+    @classmethod
+    def from_dict(cls, bot: Twitchy, vals: Dict[str, Any]) -> "BroadcastBotEvent":
+        """
+        Deserializes a broadcast serialized by to_dict()
+        Args:
+            bot: Twitchy bot sending the broadcast
+            vals: Dict[str, Any] serialized broadcast
+
+        Returns:
+            BroadcastBotEvent
+        """
+        broadcast: BroadcastBotEvent = cls(
+            bot, vals["message"], vals["timeout"], vals["one_shot"], vals["repeats"]
+        )
+        broadcast._iterations = vals.get("iterations", 0)
+        broadcast._restore_deadline(vals["deadline"])
+        return broadcast
+
     def finish(self) -> Optional["BroadcastBotEvent"]:
         if self.timed_out():
             self._iterations += 1 if not self._one_shot else 0
-            self._bot.send(f"Broadcast Message: {self._message}")
-            self._spawn_time = time.time() if not self._one_shot else 0
+            self._bot.send(f"Broadcast Message: {self._message}", Priority.LOW)
+            self._spawn_time = time.monotonic() if not self._one_shot else 0
             if self._one_shot:
                 return self
             if not self._one_shot and self._iterations >= self._repeats:
@@ -71,15 +155,32 @@ class BroadcastBotEvent(BotEvent):
 
 class PollBotEvent(BotEvent):
     """
-    BotEvent for handling PollEvents
+    BotEvent for handling PollEvents. Several polls can run at once, each addressed
+    by the id the bot gives it. Tallies are kept ranked as votes arrive, and the
+    leaders are read straight off the front of the ranking. Choices with the same
+    count form one block of the ranking, whose bounds are kept by count: a vote
+    changes one count by one, so the choice swaps with the end of its block and
+    joins the neighbouring block in constant time however many choices are tied.
     """
 
+    KIND: str = "poll"
+    # Choices shown in a status message
+    TOP: int = 3
+
     def __init__(
         self, bot: Twitchy, title: str, choices: List[str], timeout: float = 0
     ):
         super().__init__(bot, timeout)
+        self.id: int = 0
         self._title: str = title
         self._choices: Dict[str, int] = {choice: 0 for choice in choices}
+        self._ranking: List[str] = list(self._choices)
+        self._ranks: Dict[str, int] = {}
+        # First and last rank of the choices with each count
+        self._blocks: Dict[int, List[int]] = {}
+        # Choice of every voter, keyed by Twitch user id
+        self._votes: Dict[str, str] = {}
+        self._rank()
 
     @property
     def title(self) -> str:
@@ -90,17 +191,108 @@ class PollBotEvent(BotEvent):
         """
         return self._title
 
-    def vote(self, choice: str) -> None:
+    @property
+    def voters(self) -> int:
+        """
+        Gets the number of chatters with a vote in the poll
+        Returns:
+            int
+        """
+        return len(self._votes)
+
+    def to_dict(self) -> Dict[str, Any]:
+        values: Dict[str, Any] = super().to_dict()
+        values.update(
+            id=self.id,
+            title=self._title,
+            choices=list(self._choices),
+            votes=dict(self._votes),
+        )
+        return values
+
+    @classmethod
+    def from_dict(cls, bot: Twitchy, vals: Dict[str, Any]) -> "PollBotEvent":
         """
+        Deserializes a poll serialized by to_dict(). The tallies are counted from
+        the votes once and ranked in one sort.
+        Args:
+            bot: Twitchy bot running the poll
+            vals: Dict[str, Any] serialized poll
+
+        Returns:
+            PollBotEvent
+        """
+        poll: PollBotEvent = cls(bot, vals["title"], vals["choices"], vals["timeout"])
+        poll.id = vals["id"]
+        for voter, choice in vals.get("votes", {}).items():
+            if choice in poll._choices:
+                poll._votes[voter] = choice
+                poll._choices[choice] += 1
+        poll._rank()
+        poll._restore_deadline(vals["deadline"])
+        return poll
+
+    def vote(self, voter: str, choice: str) -> Optional[str]:
+        """
+        Records a voter's choice, replacing any earlier vote of theirs
+        Args:
+            voter: str Twitch user id of the voter
+            choice: str choice voted for
+
+        Returns:
+            Optional[str] choice the voter had voted for before, if any
+
+        Raises:
+            KeyError: if the choice is not in this poll
+        """
+        if choice not in self._choices:
+            raise KeyError(choice)
+        previous: Optional[str] = self._votes.get(voter)
+        if previous != choice:
+            if previous is not None:
+                self._count(previous, -1)
+            self._votes[voter] = choice
+            self._count(choice, 1)
+        return previous
+
+    def retract(self, voter: str) -> Optional[str]:
+        """
+        Withdraws a voter's vote
+        Args:
+            voter: str Twitch user id of the voter
+
+        Returns:
+            Optional[str] choice the voter had voted for, if any
+        """
+        previous: Optional[str] = self._votes.pop(voter, None)
+        if previous is not None:
+            self._count(previous, -1)
+        return previous
 
+    def top(self, count: int) -> List[Tuple[str, int]]:
+        """
+        Gets the leading choices
         Args:
-            choice:
+            count: int number of choices
 
         Returns:
+            List[Tuple[str, int]] of choice and votes, most votes first
+        """
+        return [(choice, self._choices[choice]) for choice in self._ranking[:count]]
 
+    def status(self) -> str:
+        """
+        Describes the leading choices of the poll
+        Returns:
+            str
         """
-        if choice in self._choices:
-            self._choices[choice] += 1
+        status_string: str = "".join(
+            f" {choice.title()}:{votes}" for choice, votes in self.top(self.TOP)
+        )
+        hidden: int = len(self._ranking) - self.TOP
+        if hidden > 0:
+            status_string += f" (+{hidden} more)"
+        return f"#{self.id} {self._title}: {status_string}"
 
     def current_status(self) -> None:
         """
@@ -108,10 +300,7 @@ class PollBotEvent(BotEvent):
         Returns:
 
         """
-        status_string: str = ""
-        for key, value in self._choices.items():
-            status_string += f" {key.title()}:{value}"
-        self._bot.send(f"{self._title}: {status_string}")
+        self._bot.send(self.status())
 
     def finish(self) -> Optional[BotEvent]:
         """
@@ -120,14 +309,85 @@ class PollBotEvent(BotEvent):
 
         """
         if self.timed_out() or not self._timeout:
-            winner: Tuple[str, int] = ("", 0)
-            for choice, count in self._choices.items():
-                winner = (choice, count) if count > winner[1] else winner
-            self._bot.send(
-                f"{self._title} - {winner[0].title()} has won with {winner[1]} votes!"
-            )
-            for user in self._bot.stats.values():
-                user.last_vote = 0
-            self._spawn_time = time.time() if not self._one_shot else 0
+            if self._votes:
+                winner, votes = self.top(1)[0]
+                self._bot.send(
+                    f"{self._title} - {winner.title()} has won with {votes} votes!"
+                )
+            else:
+                self._bot.send(f"{self._title} ended without any votes.")
+            self._spawn_time = time.monotonic() if not self._one_shot else 0
             return self if self._one_shot else None
         return None
+
+    def _rank(self) -> None:
+        """
+        Sorts the choices by count and finds the bounds of every block of tied
+        choices
+        Returns:
+            None
+        """
+        self._ranking.sort(key=lambda choice: -self._choices[choice])
+        self._ranks = {}
+        self._blocks = {}
+        for rank, choice in enumerate(self._ranking):
+            self._ranks[choice] = rank
+            self._blocks.setdefault(self._choices[choice], [rank, rank])[1] = rank
+
+    def _count(self, choice: str, delta: int) -> None:
+        """
+        Changes a choice's count by one vote. The choice swaps places with the
+        first of its tied choices when gaining a vote, or the last when losing one,
+        which moves it to the edge of the neighbouring block.
+        Args:
+            choice: str choice voted for or against
+            delta: int 1 or -1
+
+        Returns:
+            None
+        """
+        votes: int = self._choices[choice]
+        block: List[int] = self._blocks[votes]
+        edge: int = block[0] if delta > 0 else block[1]
+        neighbour: str = self._ranking[edge]
+        rank: int = self._ranks[choice]
+        self._ranking[rank], self._ranking[edge] = neighbour, choice
+        self._ranks[neighbour], self._ranks[choice] = rank, edge
+
+        if block[0] == block[1]:
+            del self._blocks[votes]
+        elif delta > 0:
+            block[0] += 1
+        else:
+            block[1] -= 1
+        self._choices[choice] = votes + delta
+        joined: Optional[List[int]] = self._blocks.get(votes + delta)
+        if joined is None:
+            self._blocks[votes + delta] = [edge, edge]
+        elif delta > 0:
+            joined[1] = edge
+        else:
+            joined[0] = edge
+
+
+# Event classes by the KIND they are serialized with
+EVENT_KINDS: Dict[str, Type[BotEvent]] = {
+    BroadcastBotEvent.KIND: BroadcastBotEvent,
+    PollBotEvent.KIND: PollBotEvent,
+}
+
+
+def event_from_dict(bot: Twitchy, vals: Dict[str, Any]) -> BotEvent:
+    """
+    Deserializes an event of any kind serialized by its to_dict()
+    Args:
+        bot: Twitchy bot running the event
+        vals: Dict[str, Any] serialized event
+
+    Returns:
+        BotEvent
+
+    Raises:
+        KeyError: if the event is of an unknown kind or is missing a value
+    """
+    return EVENT_KINDS[vals["kind"]].from_dict(bot, vals)
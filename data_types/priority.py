@@ -0,0 +1,11 @@
+from enum import IntEnum
+
+
+class Priority(IntEnum):
+    """
+    Enum of the lanes outgoing chat messages wait in, sent most important first
+    """
+
+    HIGH = 0
+    NORMAL = 1
+    LOW = 2
@@ -1,10 +1,13 @@
 import random
 
 from dataclasses import dataclass
-from typing import List
+from typing import Dict, List
 
+from util.slots import slotted
 
-@dataclass
+
+@slotted
+@dataclass(frozen=True)
 class Dice:
     """
     Wrapper class for a Dice
@@ -24,6 +27,14 @@ class Dice:
         """
         return [self.sides, self.count]
 
+    def to_dict(self) -> Dict[str, int]:
+        """
+        Serializes the Dice into a dictionary
+        Returns:
+            Dict[str, int]
+        """
+        return {"sides": self.sides, "count": self.count}
+
     def roll(self) -> int:
         """
         Rolls the dice and returns the result.
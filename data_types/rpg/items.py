@@ -1,10 +1,13 @@
 from abc import ABC
 from dataclasses import dataclass
+from functools import lru_cache
 from typing import Any, Dict, Tuple
 
 from data_types.rpg.dice import Dice
+from util.slots import slotted
 
 
+@slotted
 @dataclass
 class Attack:
     """
@@ -15,10 +18,12 @@ class Attack:
     message: str
 
 
-@dataclass
+@slotted
+@dataclass(frozen=True)
 class AttackItem(ABC):
     """
-    Abstract class for items used for attacking.
+    Abstract class for items used for attacking. Items are immutable so a single
+    instance can be shared by every player holding it.
     """
 
     name: str = "Fist"
@@ -32,37 +37,47 @@ class AttackItem(ABC):
     @classmethod
     def from_dict(cls, val: Dict[str, Any]) -> "AttackItem":
         """
-
+        Deserializes a dictionary written by to_dict. Dice given as a [sides, count]
+        list under 'dice' are also accepted.
         Args:
-            val:
+            val: Dict[str, Any] of values
 
         Returns:
-
+            AttackItem
         """
-        return Spell(
-            name=val.get("name", cls.name),
-            damage=Dice(*val.get("dice", cls.damage.as_list())),
-            stat=val.get("stat", cls.stat),
-            description=val.get("description", cls.stat),
+        default: AttackItem = _shared(cls)
+        damage: Any = val.get("damage", val.get("dice"))
+        if isinstance(damage, dict):
+            damage = (damage["sides"], damage["count"])
+        elif damage is None:
+            damage = default.damage.as_list()
+        return _shared_attack_item(
+            cls,
+            val.get("name", default.name),
+            *damage,
+            val.get("stat", default.stat),
+            val.get("description", default.description),
         )
 
     def to_dict(self) -> Dict:
         """
-
+        Serializes the AttackItem into a dictionary
         Returns:
-
+            Dict
         """
         return {
             "name": self.name,
-            "dice": [self.damage.sides, self.damage.count],
+            "damage": self.damage.to_dict(),
             "stat": self.stat,
+            "description": self.description,
         }
 
 
-@dataclass
+@slotted
+@dataclass(frozen=True)
 class StatItem(ABC):
     """
-    Abstract base class for items that affect stats
+    Abstract base class for items that affect stats, immutable like AttackItem
     """
 
     name: str = "None"
@@ -75,29 +90,32 @@ class StatItem(ABC):
     @classmethod
     def from_dict(cls, val: Dict[str, Any]) -> "StatItem":
         """
-
+        Deserializes a dictionary written by to_dict
         Args:
-            val:
+            val: Dict[str, Any] of values
 
         Returns:
-
+            StatItem
         """
-        return StatItem(
-            name=val.get("name", cls.name),
-            stats=tuple(val.get("stats", cls.stats)),
-            armor=val.get("armor", cls.armor),
+        default: StatItem = _shared(cls)
+        return _shared(
+            cls,
+            val.get("name", default.name),
+            tuple(val.get("stats", default.stats)),
+            val.get("armor", default.armor),
         )
 
     def to_dict(self) -> Dict:
         """
-
+        Serializes the StatItem into a dictionary
         Returns:
-
+            Dict
         """
         return {"name": self.name, "stats": list(self.stats), "armor": self.armor}
 
 
-@dataclass
+@slotted
+@dataclass(frozen=True)
 class Spell(AttackItem):
     """
     Class representing a Spell AttackItem
@@ -109,22 +127,40 @@ class Spell(AttackItem):
     description: str = "Fizzle..."
 
 
-@dataclass
+@slotted
+@dataclass(frozen=True)
 class Weapon(AttackItem):
     """
     Wrapper class for Weapon AttackItem
     """
 
 
-@dataclass
+@slotted
+@dataclass(frozen=True)
 class Armor(StatItem):
     """
     Wrapper class for Armor StatItem
     """
 
 
-@dataclass
+@slotted
+@dataclass(frozen=True)
 class Accessory(StatItem):
     """
     Wrapper class for Accessory StatItem
     """
+
+
+@lru_cache(maxsize=1024)
+def _shared(item_type: type, *values: Any) -> Any:
+    """
+    Builds an item, sharing one instance between every player holding the same item.
+    Items are never mutated in place, so sharing them is safe.
+    """
+    return item_type(*values)
+
+
+def _shared_attack_item(
+    item_type: type, name: str, sides: int, count: int, stat: str, description: str
+) -> AttackItem:
+    return _shared(item_type, name, _shared(Dice, sides, count), stat, description)
@@ -4,14 +4,16 @@ import dataclasses
 import random
 from dataclasses import dataclass
 from enum import Enum
-from typing import Dict, Tuple, List
+from typing import Any, Dict, Tuple, List
 
 from data_types.rpg.items import Weapon, Spell, Accessory, Armor, Attack
+from util.slots import slotted
 
 
 class Species(str, Enum):
     """
-    Enum class for chatter species
+    Enum class for chatter species. Binary records store species by position, so
+    new species must be appended.
     """
 
     HUMAN = "human"
@@ -91,7 +93,18 @@ SPECIES_LOOKUP: Dict[Species, Tuple[int, int, int, int, int, int]] = {
     Species.YUAN_TI: (0, +2, 0, +1, 0, 0),
 }
 
+ROLLED_FIELDS: Tuple[str, ...] = (
+    "race",
+    "strength",
+    "dexterity",
+    "constitution",
+    "intelligence",
+    "wisdom",
+    "charisma",
+)
 
+
+@slotted
 @dataclass
 class PlayerStats:
     """
@@ -167,42 +180,66 @@ class PlayerStats:
         player.current_mana = player.max_mana
         return player
 
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Serializes the PlayerStats into a dictionary, field by field rather than
+        through dataclasses.asdict, which deep-copies every nested value
+        Returns:
+            Dict[str, Any]
+        """
+        return {
+            "race": self.race.value,
+            "strength": self.strength,
+            "dexterity": self.dexterity,
+            "constitution": self.constitution,
+            "intelligence": self.intelligence,
+            "wisdom": self.wisdom,
+            "charisma": self.charisma,
+            "max_health": self.max_health,
+            "current_health": self.current_health,
+            "max_mana": self.max_mana,
+            "current_mana": self.current_mana,
+            "experience": self.experience,
+            "weapon": self.weapon.to_dict(),
+            "spell": self.spell.to_dict(),
+            "armor": self.armor.to_dict(),
+            "accessories": [accessory.to_dict() for accessory in self.accessories],
+        }
+
     @classmethod
-    def from_dict(cls, val: Dict[str, int]) -> "PlayerStats":
+    def from_dict(cls, val: Dict[str, Any]) -> "PlayerStats":
         """
         Deserializes a Dictionary into a PlayerStats objects
         Args:
-            val: Dict[str, int] representing the makeup of a PlayerStats object
+            val: Dict[str, Any] representing the makeup of a PlayerStats object
 
         Returns:
             PlayerStats
         """
-        species: Species = random.choice(list(Species))
+        if any(key not in val for key in ROLLED_FIELDS):
+            # Records missing a rolled stat get fresh rolls, only paid for when needed
+            rolled: PlayerStats = PlayerStats.new()
+            val = {**{key: getattr(rolled, key) for key in ROLLED_FIELDS}, **val}
         player: PlayerStats = PlayerStats(
-            race=val.get("race", species),
-            strength=val.get(
-                "strength", random.randint(8, 18) + SPECIES_LOOKUP[species][0]
-            ),
-            dexterity=val.get(
-                "dexterity", random.randint(8, 18) + SPECIES_LOOKUP[species][1]
-            ),
-            constitution=val.get(
-                "constitution", random.randint(8, 18) + SPECIES_LOOKUP[species][2]
-            ),
-            intelligence=val.get(
-                "intelligence", random.randint(8, 18) + SPECIES_LOOKUP[species][3]
-            ),
-            wisdom=val.get(
-                "wisdom", random.randint(8, 18) + SPECIES_LOOKUP[species][4]
-            ),
-            charisma=val.get(
-                "charisma", random.randint(8, 18) + SPECIES_LOOKUP[species][5]
-            ),
+            race=Species(val["race"]),
+            strength=val["strength"],
+            dexterity=val["dexterity"],
+            constitution=val["constitution"],
+            intelligence=val["intelligence"],
+            wisdom=val["wisdom"],
+            charisma=val["charisma"],
             max_health=0,
             max_mana=0,
             current_mana=0,
             current_health=0,
             experience=val.get("experience", 0),
+            weapon=Weapon.from_dict(val["weapon"]) if "weapon" in val else Weapon(),
+            spell=Spell.from_dict(val["spell"]) if "spell" in val else Spell(),
+            armor=Armor.from_dict(val["armor"]) if "armor" in val else Armor(),
+            accessories=[
+                Accessory.from_dict(accessory)
+                for accessory in val.get("accessories", [])
+            ],
         )
         player.max_health = val.get("max_health", 10 + player.constitution)
         player.max_mana = val.get("max_mana", 10 + player.intelligence)
@@ -0,0 +1,12 @@
+from enum import Enum
+
+
+class Scope(Enum):
+    """
+    Enum of whose state a command changes, which decides the worker process that
+    runs it when chat is partitioned across processes
+    """
+
+    SENDER = "sender"
+    TARGETS = "targets"
+    CHANNEL = "channel"
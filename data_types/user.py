@@ -1,14 +1,30 @@
+import copy
 import time
-from dataclasses import dataclass, asdict
+from dataclasses import dataclass, field
 from enum import Enum
 from typing import Dict, Any, ClassVar
 
 from data_types.rpg.meta_game import PlayerStats
+from util.slots import slotted
+
+
+def normalize_login(name: str) -> str:
+    """
+    Normalizes a user name as typed in chat, e.g. '@SomeOne', to the login it
+    belongs to
+    Args:
+        name: str name
+
+    Returns:
+        str
+    """
+    return name.lstrip("@").lower()
 
 
 class Level(str, Enum):
     """
-    Enum representing the 'level' of different chatters.
+    Enum representing the 'level' of different chatters. Binary records store levels
+    by position, so new levels must be appended.
     """
 
     OWNER = "owner"
@@ -17,30 +33,66 @@ class Level(str, Enum):
     USER = "user"
 
 
+@slotted(weakref_slot=True)
 @dataclass
 class User:
     """
-    Class representing the serializable data of a chat 'User'
+    Class representing the serializable data of a chat 'User'. Users are keyed by
+    their Twitch user id, or by their login until the id is known, so casing changes
+    and renames keep the same record. The name is only displayed: the login comes
+    from Helix once the user is identified, as localized display names do not match
+    it. Stores may hold them by weak reference.
     """
 
     REROLL_DELAY: ClassVar[float] = 2.592e6
     COMMAND_DELAY: ClassVar[int] = 60
     VIP_COMMAND_DELAY: ClassVar[int] = 30
-    VOTE_DELAY: ClassVar[int] = 10000000
+    COMMAND_BURST: ClassVar[int] = 3
 
     name: str = "__default__"
     level: Level = Level.USER
-    last_chat: float = time.time()
-    last_command: float = 0
-    last_vote: float = 0
+    last_chat: float = field(default_factory=time.time)
     last_battle: float = 0
     messages_sent: int = 0
-    first_sighting: int = time.time()
+    first_sighting: int = field(default_factory=time.time)
     last_reroll: float = 0
-    player_stats: PlayerStats = PlayerStats.new()
+    player_stats: PlayerStats = field(default_factory=PlayerStats.new)
     bonks: int = 0
     hugs: int = 0
     points: int = 0
+    id: str = ""
+    twitch_login: str = ""
+
+    @property
+    def login(self) -> str:
+        """
+        Gets the normalized login, the Twitch login if it is known and otherwise the
+        name compared case-insensitively
+        Returns:
+            str
+        """
+        return self.twitch_login or normalize_login(self.name)
+
+    @property
+    def key(self) -> str:
+        """
+        Gets the key the User is stored under
+        Returns:
+            str
+        """
+        return self.id or self.login
+
+    def snapshot(self) -> "User":
+        """
+        Takes a cheap point-in-time copy of the User that can be serialized while the
+        original keeps changing. Nested items are shared as they are never mutated in
+        place, only replaced.
+        Returns:
+            User
+        """
+        snapshot: User = copy.copy(self)
+        snapshot.player_stats = copy.copy(self.player_stats)
+        return snapshot
 
     def to_dict(self) -> Dict[str, Dict]:
         """
@@ -48,32 +100,51 @@ class User:
         Returns:
             Dict[str, Any]
         """
-        data: Dict = asdict(self)
-        data.pop("name")
-        return {self.name: data}
+        return {
+            self.key: {
+                "name": self.name,
+                "id": self.id,
+                "login": self.twitch_login,
+                "level": self.level.value,
+                "last_chat": self.last_chat,
+                "last_battle": self.last_battle,
+                "messages_sent": self.messages_sent,
+                "first_sighting": self.first_sighting,
+                "last_reroll": self.last_reroll,
+                "player_stats": self.player_stats.to_dict(),
+                "bonks": self.bonks,
+                "hugs": self.hugs,
+                "points": self.points,
+            }
+        }
 
     @classmethod
-    def from_dict(cls, name: str, vals: Dict[str, Any]) -> "User":
+    def from_dict(cls, key: str, vals: Dict[str, Any]) -> "User":
         """
         Deserializes a provided Dict[str, any] into a User object. If a value is not found
         a default value will be created.
         Args:
-            name: str name of the user
+            key: str the record is stored under, the name of records written before
+                users were keyed by id
             vals: Dict[str, Any] of values
 
         Returns:
             User
         """
         return User(
-            name=name,
+            name=vals.get("name") or key,
             level=Level(vals.get("level", "user")),
+            id=vals.get("id", ""),
+            twitch_login=vals.get("login", ""),
             last_chat=vals.get("last_chat", time.time()),
             messages_sent=vals.get("messages_sent", 0),
             first_sighting=vals.get("first_sighting", time.time()),
             last_reroll=vals.get("last_reroll", 0),
             hugs=vals.get("hugs", 0),
-            player_stats=PlayerStats.from_dict(
-                vals.get("player_stats", asdict(PlayerStats.new()))
+            player_stats=(
+                PlayerStats.from_dict(vals["player_stats"])
+                if "player_stats" in vals
+                else PlayerStats.new()
             ),
             bonks=vals.get("bonks", 0),
             points=vals.get("points", 0),
@@ -0,0 +1,10 @@
+from .base import UserStore
+from .codec import CODEC, CODECS, Codec, get_codec
+from .journal import StatsJournal
+from .event_journal import EventJournal
+from .json_store import JsonUserStore
+from .indexed_store import IndexedUserStore
+from .sharded_store import ShardedUserStore
+from .sqlite_store import SqliteUserStore
+from .factory import STORE_BACKENDS, create_event_journal, create_store
+from .flush_scheduler import FlushCounters, FlushScheduler
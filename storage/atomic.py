@@ -0,0 +1,44 @@
+import os
+import tempfile
+from typing import Union
+
+
+def atomic_write(path: str, data: Union[str, bytes]) -> None:
+    """
+    Replaces a file's contents so that readers, or a crash at any point, only ever
+    observe the old or the new contents in full. Data is written to a temporary
+    sibling, synced to disk and renamed over the target, then the directory entry
+    itself is synced.
+    Args:
+        path: str file to replace
+        data: Union[str, bytes] new contents
+
+    Returns:
+        None
+    """
+    directory: str = os.path.dirname(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(
+        dir=directory, prefix=f"{os.path.basename(path)}.", suffix=".tmp"
+    )
+    mode: str = "wb" if isinstance(data, bytes) else "w"
+    try:
+        with os.fdopen(fd, mode) as file:
+            file.write(data)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+    try:
+        dir_fd: int = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(dir_fd)
+    except OSError:
+        pass
+    finally:
+        os.close(dir_fd)
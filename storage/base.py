@@ -0,0 +1,433 @@
+import logging
+from abc import ABC, abstractmethod
+from threading import Lock, RLock
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from data_types import User
+from data_types.user import Level, normalize_login
+
+
+class UserStore(ABC):
+    """
+    Abstract base class for the persisted collection of chat Users. Supports the
+    subset of the Dict[str, User] interface used by the bot and its commands, and
+    tracks which users changed so backends only persist dirty records on flush.
+
+    Users are stored under their key, the Twitch user id once it is known and the
+    lowercased login before that, so casing changes and renames never split one
+    chatter across several records. Names are resolved to keys case-insensitively
+    through an index of logins to ids.
+
+    The store mutex is only ever held briefly: a flush swaps out the dirty set and
+    copies the affected users under it, then serializes and writes those copies
+    outside of it so chat handling never waits on disk I/O.
+    """
+
+    def __init__(
+        self, mutex: Optional[RLock] = None, logins: Optional[Dict[str, str]] = None
+    ) -> None:
+        self._mutex: RLock = mutex if mutex else RLock()
+        self._flush_mutex: Lock = Lock()
+        self._logins: Dict[str, str] = logins if logins is not None else {}
+        self._dirty: Set[str] = set()
+        # Keys of removed users, kept until a flush has deleted their records or a
+        # user is stored under the key again
+        self._removed: Set[str] = set()
+        self._dirty_listener: Optional[Callable[[int], None]] = None
+        self._bytes_written: int = 0
+
+    @property
+    def mutex(self) -> RLock:
+        """
+        Gets the store mutex, held while mutating or snapshotting users
+        Returns:
+            RLock
+        """
+        return self._mutex
+
+    @property
+    def dirty_count(self) -> int:
+        """
+        Gets the number of users changed since the last flush started
+        Returns:
+            int
+        """
+        return len(self._dirty)
+
+    @property
+    def bytes_written(self) -> int:
+        """
+        Gets the total number of bytes written by flushes since the store was created
+        Returns:
+            int
+        """
+        return self._bytes_written
+
+    def set_dirty_listener(self, listener: Optional[Callable[[int], None]]) -> None:
+        """
+        Registers a callback invoked with the dirty count whenever a user is marked
+        dirty. It runs under the store mutex, so it must return quickly.
+        Args:
+            listener: Optional[Callable[[int], None]] callback, or None to remove it
+
+        Returns:
+            None
+        """
+        self._dirty_listener = listener
+
+    @abstractmethod
+    def load(self, default_user: Optional[User]) -> None:
+        """
+        Opens the backing storage, seeding it with the provided User if it is empty
+        Args:
+            default_user: Optional[User] to create a brand-new store with
+
+        Returns:
+            None
+        """
+
+    def get(self, name: str, default: Optional[User] = None) -> Optional[User]:
+        """
+        Gets a User by name, ignoring case and a leading '@'
+        Args:
+            name: str name of the user
+            default: Optional[User] returned if the user is unknown
+
+        Returns:
+            Optional[User]
+        """
+        login: str = normalize_login(name)
+        key: Optional[str] = self._logins.get(login)
+        if key is None:
+            key = self._lookup_login(login)
+            if key is not None:
+                self._logins[login] = key
+        if key is not None:
+            user: Optional[User] = self._fetch(key)
+            # The login may have been left behind by a rename
+            if user is not None and user.login == login:
+                return user
+        # Users are only stored under their login until their id is known, so an
+        # all-digit login never resolves to the user with that id
+        user = self._fetch(login)
+        if user is None or user.id:
+            return default
+        return user
+
+    def identify(self, user_id: str, name: str, login: str = "") -> Optional[User]:
+        """
+        Gets the User with a Twitch user id, adopting the record stored under its
+        login before the id was known. A changed display name or login is taken
+        over, so a rename keeps the same record.
+        Args:
+            user_id: str Twitch user id
+            name: str current display name of the user
+            login: str current Twitch login of the user, derived from the display
+                name if empty
+
+        Returns:
+            Optional[User] or None if the user has never been seen
+        """
+        user: Optional[User] = self._fetch(user_id)
+        if user is not None:
+            if user.name != name or (login and user.twitch_login != login):
+                with self._mutex:
+                    logging.info("User %s is now known as %s", user.name, name)
+                    user.name = name
+                    user.twitch_login = login or user.twitch_login
+                    self._mark(user_id)
+            self._logins[user.login] = user_id
+            return user
+
+        with self._mutex:
+            key: str = normalize_login(login or name)
+            user = self._fetch(key)
+            if user is None or user.id:
+                return None
+            self._remove(key)
+            user.name = name
+            user.id = user_id
+            user.twitch_login = login
+            self.add(user)
+        return user
+
+    def add(self, user: User) -> None:
+        """
+        Adds or replaces a User and marks it dirty
+        Args:
+            user: User to be stored
+
+        Returns:
+            None
+        """
+        with self._mutex:
+            key: str = user.key
+            self._removed.discard(key)
+            self._store(key, user)
+            if user.id:
+                self._logins[user.login] = key
+            self._mark(key)
+
+    @abstractmethod
+    def _fetch(self, key: str) -> Optional[User]:
+        """
+        Gets a User by the key it is stored under, loading it if needed
+        Args:
+            key: str key of the user
+
+        Returns:
+            Optional[User]
+        """
+
+    @abstractmethod
+    def _store(self, key: str, user: User) -> None:
+        """
+        Holds a User in memory under its key until it is flushed
+        Args:
+            key: str key of the user
+            user: User to be stored
+
+        Returns:
+            None
+        """
+
+    @abstractmethod
+    def _evict(self, key: str) -> None:
+        """
+        Drops a User from memory, see _remove
+        Args:
+            key: str key of the user
+
+        Returns:
+            None
+        """
+
+    def _remove(self, key: str) -> None:
+        """
+        Drops a User and records its removal, so the next flush deletes its
+        persisted record. Must be called holding the mutex.
+        Args:
+            key: str key of the user
+
+        Returns:
+            None
+        """
+        self._evict(key)
+        self._removed.add(key)
+        self._mark(key)
+
+    def _lookup_login(self, login: str) -> Optional[str]:
+        """
+        Finds the key of a login through the login index. Backends that do not
+        index every user on load override it to look the login up in storage.
+        Args:
+            login: str normalized login
+
+        Returns:
+            Optional[str]
+        """
+        return self._logins.get(login)
+
+    def _index(self, users: Iterable[User]) -> None:
+        """
+        Adds the login of every identified User to the login index
+        Args:
+            users: Iterable[User] to index
+
+        Returns:
+            None
+        """
+        for user in users:
+            if user.id:
+                self._logins[user.login] = user.id
+
+    @abstractmethod
+    def values(self) -> Iterator[User]:
+        """
+        Iterates over every stored User
+        Returns:
+            Iterator[User]
+        """
+
+    @abstractmethod
+    def flush(self) -> int:
+        """
+        Persists every dirty User
+        Returns:
+            int number of users written
+        """
+
+    @abstractmethod
+    def _resident(self, name: str) -> Optional[User]:
+        """
+        Gets a User only if it is already held in memory
+        Args:
+            name: str name of the user
+
+        Returns:
+            Optional[User]
+        """
+
+    @abstractmethod
+    def __len__(self) -> int:
+        pass
+
+    def _swap_dirty(self) -> Tuple[List[User], List[str]]:
+        """
+        Starts a new dirty generation and snapshots every user from the previous one.
+        Dirty keys of removed users are returned instead, and dirty keys of users
+        that are neither held in memory nor removed have nothing left to write.
+        Returns:
+            Tuple[List[User], List[str]] point-in-time copies of the dirty users and
+                the keys of removed ones
+        """
+        with self._mutex:
+            dirty: Set[str] = self._dirty
+            self._dirty = set()
+            snapshots: List[User] = []
+            removed: List[str] = []
+            for key in dirty:
+                user: Optional[User] = self._resident(key)
+                if user:
+                    snapshots.append(user.snapshot())
+                elif key in self._removed:
+                    removed.append(key)
+        return snapshots, removed
+
+    def _write_flush(
+        self, write: Callable[[], int], snapshots: List[User], removed: List[str]
+    ) -> int:
+        """
+        Runs the write of a flush and counts its bytes, marking its users dirty
+        again if it raises
+        Args:
+            write: Callable[[], int] persisting the users, returning bytes written
+            snapshots: List[User] copies taken by _swap_dirty
+            removed: List[str] keys of removed users taken by _swap_dirty
+
+        Returns:
+            int number of bytes written
+        """
+        try:
+            written: int = write()
+        except BaseException:
+            self._restore_dirty(snapshots, removed)
+            raise
+        with self._mutex:
+            self._bytes_written += written
+            self._forget_removed(removed)
+        logging.debug(
+            "Flushed %s users (%s bytes)", len(snapshots) + len(removed), written
+        )
+        return written
+
+    def _forget_removed(self, keys: List[str]) -> None:
+        """
+        Stops tracking removed users whose records a flush deleted, unless they were
+        removed again since. Must be called holding the mutex.
+        Args:
+            keys: List[str] keys of the removed users that were flushed
+
+        Returns:
+            None
+        """
+        self._removed.difference_update(key for key in keys if key not in self._dirty)
+
+    def _restore_dirty(self, snapshots: List[User], removed: List[str]) -> None:
+        """
+        Marks the users of a flush that failed dirty again, so the next flush
+        retries them instead of their changes being lost
+        Args:
+            snapshots: List[User] copies taken by _swap_dirty
+            removed: List[str] keys of removed users taken by _swap_dirty
+
+        Returns:
+            None
+        """
+        with self._mutex:
+            self._dirty.update(user.key for user in snapshots)
+            self._dirty.update(removed)
+
+    def close(self) -> None:
+        """
+        Flushes any pending changes and releases the backing storage
+        Returns:
+            None
+        """
+        self.flush()
+
+    def mark_dirty(self, name: str) -> None:
+        """
+        Flags a user as changed so it is written out on the next flush
+        Args:
+            name: str name of the changed user
+
+        Returns:
+            None
+        """
+        login: str = normalize_login(name)
+        self._mark(self._logins.get(login, login))
+
+    def _mark(self, key: str) -> None:
+        """
+        Flags the user stored under a key as changed
+        Args:
+            key: str key of the changed user
+
+        Returns:
+            None
+        """
+        with self._mutex:
+            self._dirty.add(key)
+            if self._dirty_listener:
+                self._dirty_listener(len(self._dirty))
+
+    def __getitem__(self, name: str) -> User:
+        user: Optional[User] = self.get(name)
+        if user is None:
+            raise KeyError(name)
+        return user
+
+    def __setitem__(self, name: str, user: User) -> None:
+        # Renaming a user stored under its login moves the record to the new login
+        if not user.id and user.login != normalize_login(name):
+            with self._mutex:
+                self._remove(user.key)
+        user.name = name
+        self.add(user)
+
+    def __contains__(self, name: object) -> bool:
+        return isinstance(name, str) and self.get(name) is not None
+
+
+def merge_duplicates(users: Iterable[User]) -> Dict[str, User]:
+    """
+    Groups Users by their key and merges those that were stored separately before
+    users were keyed by id, e.g. under differently cased names. Counters are added
+    up, the highest level and earliest first sighting are kept, and the most recent
+    chatter's name and character win.
+    Args:
+        users: Iterable[User] possibly holding duplicates
+
+    Returns:
+        Dict[str, User] of key to merged User
+    """
+    groups: Dict[str, List[User]] = {}
+    for user in users:
+        groups.setdefault(user.key, []).append(user)
+    merged: Dict[str, User] = {}
+    for key, group in groups.items():
+        group.sort(key=lambda duplicate: duplicate.last_chat, reverse=True)
+        user: User = group[0]
+        for duplicate in group[1:]:
+            user.level = min(user.level, duplicate.level, key=list(Level).index)
+            user.last_chat = max(user.last_chat, duplicate.last_chat)
+            user.last_battle = max(user.last_battle, duplicate.last_battle)
+            user.last_reroll = max(user.last_reroll, duplicate.last_reroll)
+            user.first_sighting = min(user.first_sighting, duplicate.first_sighting)
+            user.messages_sent += duplicate.messages_sent
+            user.bonks += duplicate.bonks
+            user.hugs += duplicate.hugs
+            user.points += duplicate.points
+        merged[key] = user
+    return merged
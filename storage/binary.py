@@ -0,0 +1,351 @@
+""" Compact, versioned binary encoding of User records """
+
+import struct
+from functools import lru_cache
+from typing import Callable, Dict, List, Optional, Tuple
+
+from data_types import PlayerStats, User
+from data_types.rpg.dice import Dice
+from data_types.rpg.items import (
+    Accessory,
+    Armor,
+    AttackItem,
+    Spell,
+    StatItem,
+    Weapon,
+)
+from data_types.rpg.meta_game import Species
+from data_types.user import Level
+
+SCHEMA_VERSION: int = 5
+
+VERSION: struct.Struct = struct.Struct("<B")
+STRING_LENGTH: struct.Struct = struct.Struct("<H")
+ITEM_COUNT: struct.Struct = struct.Struct("<B")
+DICE: struct.Struct = struct.Struct("<hh")
+STAT_ITEM: struct.Struct = struct.Struct("<6hi")
+
+# Enum members are stored by position, so new members must only ever be appended.
+LEVELS: Tuple[Level, ...] = tuple(Level)
+SPECIES: Tuple[Species, ...] = tuple(Species)
+
+
+class SchemaVersionError(ValueError):
+    """
+    Raised when a record was written by a newer schema than this reader knows
+    """
+
+
+class _Layout:
+    """
+    Fixed-width block of scalar fields for one schema version, packed with a single
+    struct call. Strings and then items follow the block as length-prefixed fields.
+    """
+
+    def __init__(
+        self, fields: Tuple[Tuple[str, str], ...], strings: Tuple[str, ...] = ()
+    ) -> None:
+        self.fields: Tuple[Tuple[str, str], ...] = fields
+        self.names: Tuple[str, ...] = tuple(name for name, _ in fields)
+        self.struct: struct.Struct = struct.Struct(
+            "<" + "".join(code for _, code in fields)
+        )
+        self.strings: Tuple[str, ...] = strings
+
+
+STATS_FIELDS: Tuple[Tuple[str, str], ...] = (
+    ("race", "B"),
+    ("strength", "h"),
+    ("dexterity", "h"),
+    ("constitution", "h"),
+    ("intelligence", "h"),
+    ("wisdom", "h"),
+    ("charisma", "h"),
+    ("max_health", "i"),
+    ("current_health", "i"),
+    ("max_mana", "i"),
+    ("current_mana", "i"),
+    ("experience", "q"),
+)
+
+LAYOUTS: Dict[int, _Layout] = {
+    1: _Layout(
+        (
+            ("level", "B"),
+            ("last_chat", "d"),
+            ("last_command", "d"),
+            ("last_vote", "d"),
+            ("last_battle", "d"),
+            ("messages_sent", "q"),
+            ("first_sighting", "d"),
+            ("last_reroll", "d"),
+            ("bonks", "q"),
+            ("hugs", "q"),
+            ("points", "q"),
+            *STATS_FIELDS,
+        )
+    ),
+    # Command cooldowns moved to bot.cooldowns, last_command is no longer stored
+    2: _Layout(
+        (
+            ("level", "B"),
+            ("last_chat", "d"),
+            ("last_vote", "d"),
+            ("last_battle", "d"),
+            ("messages_sent", "q"),
+            ("first_sighting", "d"),
+            ("last_reroll", "d"),
+            ("bonks", "q"),
+            ("hugs", "q"),
+            ("points", "q"),
+            *STATS_FIELDS,
+        )
+    ),
+}
+# Users are stored under their key, the name and Twitch user id are kept in the record
+LAYOUTS[3] = _Layout(LAYOUTS[2].fields, ("name", "id"))
+# Polls track their own voters, last_vote is no longer stored
+LAYOUTS[4] = _Layout(
+    tuple(field for field in LAYOUTS[3].fields if field[0] != "last_vote"),
+    ("name", "id"),
+)
+# The Twitch login is kept, as localized display names do not match it
+LAYOUTS[5] = _Layout(LAYOUTS[4].fields, ("name", "id", "login"))
+
+# Each migration rewrites decoded values from one schema version to the next
+# (upgrades) or previous (downgrades), keyed by the version it starts from.
+UPGRADES: Dict[int, Callable[[Dict], Dict]] = {
+    1: lambda values: {
+        name: value for name, value in values.items() if name != "last_command"
+    },
+    2: lambda values: {**values, "name": "", "id": ""},
+    3: lambda values: {
+        name: value for name, value in values.items() if name != "last_vote"
+    },
+    4: lambda values: {**values, "login": ""},
+}
+DOWNGRADES: Dict[int, Callable[[Dict], Dict]] = {
+    2: lambda values: {**values, "last_command": 0.0},
+    3: lambda values: {
+        name: value for name, value in values.items() if name not in ("name", "id")
+    },
+    4: lambda values: {**values, "last_vote": 0.0},
+    5: lambda values: {
+        name: value for name, value in values.items() if name != "login"
+    },
+}
+
+
+def encode_user(user: User, version: int = SCHEMA_VERSION) -> bytes:
+    """
+    Encodes a User without its key, which is stored alongside the record
+    Args:
+        user: User to encode
+        version: int schema version to write, older versions are produced through
+            the registered downgrades
+
+    Returns:
+        bytes
+    """
+    values: Dict = _values(user)
+    for step in range(SCHEMA_VERSION, version, -1):
+        values = DOWNGRADES[step](values)
+    return _pack(values, version)
+
+
+def decode_user(name: str, data: bytes) -> User:
+    """
+    Decodes a record written by any schema version up to SCHEMA_VERSION, upgrading
+    older records through the registered migrations
+    Args:
+        name: str key the record is stored under, the name of records written
+            before version 3
+        data: bytes encoded record
+
+    Returns:
+        User
+    """
+    (version,) = VERSION.unpack_from(data, 0)
+    if version not in LAYOUTS:
+        raise SchemaVersionError(
+            f"Record for {name} uses schema {version}, newest known is {SCHEMA_VERSION}"
+        )
+    values: Dict = _unpack(data, version)
+    for step in range(version, SCHEMA_VERSION):
+        values = UPGRADES[step](values)
+    return _build(name, values)
+
+
+def _values(user: User) -> Dict:
+    stats: PlayerStats = user.player_stats
+    return {
+        "name": user.name,
+        "id": user.id,
+        "login": user.twitch_login,
+        "level": LEVELS.index(user.level),
+        "last_chat": user.last_chat,
+        "last_battle": user.last_battle,
+        "messages_sent": user.messages_sent,
+        "first_sighting": user.first_sighting,
+        "last_reroll": user.last_reroll,
+        "bonks": user.bonks,
+        "hugs": user.hugs,
+        "points": user.points,
+        "race": SPECIES.index(Species(stats.race)),
+        "strength": stats.strength,
+        "dexterity": stats.dexterity,
+        "constitution": stats.constitution,
+        "intelligence": stats.intelligence,
+        "wisdom": stats.wisdom,
+        "charisma": stats.charisma,
+        "max_health": stats.max_health,
+        "current_health": stats.current_health,
+        "max_mana": stats.max_mana,
+        "current_mana": stats.current_mana,
+        "experience": stats.experience,
+        "weapon": stats.weapon,
+        "spell": stats.spell,
+        "armor": stats.armor,
+        "accessories": stats.accessories,
+    }
+
+
+def _build(name: str, values: Dict) -> User:
+    stats: PlayerStats = PlayerStats(
+        race=SPECIES[values["race"]],
+        strength=values["strength"],
+        dexterity=values["dexterity"],
+        constitution=values["constitution"],
+        intelligence=values["intelligence"],
+        wisdom=values["wisdom"],
+        charisma=values["charisma"],
+        max_health=values["max_health"],
+        current_health=values["current_health"],
+        max_mana=values["max_mana"],
+        current_mana=values["current_mana"],
+        experience=values["experience"],
+        weapon=values["weapon"],
+        spell=values["spell"],
+        armor=values["armor"],
+        accessories=values["accessories"],
+    )
+    return User(
+        name=values["name"] or name,
+        level=LEVELS[values["level"]],
+        id=values["id"],
+        twitch_login=values["login"],
+        last_chat=values["last_chat"],
+        last_battle=values["last_battle"],
+        messages_sent=values["messages_sent"],
+        first_sighting=values["first_sighting"],
+        last_reroll=values["last_reroll"],
+        player_stats=stats,
+        bonks=values["bonks"],
+        hugs=values["hugs"],
+        points=values["points"],
+    )
+
+
+def _pack(values: Dict, version: int) -> bytes:
+    layout: _Layout = LAYOUTS[version]
+    parts: List[bytes] = [
+        VERSION.pack(version),
+        layout.struct.pack(*[values[name] for name in layout.names]),
+    ]
+    for name in layout.strings:
+        parts.append(_pack_string(values[name]))
+    for item in (values["weapon"], values["spell"]):
+        parts.append(_pack_string(item.name))
+        parts.append(DICE.pack(item.damage.sides, item.damage.count))
+        parts.append(_pack_string(item.stat))
+        parts.append(_pack_string(item.description))
+    parts.append(ITEM_COUNT.pack(len(values["accessories"]) + 1))
+    for item in [values["armor"], *values["accessories"]]:
+        parts.append(_pack_string(item.name))
+        parts.append(STAT_ITEM.pack(*item.stats, item.armor))
+    return b"".join(parts)
+
+
+def _unpack(data: bytes, version: int) -> Dict:
+    layout: _Layout = LAYOUTS[version]
+    offset: int = VERSION.size
+    values: Dict = dict(zip(layout.names, layout.struct.unpack_from(data, offset)))
+    offset += layout.struct.size
+    for name in layout.strings:
+        values[name], offset = _unpack_string(data, offset)
+
+    for key, item_type in (("weapon", Weapon), ("spell", Spell)):
+        values[key], offset = _unpack_attack_item(data, offset, item_type)
+
+    stat_items: List[StatItem] = _unpack_stat_items(data, offset)
+    values["armor"] = stat_items[0]
+    values["accessories"] = stat_items[1:]
+    return values
+
+
+def _unpack_attack_item(
+    data: bytes, offset: int, item_type: type
+) -> Tuple[AttackItem, int]:
+    name, offset = _unpack_string(data, offset)
+    sides, count = DICE.unpack_from(data, offset)
+    offset += DICE.size
+    stat, offset = _unpack_string(data, offset)
+    description, offset = _unpack_string(data, offset)
+    return _attack_item(item_type, name, sides, count, stat, description), offset
+
+
+def _unpack_stat_items(data: bytes, offset: int) -> List[StatItem]:
+    (count,) = ITEM_COUNT.unpack_from(data, offset)
+    offset += ITEM_COUNT.size
+    stat_items: List[StatItem] = []
+    for index in range(count):
+        name, offset = _unpack_string(data, offset)
+        *stats, armor = STAT_ITEM.unpack_from(data, offset)
+        offset += STAT_ITEM.size
+        item_type = Armor if index == 0 else Accessory
+        stat_items.append(_stat_item(item_type, name, tuple(stats), armor))
+    return stat_items
+
+
+@lru_cache(maxsize=1024)
+def _attack_item(
+    item_type: type, name: str, sides: int, count: int, stat: str, description: str
+) -> AttackItem:
+    """
+    Builds an AttackItem, sharing one instance between every user holding the same
+    item. Items are never mutated in place, so sharing them is safe.
+    """
+    return item_type(name, Dice(sides, count), stat, description)
+
+
+@lru_cache(maxsize=1024)
+def _stat_item(
+    item_type: type, name: str, stats: Tuple[int, ...], armor: int
+) -> StatItem:
+    """
+    Builds a StatItem, sharing one instance between every user holding the same item
+    """
+    return item_type(name, stats, armor)
+
+
+def _pack_string(value: str) -> bytes:
+    encoded: bytes = value.encode("utf-8")
+    return STRING_LENGTH.pack(len(encoded)) + encoded
+
+
+def _unpack_string(data: bytes, offset: int) -> Tuple[str, int]:
+    (length,) = STRING_LENGTH.unpack_from(data, offset)
+    offset += STRING_LENGTH.size
+    return bytes(data[offset : offset + length]).decode("utf-8"), offset + length
+
+
+def record_version(data: bytes) -> Optional[int]:
+    """
+    Gets the schema version of an encoded record, or None for a legacy JSON record
+    Args:
+        data: bytes encoded record
+
+    Returns:
+        Optional[int]
+    """
+    return None if data[:1] == b"{" else data[0]
@@ -0,0 +1,98 @@
+""" Interchangeable JSON codecs, preferring an accelerated library when installed """
+
+import json
+from abc import ABC, abstractmethod
+from typing import Any, Dict, Union
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depends on the environment
+    orjson = None
+
+
+class Codec(ABC):
+    """
+    Serializes plain values (dicts, lists, strings and numbers) to bytes and back.
+    Decoding malformed input raises ValueError.
+    """
+
+    name: str = ""
+
+    @abstractmethod
+    def dumps(self, value: Any, pretty: bool = False) -> bytes:
+        """
+        Encodes a value
+        Args:
+            value: Any plain value to encode
+            pretty: bool indent the output for humans rather than keeping it compact
+
+        Returns:
+            bytes
+        """
+
+    @abstractmethod
+    def loads(self, data: Union[str, bytes]) -> Any:
+        """
+        Decodes a value
+        Args:
+            data: Union[str, bytes] encoded value
+
+        Returns:
+            Any
+        """
+
+
+class JsonCodec(Codec):
+    """
+    Codec using the standard library, writing compact output unless asked otherwise
+    """
+
+    name: str = "json"
+
+    def dumps(self, value: Any, pretty: bool = False) -> bytes:
+        if pretty:
+            return json.dumps(value, indent=4).encode("utf-8")
+        return json.dumps(value, separators=(",", ":")).encode("utf-8")
+
+    def loads(self, data: Union[str, bytes]) -> Any:
+        return json.loads(data)
+
+
+class OrjsonCodec(Codec):
+    """
+    Codec using orjson, which encodes and decodes several times faster than the
+    standard library. Its pretty output is indented by two spaces.
+    """
+
+    name: str = "orjson"
+
+    def dumps(self, value: Any, pretty: bool = False) -> bytes:
+        return orjson.dumps(value, option=orjson.OPT_INDENT_2 if pretty else 0)
+
+    def loads(self, data: Union[str, bytes]) -> Any:
+        return orjson.loads(data)
+
+
+CODECS: Dict[str, Codec] = {JsonCodec.name: JsonCodec()}
+if orjson is not None:
+    CODECS[OrjsonCodec.name] = OrjsonCodec()
+
+# Fastest codec available in this environment
+CODEC: Codec = CODECS.get(OrjsonCodec.name, CODECS[JsonCodec.name])
+
+
+def get_codec(name: str) -> Codec:
+    """
+    Gets an installed codec by name
+    Args:
+        name: str codec name, e.g. 'json' or 'orjson'
+
+    Returns:
+        Codec
+    """
+    try:
+        return CODECS[name]
+    except KeyError as e:
+        raise ValueError(
+            f"Codec '{name}' is not installed, expected one of {', '.join(CODECS)}"
+        ) from e
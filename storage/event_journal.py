@@ -0,0 +1,141 @@
+""" Append-only journal of the bot's running events backed by a checkpoint """
+
+from typing import Dict, Optional
+
+from storage.atomic import atomic_write
+from storage.journal import Journal
+
+
+class EventJournal(Journal):
+    """
+    Persists the bot's running events, such as polls and broadcasts, so they carry
+    on after a restart. Every change is appended as one entry: an event added or
+    updated with its full state, an event removed, or a vote cast or taken back in
+    a poll. Once the journal grows past a size threshold it is folded into a
+    checkpoint of every running event by a background compaction, so boot only
+    replays the entries written since, however many votes came before them.
+
+    Layout on disk:
+        <checkpoint>            {"name": {...}, ...} state of every running event
+        <journal>.compacting    journal rotated out for an in-flight compaction
+        <journal>               one {"op": ..., "name": ...} entry per line
+
+    Votes are handed to the OS without waiting for a sync to disk, so they survive
+    the bot process dying but chat never waits on the disk. Events being added,
+    updated or removed are synced.
+    """
+
+    def load(self) -> Dict[str, Dict]:
+        """
+        Recovers the running events by replaying the journal over the checkpoint,
+        finishing a compaction that was interrupted by a crash first
+        Returns:
+            Dict[str, Dict] of event name to serialized event
+        """
+        self.resume_compaction()
+        events: Dict[str, Dict] = self._read_snapshot(self._snapshot_path)
+        for entry in self._lines(self._journal_path):
+            _apply(events, entry)
+        return events
+
+    def put(self, name: str, values: Dict) -> None:
+        """
+        Records an event being added, or its new state after it ran
+        Args:
+            name: str name of the event
+            values: Dict serialized event
+
+        Returns:
+            None
+        """
+        self._append({"op": "put", "name": name, "event": values}, sync=True)
+
+    def remove(self, name: str) -> None:
+        """
+        Records an event being over
+        Args:
+            name: str name of the event
+
+        Returns:
+            None
+        """
+        self._append({"op": "remove", "name": name}, sync=True)
+
+    def vote(self, name: str, voter: str, choice: str) -> None:
+        """
+        Records a vote in a poll, replacing the voter's earlier one
+        Args:
+            name: str name of the poll
+            voter: str Twitch user id of the voter
+            choice: str choice voted for
+
+        Returns:
+            None
+        """
+        self._append({"op": "vote", "name": name, "voter": voter, "choice": choice})
+
+    def retract(self, name: str, voter: str) -> None:
+        """
+        Records a vote in a poll being taken back
+        Args:
+            name: str name of the poll
+            voter: str Twitch user id of the voter
+
+        Returns:
+            None
+        """
+        self._append({"op": "retract", "name": name, "voter": voter})
+
+    def _append(self, entry: Dict, sync: bool = False) -> None:
+        """
+        Appends an entry to the journal, starting a compaction once it is too large
+        Args:
+            entry: Dict to append
+            sync: bool whether to wait for the entry to reach the disk
+
+        Returns:
+            None
+        """
+        self._write(self._codec.dumps(entry) + b"\n", sync)
+        self.maybe_compact()
+
+    def _fold(self, path: str) -> int:
+        """
+        Writes a new checkpoint with the entries of a rotated journal applied
+        Args:
+            path: str rotated journal path
+
+        Returns:
+            int number of events in the new checkpoint
+        """
+        events: Dict[str, Dict] = self._read_snapshot(self._snapshot_path)
+        for entry in self._lines(path):
+            _apply(events, entry)
+        atomic_write(self._snapshot_path, self._codec.dumps(events))
+        return len(events)
+
+
+def _apply(events: Dict[str, Dict], entry: Dict) -> None:
+    """
+    Applies one journal entry to serialized events. Votes only touch the poll's
+    map of voter to choice, so replaying them is constant time each and the
+    tallies are only counted once, when the poll is restored.
+    Args:
+        events: Dict[str, Dict] of event name to serialized event
+        entry: Dict journal entry
+
+    Returns:
+        None
+    """
+    operation: Optional[str] = entry.get("op")
+    name: Optional[str] = entry.get("name")
+    if operation == "put":
+        events[name] = entry["event"]
+    elif operation == "remove":
+        events.pop(name, None)
+    elif name in events:
+        votes: Dict[str, str] = events[name].setdefault("votes", {})
+        if operation == "vote":
+            votes[entry["voter"]] = entry["choice"]
+        elif operation == "retract":
+            votes.pop(entry["voter"], None)
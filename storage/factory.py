@@ -0,0 +1,95 @@
+import os
+from typing import Callable, Dict, List
+
+from storage.base import UserStore
+from storage.event_journal import EventJournal
+from storage.indexed_store import IndexedUserStore
+from storage.json_store import JsonUserStore
+from storage.sharded_store import ShardedUserStore
+from storage.sqlite_store import SqliteUserStore
+from util.constants import (
+    DATA_DIRECTORY,
+    EVENTS_PATH,
+    EVENTS_JOURNAL_PATH,
+    EVENTS_COMPACT_BYTES,
+    STATS_PATH,
+    JOURNAL_PATH,
+    JOURNAL_COMPACT_BYTES,
+    SQLITE_PATH,
+    INDEX_PATH,
+    INDEX_JOURNAL_PATH,
+    SHARD_PATH_FORMAT,
+    SHARD_COUNT,
+    HOT_SET_SIZE,
+)
+
+
+def _in(directory: str, path: str) -> str:
+    # Places one of the default data files in another data directory
+    return os.path.join(directory, os.path.relpath(path, DATA_DIRECTORY))
+
+
+def _legacy_paths(directory: str) -> List[str]:
+    # The JSON store other backends import the first time they are created
+    return [_in(directory, STATS_PATH), _in(directory, JOURNAL_PATH)]
+
+
+STORE_BACKENDS: Dict[str, Callable[[str], UserStore]] = {
+    "json": lambda directory: JsonUserStore(
+        _in(directory, STATS_PATH),
+        _in(directory, JOURNAL_PATH),
+        JOURNAL_COMPACT_BYTES,
+    ),
+    "sqlite": lambda directory: SqliteUserStore(
+        _in(directory, SQLITE_PATH),
+        HOT_SET_SIZE,
+        legacy_paths=_legacy_paths(directory),
+    ),
+    "sharded": lambda directory: ShardedUserStore(
+        _in(directory, SHARD_PATH_FORMAT),
+        SHARD_COUNT,
+        JOURNAL_COMPACT_BYTES,
+        _legacy_paths(directory),
+    ),
+    "indexed": lambda directory: IndexedUserStore(
+        _in(directory, INDEX_PATH),
+        _in(directory, INDEX_JOURNAL_PATH),
+        JOURNAL_COMPACT_BYTES,
+        _legacy_paths(directory),
+    ),
+}
+
+
+def create_store(backend: str, directory: str = DATA_DIRECTORY) -> UserStore:
+    """
+    Creates an unloaded UserStore for the named backend
+    Args:
+        backend: str key of STORE_BACKENDS
+        directory: str holding the store's files
+
+    Returns:
+        UserStore
+    """
+    try:
+        return STORE_BACKENDS[backend](directory)
+    except KeyError as e:
+        raise ValueError(
+            f"Unknown storage backend '{backend}', expected one of "
+            f"{', '.join(STORE_BACKENDS)}"
+        ) from e
+
+
+def create_event_journal(directory: str = DATA_DIRECTORY) -> EventJournal:
+    """
+    Creates the journal of a bot's running events
+    Args:
+        directory: str holding the journal's files
+
+    Returns:
+        EventJournal
+    """
+    return EventJournal(
+        _in(directory, EVENTS_PATH),
+        _in(directory, EVENTS_JOURNAL_PATH),
+        EVENTS_COMPACT_BYTES,
+    )
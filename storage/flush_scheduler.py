@@ -0,0 +1,274 @@
+""" Flushes a UserStore when enough users change or the oldest change gets too old """
+
+import functools
+import logging
+import time
+from dataclasses import dataclass
+from threading import Event, Lock, Thread
+from typing import Dict, List, Optional, Sequence
+
+from storage.base import UserStore
+from util.metrics import COUNTER, Histogram, Registry
+from util.slots import slotted
+
+
+@slotted
+@dataclass
+class FlushCounters:
+    """
+    Running totals describing the flushes performed by a FlushScheduler
+    """
+
+    flushes: int = 0
+    users_written: int = 0
+    bytes_written: int = 0
+    total_latency_s: float = 0.0
+    last_latency_s: float = 0.0
+    max_latency_s: float = 0.0
+
+
+class FlushScheduler:
+    """
+    Background thread persisting the dirty users of one or more UserStores. A flush
+    happens as soon as max_dirty users have changed across the stores, or once the
+    oldest unflushed change is max_delay seconds old, whichever comes first. While
+    every store is clean the thread sleeps without a timeout and does no work at
+    all. Stores can be added and removed while it runs, so one thread serves every
+    channel of a multi-channel bot.
+
+    Setting the end event stops the thread, and stop() then performs a final
+    synchronous flush so nothing marked dirty before shutdown is lost.
+    """
+
+    def __init__(
+        self,
+        stores: Sequence[UserStore],
+        end_event: Event,
+        max_dirty: int,
+        max_delay: float,
+        latency: Optional[Histogram] = None,
+    ) -> None:
+        """
+        Args:
+            stores: Sequence[UserStore] to flush
+            end_event: Event set when the bot is shutting down
+            max_dirty: int number of dirty users that triggers an immediate flush
+            max_delay: float seconds a change may wait before it is flushed
+            latency: Optional[Histogram] recording the duration of every flush
+        """
+        self._stores: List[UserStore] = list(stores)
+        self._stores_mutex: Lock = Lock()
+        self._started: bool = False
+        self._end_event: Event = end_event
+        self._max_dirty: int = max_dirty
+        self._max_delay: float = max_delay
+        self._latency: Optional[Histogram] = latency
+        self._wake: Event = Event()
+        self._first_dirty: Optional[float] = None
+        # Dirty users of every store as last reported, and their sum
+        self._dirty_counts: Dict[UserStore, int] = {}
+        self._dirty_total: int = 0
+        self._dirty_mutex: Lock = Lock()
+        self._counters: FlushCounters = FlushCounters()
+        self._counters_mutex: Lock = Lock()
+        self._thread: Thread = Thread(target=self._run, name="flush-scheduler")
+
+    @property
+    def counters(self) -> FlushCounters:
+        """
+        Gets a copy of the flush counters
+        Returns:
+            FlushCounters
+        """
+        with self._counters_mutex:
+            return FlushCounters(
+                self._counters.flushes,
+                self._counters.users_written,
+                self._counters.bytes_written,
+                self._counters.total_latency_s,
+                self._counters.last_latency_s,
+                self._counters.max_latency_s,
+            )
+
+    def register_metrics(self, registry: Registry) -> None:
+        """
+        Exports the flush totals through a metrics registry
+        Args:
+            registry: Registry to export to
+
+        Returns:
+            None
+        """
+        registry.callback(
+            "twitchy_flushed_users_total",
+            "User records written by stats flushes",
+            COUNTER,
+            lambda: self.counters.users_written,
+        )
+        registry.callback(
+            "twitchy_flushed_bytes_total",
+            "Bytes written by stats flushes",
+            COUNTER,
+            lambda: self.counters.bytes_written,
+        )
+
+    def add_store(self, store: UserStore) -> None:
+        """
+        Starts flushing another store
+        Args:
+            store: UserStore to flush
+
+        Returns:
+            None
+        """
+        with self._stores_mutex:
+            self._stores.append(store)
+            if self._started:
+                self._watch(store)
+
+    def remove_store(self, store: UserStore) -> None:
+        """
+        Stops flushing a store, leaving any unsaved changes for its owner to flush
+        Args:
+            store: UserStore to forget
+
+        Returns:
+            None
+        """
+        with self._stores_mutex:
+            if store in self._stores:
+                self._stores.remove(store)
+                store.set_dirty_listener(None)
+                self._count(store, None)
+
+    def start(self) -> None:
+        """
+        Registers with the stores and starts the flush thread
+        Returns:
+            None
+        """
+        with self._stores_mutex:
+            self._started = True
+            for store in self._stores:
+                self._watch(store)
+        self._thread.start()
+
+    def _watch(self, store: UserStore) -> None:
+        if self._count(store, store.dirty_count) and self._first_dirty is None:
+            self._first_dirty = time.monotonic()
+            self._wake.set()
+        store.set_dirty_listener(functools.partial(self._on_dirty, store))
+
+    def stop(self) -> None:
+        """
+        Sets the end event, waits for the flush thread to exit and flushes whatever
+        is still dirty
+        Returns:
+            None
+        """
+        self._end_event.set()
+        self._wake.set()
+        if self._thread.is_alive():
+            self._thread.join()
+        for store in self._snapshot_stores():
+            store.set_dirty_listener(None)
+        self.flush()
+
+    def flush(self) -> int:
+        """
+        Flushes every store now and records the result in the counters
+        Returns:
+            int number of users written
+        """
+        self._first_dirty = None
+        stores: List[UserStore] = self._snapshot_stores()
+        bytes_before: int = sum(store.bytes_written for store in stores)
+        started: float = time.perf_counter()
+        written: int = 0
+        try:
+            for store in stores:
+                written += store.flush()
+        finally:
+            for store in stores:
+                self._count(store, store.dirty_count)
+            if self._dirty_total and self._first_dirty is None:
+                # Users changed while the flush ran, or a failed store kept its users
+                # dirty, so their clock starts now
+                self._first_dirty = time.monotonic()
+        latency: float = time.perf_counter() - started
+        if written:
+            if self._latency:
+                self._latency.observe(latency)
+            with self._counters_mutex:
+                self._counters.flushes += 1
+                self._counters.users_written += written
+                self._counters.bytes_written += (
+                    sum(store.bytes_written for store in stores) - bytes_before
+                )
+                self._counters.total_latency_s += latency
+                self._counters.last_latency_s = latency
+                self._counters.max_latency_s = max(
+                    self._counters.max_latency_s, latency
+                )
+            logging.debug("Flushed %s users in %.3fs", written, latency)
+        return written
+
+    def _snapshot_stores(self) -> List[UserStore]:
+        with self._stores_mutex:
+            return list(self._stores)
+
+    def _count(self, store: UserStore, dirty_count: Optional[int]) -> int:
+        """
+        Records how many users are dirty in a store
+        Args:
+            store: UserStore reporting
+            dirty_count: Optional[int] users dirty in the store, or None to forget it
+
+        Returns:
+            int users dirty across every store
+        """
+        with self._dirty_mutex:
+            self._dirty_total -= self._dirty_counts.pop(store, 0)
+            if dirty_count is not None:
+                self._dirty_counts[store] = dirty_count
+                self._dirty_total += dirty_count
+            return self._dirty_total
+
+    def _on_dirty(self, store: UserStore, dirty_count: int) -> None:
+        """
+        Store callback, run under the store mutex whenever a user is marked dirty
+        Args:
+            store: UserStore the user belongs to
+            dirty_count: int users dirty in the store
+
+        Returns:
+            None
+        """
+        total: int = self._count(store, dirty_count)
+        if self._first_dirty is None:
+            self._first_dirty = time.monotonic()
+            self._wake.set()
+        elif total >= self._max_dirty:
+            self._wake.set()
+
+    def _timeout(self) -> Optional[float]:
+        """
+        Gets how long the thread may sleep before the oldest change is due
+        Returns:
+            Optional[float] seconds, or None to sleep until woken
+        """
+        if self._first_dirty is None:
+            return None
+        return max(0.0, self._first_dirty + self._max_delay - time.monotonic())
+
+    def _run(self) -> None:
+        while not self._end_event.is_set():
+            self._wake.wait(self._timeout())
+            self._wake.clear()
+            if self._end_event.is_set():
+                return
+            if self._dirty_total >= self._max_dirty or self._timeout() == 0:
+                try:
+                    self.flush()
+                except Exception as e:
+                    logging.error("Error flushing stats: %s", e)
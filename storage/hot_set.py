@@ -0,0 +1,61 @@
+from collections import OrderedDict
+from typing import Generic, Optional, Tuple, TypeVar
+
+T = TypeVar("T")
+
+
+class HotSet(Generic[T]):
+    """
+    Bounded least-recently-used cache of recently accessed values
+    """
+
+    def __init__(self, capacity: int) -> None:
+        self._capacity: int = max(1, capacity)
+        self._entries: "OrderedDict[str, T]" = OrderedDict()
+
+    def get(self, key: str) -> Optional[T]:
+        """
+        Gets a cached value, marking it as most recently used
+        Args:
+            key: str key of the value
+
+        Returns:
+            Optional[T]
+        """
+        value: Optional[T] = self._entries.get(key)
+        if value is not None:
+            self._entries.move_to_end(key)
+        return value
+
+    def put(self, key: str, value: T) -> Optional[Tuple[str, T]]:
+        """
+        Caches a value, evicting the least recently used entry if full
+        Args:
+            key: str key of the value
+            value: T value to cache
+
+        Returns:
+            Optional[Tuple[str, T]] evicted entry, if any
+        """
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        if len(self._entries) > self._capacity:
+            return self._entries.popitem(last=False)
+        return None
+
+    def pop(self, key: str) -> Optional[T]:
+        """
+        Removes a cached value
+        Args:
+            key: str key of the value
+
+        Returns:
+            Optional[T] removed value, if it was cached
+        """
+        return self._entries.pop(key, None)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -0,0 +1,381 @@
+""" Memory-mapped stats file with an on-disk hash index keyed by user key """
+
+import argparse
+import hashlib
+import logging
+import mmap
+import os
+import struct
+import zlib
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from data_types import User
+from storage.atomic import atomic_write
+from storage.binary import decode_user, encode_user, record_version
+from storage.codec import CODEC
+from storage.journal import StatsJournal, live_records
+
+MAGIC: bytes = b"TWSX"
+# Version 1 stored users under their display name. Version 2 stores them under
+# their key, with an alias record mapping each identified login to its id.
+FORMAT_VERSION: int = 2
+ALIAS_PREFIX: str = "@"
+
+# magic, format version, record count, bucket count, index offset
+HEADER: struct.Struct = struct.Struct("<4sHxxIIQ")
+# name hash, record offset (0 marks an empty bucket)
+BUCKET: struct.Struct = struct.Struct("<QQ")
+NAME_LENGTH: struct.Struct = struct.Struct("<H")
+DATA_LENGTH: struct.Struct = struct.Struct("<I")
+# crc32 of name and data, name length, data length
+FRAME: struct.Struct = struct.Struct("<IHI")
+
+
+def _hash_name(name: bytes) -> int:
+    return int.from_bytes(hashlib.blake2b(name, digest_size=8).digest(), "little")
+
+
+def alias_key(login: str) -> str:
+    """
+    Gets the name of the alias record mapping a login to the key of its user. Logins
+    never start with the prefix, so aliases cannot collide with user records.
+    Args:
+        login: str normalized login
+
+    Returns:
+        str
+    """
+    return ALIAS_PREFIX + login
+
+
+def is_alias(name: str) -> bool:
+    """
+    Checks whether a record name belongs to an alias rather than a user
+    Args:
+        name: str record name
+
+    Returns:
+        bool
+    """
+    return name.startswith(ALIAS_PREFIX)
+
+
+def write_indexed(path: str, records: Iterable[Tuple[str, bytes]]) -> int:
+    """
+    Atomically writes an indexed stats file. Records are laid out back to back after
+    the header and followed by an open-addressed hash table mapping each record
+    name to its offset, sized to stay at most half full. The header counts users
+    only, not aliases.
+    Args:
+        path: str file to write
+        records: Iterable[Tuple[str, bytes]] of record name to encoded record
+
+    Returns:
+        int number of users written
+    """
+    body: bytearray = bytearray()
+    entries: List[Tuple[int, int]] = []
+    aliases: int = 0
+    for name, data in records:
+        aliases += is_alias(name)
+        encoded_name: bytes = name.encode("utf-8")
+        entries.append((_hash_name(encoded_name), HEADER.size + len(body)))
+        body += NAME_LENGTH.pack(len(encoded_name))
+        body += encoded_name
+        body += DATA_LENGTH.pack(len(data))
+        body += data
+
+    bucket_count: int = 1
+    while bucket_count < 2 * len(entries):
+        bucket_count <<= 1
+    buckets: List[Tuple[int, int]] = [(0, 0)] * bucket_count
+    for name_hash, offset in entries:
+        slot: int = name_hash & (bucket_count - 1)
+        while buckets[slot][1]:
+            slot = (slot + 1) & (bucket_count - 1)
+        buckets[slot] = (name_hash, offset)
+
+    index_offset: int = HEADER.size + len(body)
+    atomic_write(
+        path,
+        HEADER.pack(
+            MAGIC, FORMAT_VERSION, len(entries) - aliases, bucket_count, index_offset
+        )
+        + bytes(body)
+        + b"".join(BUCKET.pack(*bucket) for bucket in buckets),
+    )
+    return len(entries) - aliases
+
+
+class IndexedStatsReader:
+    """
+    Read-only view over an indexed stats file. Opening only maps the file and
+    parses the fixed-size header, so it costs the same no matter how many users are
+    stored; records are located through the hash index on demand. Any number of
+    processes can map the same file, and a reader keeps seeing a consistent file
+    after a writer atomically replaces it.
+    """
+
+    def __init__(self, path: str) -> None:
+        self._path: str = path
+        # The map holds its own handle on the file, so it can be closed right away
+        with open(path, "rb") as file:
+            self._map: mmap.mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            self._inode: int = os.fstat(file.fileno()).st_ino
+        magic, self._version, self._count, self._buckets, self._index_offset = (
+            HEADER.unpack_from(self._map, 0)
+        )
+        if magic != MAGIC or not 1 <= self._version <= FORMAT_VERSION:
+            self.close()
+            raise ValueError(f"{path} is not a version {FORMAT_VERSION} stats index")
+
+    @property
+    def version(self) -> int:
+        """
+        Gets the format version the file was written with, older versions are only
+        read to migrate them
+        Returns:
+            int
+        """
+        return self._version
+
+    @property
+    def inode(self) -> int:
+        """
+        Gets the inode of the mapped file, used to notice when it has been replaced
+        Returns:
+            int
+        """
+        return self._inode
+
+    def get(self, name: str) -> Optional[bytes]:
+        """
+        Looks up an encoded record
+        Args:
+            name: str record name, the key of a user or an alias
+
+        Returns:
+            Optional[bytes]
+        """
+        if not self._buckets:
+            return None
+        encoded_name: bytes = name.encode("utf-8")
+        name_hash: int = _hash_name(encoded_name)
+        slot: int = name_hash & (self._buckets - 1)
+        while True:
+            bucket_hash, offset = BUCKET.unpack_from(
+                self._map, self._index_offset + slot * BUCKET.size
+            )
+            if not offset:
+                return None
+            if bucket_hash == name_hash:
+                stored_name, data = self._read_record(offset)
+                if stored_name == encoded_name:
+                    return data
+            slot = (slot + 1) & (self._buckets - 1)
+
+    def items(self) -> Iterator[Tuple[str, bytes]]:
+        """
+        Iterates over every record in file order
+        Returns:
+            Iterator[Tuple[str, bytes]]
+        """
+        offset: int = HEADER.size
+        while offset < self._index_offset:
+            name, data = self._read_record(offset)
+            offset += NAME_LENGTH.size + len(name) + DATA_LENGTH.size + len(data)
+            yield name.decode("utf-8"), data
+
+    def close(self) -> None:
+        """
+        Unmaps the file
+        Returns:
+            None
+        """
+        self._map.close()
+
+    def _read_record(self, offset: int) -> Tuple[bytes, bytes]:
+        (name_length,) = NAME_LENGTH.unpack_from(self._map, offset)
+        offset += NAME_LENGTH.size
+        name: bytes = self._map[offset : offset + name_length]
+        offset += name_length
+        (data_length,) = DATA_LENGTH.unpack_from(self._map, offset)
+        offset += DATA_LENGTH.size
+        return name, self._map[offset : offset + data_length]
+
+    def __contains__(self, name: str) -> bool:
+        return self.get(name) is not None
+
+    def __len__(self) -> int:
+        return self._count
+
+
+class IndexedStatsJournal(StatsJournal):
+    """
+    StatsJournal whose snapshot is an indexed stats file and whose journal holds
+    binary records in checksummed frames. Compaction copies the encoded records of
+    untouched users straight across without decoding them. Journals written as
+    JSON lines by older versions are still replayed.
+    """
+
+    def _encode(self, records: Dict[str, bytes]) -> bytes:
+        """
+        Encodes records as checksummed binary frames
+        Args:
+            records: Dict[str, bytes] of record name to encoded record, empty for a
+                deleted one
+
+        Returns:
+            bytes
+        """
+        return b"".join(
+            _frame(name.encode("utf-8"), data) for name, data in records.items()
+        )
+
+    def write_snapshot(self, records: Dict[str, bytes]) -> None:
+        """
+        Writes a full indexed snapshot directly, used to seed a brand-new store
+        Args:
+            records: Dict[str, bytes] of record name to encoded record
+
+        Returns:
+            None
+        """
+        write_indexed(self._snapshot_path, records.items())
+
+    def _fold(self, path: str) -> int:
+        """
+        Writes a new indexed snapshot with the journaled records applied over the
+        current one, copying untouched records across still encoded
+        Args:
+            path: str rotated journal path
+
+        Returns:
+            int number of users in the new snapshot
+        """
+        merged: Dict[str, bytes] = {}
+        if os.path.exists(self._snapshot_path):
+            reader: IndexedStatsReader = IndexedStatsReader(self._snapshot_path)
+            try:
+                merged.update(reader.items())
+            finally:
+                reader.close()
+        merged.update(self._replay(path))
+        return write_indexed(self._snapshot_path, live_records(merged).items())
+
+    def _replay(self, path: str) -> Iterator[Tuple[str, bytes]]:
+        """
+        Yields journal records in write order, stopping at a torn or corrupt frame
+        left by a crash mid-append.
+        Args:
+            path: str journal path
+
+        Returns:
+            Iterator[Tuple[str, bytes]]
+        """
+        try:
+            with open(path, "rb") as file:
+                data: bytes = file.read()
+        except FileNotFoundError:
+            return
+        if data[:1] == b"{":
+            for name, values in super()._replay(path):
+                yield name, self._codec.dumps(values)
+            return
+
+        offset: int = 0
+        while offset < len(data):
+            if offset + FRAME.size > len(data):
+                logging.error("Skipping torn journal frame at %s:%s", path, offset)
+                return
+            checksum, name_length, data_length = FRAME.unpack_from(data, offset)
+            start: int = offset + FRAME.size
+            end: int = start + name_length + data_length
+            if end > len(data) or zlib.crc32(data[start:end]) != checksum:
+                logging.error("Skipping corrupt journal frame at %s:%s", path, offset)
+                return
+            yield (
+                data[start : start + name_length].decode("utf-8"),
+                data[start + name_length : end],
+            )
+            offset = end
+
+
+def encode_record(user: User) -> bytes:
+    """
+    Encodes a User for storage in an indexed stats file
+    Args:
+        user: User to encode
+
+    Returns:
+        bytes
+    """
+    return encode_user(user)
+
+
+def decode_record(key: str, data: bytes) -> User:
+    """
+    Decodes a record read from an indexed stats file, accepting both binary records
+    and the JSON records written before the binary schema existed
+    Args:
+        key: str name the record is stored under
+        data: bytes encoded record
+
+    Returns:
+        User
+    """
+    if record_version(data) is None:
+        return User.from_dict(key, CODEC.loads(data))
+    return decode_user(key, data)
+
+
+def _frame(name: bytes, data: bytes) -> bytes:
+    return FRAME.pack(zlib.crc32(name + data), len(name), len(data)) + name + data
+
+
+def main() -> None:
+    """
+    Read-only inspection of an indexed stats file, safe to run alongside the bot
+    Returns:
+        None
+    """
+    parser = argparse.ArgumentParser(description="Inspect an indexed stats file.")
+    parser.add_argument("path", type=str, help="Indexed stats file")
+    parser.add_argument("users", type=str, nargs="*", help="Users to print")
+    parser.add_argument(
+        "--export", type=str, help="Write every user to this file as readable JSON"
+    )
+    args: argparse.Namespace = parser.parse_args()
+
+    reader: IndexedStatsReader = IndexedStatsReader(args.path)
+    try:
+        print(f"{args.path}: {len(reader)} users")
+        for name in args.users:
+            data: Optional[bytes] = reader.get(name)
+            alias: Optional[bytes] = reader.get(alias_key(name.lower()))
+            if data is None and alias is not None:
+                name = alias.decode("utf-8")
+                data = reader.get(name)
+            print(
+                name,
+                (
+                    decode_record(name, data).to_dict()
+                    if data is not None
+                    else "not found"
+                ),
+            )
+        if args.export:
+            exported: Dict[str, Dict] = {}
+            for name, data in reader.items():
+                if is_alias(name):
+                    continue
+                exported.update(decode_record(name, data).to_dict())
+            with open(args.export, "wb") as file:
+                file.write(CODEC.dumps(exported, pretty=True))
+            print(f"Exported {len(exported)} users to {args.export}")
+    finally:
+        reader.close()
+
+
+if __name__ == "__main__":
+    main()
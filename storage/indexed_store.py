@@ -0,0 +1,326 @@
+import logging
+import os
+from typing import Dict, Iterable, Iterator, List, Optional, Set
+
+from data_types import User
+from storage.base import UserStore, merge_duplicates
+from storage.indexed import (
+    FORMAT_VERSION,
+    IndexedStatsJournal,
+    IndexedStatsReader,
+    alias_key,
+    decode_record,
+    encode_record,
+    is_alias,
+)
+from storage.json_store import read_legacy_users
+
+
+class IndexedUserStore(UserStore):
+    """
+    UserStore over a memory-mapped indexed stats file. Loading maps the snapshot and
+    replays only the journal of recent changes, then Users are hydrated the first
+    time they are looked up, so boot time does not grow with the number of users
+    ever seen. Dirty users are journaled in the compact binary record format and
+    compaction rewrites the indexed snapshot, which is remapped once it lands.
+
+    Logins are resolved through alias records journaled alongside each identified
+    user, so the login index never has to be built from the whole file.
+    """
+
+    def __init__(
+        self,
+        snapshot_path: str,
+        journal_path: str,
+        compact_bytes: int,
+        legacy_paths: Optional[List[str]] = None,
+    ) -> None:
+        """
+        Args:
+            snapshot_path: str indexed stats file
+            journal_path: str journal of changes since the snapshot
+            compact_bytes: int journal size that triggers compaction
+            legacy_paths: Optional[List[str]] snapshot and journal of a JSON store
+                to import the first time the indexed file is created
+        """
+        super().__init__()
+        self._snapshot_path: str = snapshot_path
+        self._legacy_paths: Optional[List[str]] = legacy_paths
+        self._journal: IndexedStatsJournal = IndexedStatsJournal(
+            snapshot_path, journal_path, compact_bytes
+        )
+        self._reader: Optional[IndexedStatsReader] = None
+        self._journaled: Dict[str, bytes] = {}
+        self._users: Dict[str, User] = {}
+
+    def load(self, default_user: Optional[User]) -> None:
+        """
+        Maps the snapshot and replays the journal, creating the file from the JSON
+        store if there is one and otherwise seeding it with the provided User
+        Args:
+            default_user: Optional[User] to create a brand-new store with
+
+        Returns:
+            None
+        """
+        if not self._journal.exists():
+            users: Dict[str, User] = read_legacy_users(self._legacy_paths)
+            if users:
+                self._journal.write_snapshot(_records(users.values()))
+                logging.info(
+                    "Imported %s users into %s", len(users), self._snapshot_path
+                )
+            elif default_user:
+                self._journal.write_snapshot(_records([default_user]))
+
+        self._migrate()
+        self._journal.resume_compaction()
+        journaled: Dict[str, bytes] = self._journal.load_journal()
+        with self._mutex:
+            self._journaled = journaled
+            self._users = {}
+            self._remap()
+
+    def _migrate(self) -> None:
+        """
+        Rewrites a version 1 file, which stored users under their display name, into
+        one keyed by user key, merging the records of users stored under
+        differently cased names
+        Returns:
+            None
+        """
+        try:
+            reader: IndexedStatsReader = IndexedStatsReader(self._snapshot_path)
+        except FileNotFoundError:
+            return
+        try:
+            if reader.version == FORMAT_VERSION:
+                return
+            records: Dict[str, bytes] = dict(reader.items())
+        finally:
+            reader.close()
+        records.update(self._journal.load_journal())
+        users: Dict[str, User] = merge_duplicates(
+            decode_record(name, data) for name, data in records.items() if data
+        )
+        self._journal.reset(_records(users.values()))
+        logging.info("Migrated %s users in %s", len(users), self._snapshot_path)
+
+    def _fetch(self, key: str) -> Optional[User]:
+        """
+        Gets a User by key, decoding its record on first access
+        Args:
+            key: str key of the user
+
+        Returns:
+            Optional[User]
+        """
+        user: Optional[User] = self._users.get(key)
+        if user is not None:
+            return user
+        with self._mutex:
+            user = self._users.get(key)
+            if user is None:
+                data: Optional[bytes] = self._read(key)
+                if not data:
+                    return None
+                user = decode_record(key, data)
+                self._users[key] = user
+            return user
+
+    def _store(self, key: str, user: User) -> None:
+        """
+        Holds a User in memory under its key
+        Args:
+            key: str key of the user
+            user: User to be stored
+
+        Returns:
+            None
+        """
+        self._users[key] = user
+
+    def _evict(self, key: str) -> None:
+        """
+        Drops a User. Once it is removed its record in the snapshot and journal
+        is hidden.
+        Args:
+            key: str key of the user
+
+        Returns:
+            None
+        """
+        self._users.pop(key, None)
+
+    def _lookup_login(self, login: str) -> Optional[str]:
+        """
+        Finds the key of a login through its alias record
+        Args:
+            login: str normalized login
+
+        Returns:
+            Optional[str]
+        """
+        with self._mutex:
+            data: Optional[bytes] = self._read(alias_key(login))
+        return data.decode("utf-8") if data else None
+
+    def _read(self, name: str) -> Optional[bytes]:
+        """
+        Reads an encoded record, preferring the journal over the snapshot. An empty
+        record was deleted.
+        Args:
+            name: str record name
+
+        Returns:
+            Optional[bytes]
+        """
+        if name in self._removed:
+            return None
+        data: Optional[bytes] = self._journaled.get(name)
+        if data is None and self._reader:
+            data = self._reader.get(name)
+        return data
+
+    def values(self) -> Iterator[User]:
+        """
+        Iterates over every stored User, decoding each one in turn
+        Returns:
+            Iterator[User]
+        """
+        for key in self._names():
+            user: Optional[User] = self._fetch(key)
+            if user:
+                yield user
+
+    def flush(self) -> int:
+        """
+        Journals every dirty User and an empty record for every removed one, then
+        maps the snapshot again if a compaction replaced it
+        Returns:
+            int number of users written
+        """
+        with self._flush_mutex:
+            snapshots, removed = self._swap_dirty()
+            if snapshots or removed:
+                records: Dict[str, bytes] = dict.fromkeys(removed, b"")
+                records.update(_records(snapshots))
+                self._write_flush(
+                    lambda: self._journal.append(records), snapshots, removed
+                )
+            self._journal.maybe_compact()
+            with self._mutex:
+                self._remap()
+        return len(snapshots)
+
+    def close(self) -> None:
+        """
+        Flushes any pending changes and unmaps the snapshot
+        Returns:
+            None
+        """
+        super().close()
+        with self._mutex:
+            if self._reader:
+                self._reader.close()
+                self._reader = None
+
+    def _resident(self, name: str) -> Optional[User]:
+        """
+        Gets a User only if it has already been decoded
+        Args:
+            name: str key of the user
+
+        Returns:
+            Optional[User]
+        """
+        return self._users.get(name)
+
+    def _remap(self) -> None:
+        """
+        Maps the current snapshot if it has been replaced by a compaction. Every
+        compaction folds in the whole journal that was replayed on load, so those
+        records can be dropped once the new snapshot is mapped.
+        Returns:
+            None
+        """
+        try:
+            inode: int = os.stat(self._snapshot_path).st_ino
+        except FileNotFoundError:
+            return
+        if self._reader and self._reader.inode == inode:
+            return
+        previous: Optional[IndexedStatsReader] = self._reader
+        self._reader = IndexedStatsReader(self._snapshot_path)
+        if previous:
+            previous.close()
+            self._journaled = {}
+        # Flushed removals are only hidden while mapped records still hold them
+        self._removed.difference_update(
+            [
+                name
+                for name in self._removed
+                if name not in self._dirty
+                and name not in self._journaled
+                and name not in self._reader
+            ]
+        )
+
+    def _forget_removed(self, keys: List[str]) -> None:
+        """
+        Keeps hiding removed users once their empty records are journaled, as the
+        mapped snapshot holds their old records until a compaction folds the empty
+        ones in. _remap stops tracking them then.
+        Args:
+            keys: List[str] keys of the removed users that were flushed
+
+        Returns:
+            None
+        """
+
+    def _names(self) -> Set[str]:
+        """
+        Gets the key of every stored User
+        Returns:
+            Set[str]
+        """
+        with self._mutex:
+            names: Set[str] = set(self._users)
+            names.update(self._journaled)
+            if self._reader:
+                names.update(name for name, _ in self._reader.items())
+        return {
+            name
+            for name in names.difference(self._removed)
+            if not is_alias(name) and (name in self._users or self._read(name))
+        }
+
+    def __len__(self) -> int:
+        with self._mutex:
+            count: int = len(self._reader) if self._reader else 0
+            for name in set(self._users).union(self._journaled, self._removed):
+                if is_alias(name):
+                    continue
+                stored: bool = bool(self._reader) and name in self._reader
+                live: bool = name in self._users or bool(self._read(name))
+                count += live - stored
+        return count
+
+
+def _records(users: Iterable[User]) -> Dict[str, bytes]:
+    """
+    Encodes Users into their records plus an alias for the login of each identified
+    one
+    Args:
+        users: Iterable[User] to encode
+
+    Returns:
+        Dict[str, bytes] of record name to encoded record
+    """
+    records: Dict[str, bytes] = {}
+    for user in users:
+        key: str = user.key
+        records[key] = encode_record(user)
+        if user.id:
+            records[alias_key(user.login)] = key.encode("utf-8")
+    return records
@@ -0,0 +1,315 @@
+""" Append-only journals backed by a compacted snapshot """
+
+import logging
+import os
+from abc import ABC, abstractmethod
+from threading import Lock, Thread
+from typing import Dict, Iterator, Optional, Tuple
+
+from storage.atomic import atomic_write
+from storage.codec import CODEC, Codec
+
+
+class Journal(ABC):
+    """
+    Abstract base class for state persisted as a snapshot file plus an append-only
+    journal of the entries written since the snapshot. Once the journal grows past a
+    size threshold it is folded back into the snapshot by a background compaction.
+    Subclasses decide what the entries hold and how they are folded.
+
+    Layout on disk:
+        <snapshot>            state as of the last compaction
+        <journal>.compacting  journal rotated out for an in-flight compaction
+        <journal>             entries appended since, newest last
+    """
+
+    def __init__(
+        self,
+        snapshot_path: str,
+        journal_path: str,
+        compact_bytes: int,
+        codec: Codec = CODEC,
+    ) -> None:
+        self._snapshot_path: str = snapshot_path
+        self._journal_path: str = journal_path
+        self._rotated_path: str = f"{journal_path}.compacting"
+        self._compact_bytes: int = compact_bytes
+        self._codec: Codec = codec
+        self._journal_mutex: Lock = Lock()
+        self._compactor: Optional[Thread] = None
+
+    @property
+    def journal_size(self) -> int:
+        """
+        Gets the size of the live journal in bytes
+        Returns:
+            int
+        """
+        try:
+            return os.path.getsize(self._journal_path)
+        except FileNotFoundError:
+            return 0
+
+    def exists(self) -> bool:
+        """
+        Checks whether any persisted state is present
+        Returns:
+            bool
+        """
+        return any(
+            os.path.exists(path)
+            for path in (self._snapshot_path, self._rotated_path, self._journal_path)
+        )
+
+    def maybe_compact(self) -> bool:
+        """
+        Starts a background compaction if the journal has outgrown its threshold and
+        no compaction is already running.
+        Returns:
+            bool True if a compaction was started
+        """
+        with self._journal_mutex:
+            if self._compactor and self._compactor.is_alive():
+                return False
+            if self.journal_size < self._compact_bytes:
+                return False
+            self._compactor = Thread(target=self._compact_in_background, daemon=True)
+            self._compactor.start()
+        return True
+
+    def resume_compaction(self) -> None:
+        """
+        Finishes a compaction that was interrupted by a crash, if there was one
+        Returns:
+            None
+        """
+        if os.path.exists(self._rotated_path):
+            self.compact()
+
+    def compact(self) -> None:
+        """
+        Folds the journal into a fresh snapshot. The live journal is rotated out under
+        the journal mutex so concurrent appends land in a new file, then the snapshot
+        and rotated journal are merged from disk without touching in-memory state.
+        Returns:
+            None
+        """
+        with self._journal_mutex:
+            if not os.path.exists(self._rotated_path):
+                if not os.path.exists(self._journal_path):
+                    return
+                os.replace(self._journal_path, self._rotated_path)
+
+        count: int = self._fold(self._rotated_path)
+        os.remove(self._rotated_path)
+        logging.info("Compacted %s records into %s", count, self._snapshot_path)
+
+    def close(self) -> None:
+        """
+        Waits for a running compaction to finish
+        Returns:
+            None
+        """
+        if self._compactor:
+            self._compactor.join()
+
+    def _compact_in_background(self) -> None:
+        try:
+            self.compact()
+        except OSError as e:
+            logging.error("Failed to compact %s: %s", self._journal_path, e)
+
+    def _write(self, payload: bytes, sync: bool = True) -> None:
+        """
+        Appends encoded entries to the live journal
+        Args:
+            payload: bytes entries to append
+            sync: bool whether to wait for them to reach the disk
+
+        Returns:
+            None
+        """
+        with self._journal_mutex:
+            with open(self._journal_path, "ab") as file:
+                file.write(payload)
+                file.flush()
+                if sync:
+                    os.fsync(file.fileno())
+
+    @abstractmethod
+    def _fold(self, path: str) -> int:
+        """
+        Writes a new snapshot with a rotated journal applied over the current one
+        Args:
+            path: str rotated journal path
+
+        Returns:
+            int number of records in the new snapshot
+        """
+
+    def _read_snapshot(self, path: str) -> Dict:
+        try:
+            with open(path, "rb") as file:
+                return self._codec.loads(file.read())
+        except FileNotFoundError:
+            return {}
+
+    def _lines(self, path: str) -> Iterator[Dict]:
+        """
+        Yields the entries of a journal of JSON lines in write order. A torn final
+        line left by a crash mid-append is skipped.
+        Args:
+            path: str journal path
+
+        Returns:
+            Iterator[Dict]
+        """
+        try:
+            with open(path, "rb") as file:
+                for line_number, line in enumerate(file, 1):
+                    try:
+                        yield self._codec.loads(line)
+                    except ValueError as e:
+                        logging.error(
+                            "Skipping corrupt journal line %s:%s: %s",
+                            path,
+                            line_number,
+                            e,
+                        )
+        except FileNotFoundError:
+            pass
+
+
+class StatsJournal(Journal):
+    """
+    Persists User records as a snapshot file plus an append-only journal of the
+    records that changed since the snapshot was written. Only dirty records are
+    appended on each flush, and the journal is folded back into the snapshot by a
+    background compaction once it grows past a size threshold.
+
+    Layout on disk:
+        <snapshot>            {"name": {...}, ...} full record set
+        <journal>.compacting  journal rotated out for an in-flight compaction
+        <journal>             one {"name": {...}} record per line, newest last
+
+    A record of null in the journal deletes the record under that key.
+    """
+
+    def load(self) -> Dict[str, Dict]:
+        """
+        Recovers the latest record set by reading the snapshot and replaying any
+        rotated and live journal entries over it, oldest first.
+        Returns:
+            Dict[str, Dict] of username to serialized User values
+        """
+        records: Dict[str, Dict] = self._read_snapshot(self._snapshot_path)
+        records.update(self.load_journal())
+        return live_records(records)
+
+    def load_journal(self) -> Dict[str, Dict]:
+        """
+        Replays only the rotated and live journals, oldest first
+        Returns:
+            Dict[str, Dict] of username to serialized User values
+        """
+        records: Dict[str, Dict] = {}
+        for path in (self._rotated_path, self._journal_path):
+            for name, values in self._replay(path):
+                records[name] = values
+        return records
+
+    def append(self, records: Dict[str, Dict]) -> int:
+        """
+        Appends changed records to the journal and syncs them to disk
+        Args:
+            records: Dict[str, Dict] of username to serialized User values
+
+        Returns:
+            int number of bytes written
+        """
+        if not records:
+            return 0
+        payload: bytes = self._encode(records)
+        self._write(payload)
+        return len(payload)
+
+    def _encode(self, records: Dict[str, Dict]) -> bytes:
+        """
+        Encodes records as journal entries, one JSON line each
+        Args:
+            records: Dict[str, Dict] of username to serialized User values
+
+        Returns:
+            bytes
+        """
+        return b"".join(
+            self._codec.dumps({name: values}) + b"\n"
+            for name, values in records.items()
+        )
+
+    def _fold(self, path: str) -> int:
+        """
+        Writes a new snapshot with the journaled records applied over the current one
+        Args:
+            path: str rotated journal path
+
+        Returns:
+            int number of records in the new snapshot
+        """
+        records: Dict[str, Dict] = self._read_snapshot(self._snapshot_path)
+        records.update(self._replay(path))
+        records = live_records(records)
+        atomic_write(self._snapshot_path, self._codec.dumps(records))
+        return len(records)
+
+    def write_snapshot(self, records: Dict[str, Dict]) -> None:
+        """
+        Writes a full snapshot directly, used to seed a brand-new store
+        Args:
+            records: Dict[str, Dict] of username to serialized User values
+
+        Returns:
+            None
+        """
+        atomic_write(self._snapshot_path, self._codec.dumps(records))
+
+    def reset(self, records: Dict) -> None:
+        """
+        Replaces the snapshot with a full record set and discards the journals it
+        supersedes, used when migrating stored records
+        Args:
+            records: Dict of username to serialized User values
+
+        Returns:
+            None
+        """
+        with self._journal_mutex:
+            self.write_snapshot(records)
+            for path in (self._rotated_path, self._journal_path):
+                if os.path.exists(path):
+                    os.remove(path)
+
+    def _replay(self, path: str) -> Iterator[Tuple[str, Dict]]:
+        """
+        Yields journal records in write order. A torn final line left by a crash
+        mid-append is skipped.
+        Args:
+            path: str journal path
+
+        Returns:
+            Iterator[Tuple[str, Dict]]
+        """
+        for entry in self._lines(path):
+            yield from entry.items()
+
+
+def live_records(records: Dict) -> Dict:
+    """
+    Drops the records deleted by a journaled tombstone
+    Args:
+        records: Dict of key to record, None or empty for a deleted one
+
+    Returns:
+        Dict
+    """
+    return {key: value for key, value in records.items() if value}
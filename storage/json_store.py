@@ -0,0 +1,204 @@
+import logging
+from threading import RLock
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from data_types import User
+from storage.base import UserStore, merge_duplicates
+from storage.codec import CODEC, Codec
+from storage.journal import StatsJournal
+
+
+class JsonUserStore(UserStore):
+    """
+    UserStore keeping every User in memory, persisted as 'stats.json' plus an
+    append-only journal of dirty records. Every login is indexed on load.
+    """
+
+    def __init__(
+        self,
+        snapshot_path: str,
+        journal_path: str,
+        compact_bytes: int,
+        mutex: Optional[RLock] = None,
+        codec: Codec = CODEC,
+        logins: Optional[Dict[str, str]] = None,
+    ) -> None:
+        super().__init__(mutex, logins)
+        self._snapshot_path: str = snapshot_path
+        self._journal_path: str = journal_path
+        self._journal: StatsJournal = StatsJournal(
+            snapshot_path, journal_path, compact_bytes, codec
+        )
+        self._users: Dict[str, User] = {}
+
+    @property
+    def paths(self) -> Tuple[str, str]:
+        """
+        Gets the snapshot and journal paths backing this store
+        Returns:
+            Tuple[str, str]
+        """
+        return self._snapshot_path, self._journal_path
+
+    def exists(self) -> bool:
+        """
+        Checks whether any persisted state is present for this store
+        Returns:
+            bool
+        """
+        return self._journal.exists()
+
+    def load(self, default_user: Optional[User]) -> None:
+        """
+        Reads the snapshot and journal into memory, migrating records stored under
+        display names, and seeds a brand-new store with the provided User
+        Args:
+            default_user: Optional[User] to create a brand-new store with
+
+        Returns:
+            None
+        """
+        if default_user and not self._journal.exists():
+            self._journal.write_snapshot(default_user.to_dict())
+        users: Dict[str, User] = read_users(*self.paths)
+        if any(key != user.key for key, user in users.items()):
+            self.migrate(merge_duplicates(users.values()))
+        else:
+            self.restore(users)
+
+    def restore(self, users: Dict[str, User]) -> None:
+        """
+        Replaces the in-memory users with ones that were already read from disk
+        Args:
+            users: Dict[str, User] of key to User
+
+        Returns:
+            None
+        """
+        with self._mutex:
+            self._users = users
+            self._index(users.values())
+
+    def migrate(self, users: Dict[str, User]) -> None:
+        """
+        Replaces both the in-memory and persisted users, used once to rewrite
+        records stored under display names into records stored under keys
+        Args:
+            users: Dict[str, User] of key to User
+
+        Returns:
+            None
+        """
+        records: Dict[str, Dict] = {}
+        for user in users.values():
+            records.update(user.to_dict())
+        self._journal.reset(records)
+        self.restore(users)
+        logging.info("Migrated %s users in %s", len(users), self._snapshot_path)
+
+    def _fetch(self, key: str) -> Optional[User]:
+        """
+        Gets a User by the key it is stored under
+        Args:
+            key: str key of the user
+
+        Returns:
+            Optional[User]
+        """
+        return self._users.get(key)
+
+    def _store(self, key: str, user: User) -> None:
+        """
+        Holds a User in memory under its key
+        Args:
+            key: str key of the user
+            user: User to be stored
+
+        Returns:
+            None
+        """
+        self._users[key] = user
+
+    def _evict(self, key: str) -> None:
+        """
+        Drops a User from memory
+        Args:
+            key: str key of the user
+
+        Returns:
+            None
+        """
+        self._users.pop(key, None)
+
+    def values(self) -> Iterator[User]:
+        """
+        Iterates over a copy of the stored Users
+        Returns:
+            Iterator[User]
+        """
+        with self._mutex:
+            users = list(self._users.values())
+        return iter(users)
+
+    def flush(self) -> int:
+        """
+        Appends every dirty User, and a tombstone for every removed one, to the
+        journal, compacting it in the background once it grows too large
+        Returns:
+            int number of records written
+        """
+        with self._flush_mutex:
+            snapshots, removed = self._swap_dirty()
+            if not snapshots and not removed:
+                return 0
+            records: Dict[str, Optional[Dict]] = dict.fromkeys(removed)
+            for user in snapshots:
+                records.update(user.to_dict())
+            self._write_flush(lambda: self._journal.append(records), snapshots, removed)
+        self._journal.maybe_compact()
+        return len(records)
+
+    def _resident(self, name: str) -> Optional[User]:
+        """
+        Gets a User held in memory, which is every stored User
+        Args:
+            name: str key of the user
+
+        Returns:
+            Optional[User]
+        """
+        return self._users.get(name)
+
+    def __len__(self) -> int:
+        return len(self._users)
+
+
+def read_users(snapshot_path: str, journal_path: str) -> Dict[str, User]:
+    """
+    Reads and deserializes every User from a snapshot and its journal. Kept at module
+    level so it can run in a worker process.
+    Args:
+        snapshot_path: str path of the snapshot
+        journal_path: str path of the journal
+
+    Returns:
+        Dict[str, User] of stored key to User
+    """
+    records: Dict[str, Dict] = StatsJournal(snapshot_path, journal_path, 0).load()
+    return {key: User.from_dict(key, value) for key, value in records.items()}
+
+
+def read_legacy_users(paths: Optional[List[str]]) -> Dict[str, User]:
+    """
+    Reads the Users of a JSON store, if there is one, so another backend can import
+    them the first time it is created. Records stored under display names are
+    merged by key.
+    Args:
+        paths: Optional[List[str]] snapshot and journal of the JSON store
+
+    Returns:
+        Dict[str, User] of key to User, empty if there is no JSON store
+    """
+    if not paths or not StatsJournal(*paths, 0).exists():
+        return {}
+    return merge_duplicates(read_users(*paths).values())
@@ -0,0 +1,278 @@
+import logging
+import zlib
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Callable, Dict, Iterator, List, Optional
+
+from data_types import User
+from storage.atomic import atomic_write
+from storage.base import UserStore, merge_duplicates
+from storage.codec import CODEC
+from storage.journal import StatsJournal
+from storage.json_store import JsonUserStore, read_users
+
+
+def shard_for(name: str, shard_count: int) -> int:
+    """
+    Gets the shard a user belongs to. Uses crc32 rather than hash() so the
+    assignment is stable across processes and restarts.
+    Args:
+        name: str key of the user
+        shard_count: int number of shards
+
+    Returns:
+        int shard index
+    """
+    return zlib.crc32(name.encode("utf-8")) % shard_count
+
+
+class ShardedUserStore(UserStore):
+    """
+    UserStore splitting users across several JSON stores by a stable hash of their
+    key. Shards are read in parallel worker processes on load, and each flush only
+    touches the shards holding dirty users, so one busy shard never forces the
+    others to be rewritten. All shards share this store's mutex and login index.
+    """
+
+    def __init__(
+        self,
+        path_format: str,
+        shard_count: int,
+        compact_bytes: int,
+        legacy_paths: Optional[List[str]] = None,
+        workers: Optional[int] = None,
+    ) -> None:
+        """
+        Args:
+            path_format: str path with an {index} field and {suffix} of 'json' or
+                'journal', e.g. '.data/stats.{index}.{suffix}'
+            shard_count: int number of shards
+            compact_bytes: int per-shard journal size that triggers compaction
+            legacy_paths: Optional[List[str]] snapshot and journal of an unsharded
+                store to split up the first time the shards are created
+            workers: Optional[int] number of processes used to load shards
+        """
+        super().__init__()
+        self._shards: List[JsonUserStore] = [
+            JsonUserStore(
+                path_format.format(index=index, suffix="json"),
+                path_format.format(index=index, suffix="journal"),
+                compact_bytes,
+                self._mutex,
+                logins=self._logins,
+            )
+            for index in range(shard_count)
+        ]
+        self._compact_bytes: int = compact_bytes
+        self._legacy_paths: Optional[List[str]] = legacy_paths
+        self._workers: Optional[int] = workers
+
+    def load(self, default_user: Optional[User]) -> None:
+        """
+        Reads every shard in parallel, splitting up an unsharded store the first
+        time the shards are created and seeding the owner's shard with the provided
+        User
+        Args:
+            default_user: Optional[User] to create a brand-new store with
+
+        Returns:
+            None
+        """
+        if not any(shard.exists() for shard in self._shards):
+            self._split_legacy()
+
+        if default_user:
+            owner: JsonUserStore = self._shard(default_user.key)
+            if not owner.exists():
+                StatsJournal(*owner.paths, self._compact_bytes).write_snapshot(
+                    default_user.to_dict()
+                )
+
+        with ProcessPoolExecutor(max_workers=self._workers) as pool:
+            futures: List[Future] = [
+                pool.submit(read_users, *shard.paths) for shard in self._shards
+            ]
+            loaded: List[Dict[str, User]] = [future.result() for future in futures]
+
+        if any(
+            key != user.key or shard_for(key, len(self._shards)) != index
+            for index, users in enumerate(loaded)
+            for key, user in users.items()
+        ):
+            self._migrate(loaded)
+        else:
+            for shard, users in zip(self._shards, loaded):
+                shard.restore(users)
+        logging.info("Loaded %s users from %s shards", len(self), len(self._shards))
+
+    # pylint: disable=protected-access
+    def _fetch(self, key: str) -> Optional[User]:
+        """
+        Gets a User from the shard holding its key
+        Args:
+            key: str key of the user
+
+        Returns:
+            Optional[User]
+        """
+        return self._shard(key)._fetch(key)
+
+    def _store(self, key: str, user: User) -> None:
+        """
+        Holds a User in the shard for its key
+        Args:
+            key: str key of the user
+            user: User to be stored
+
+        Returns:
+            None
+        """
+        shard: JsonUserStore = self._shard(key)
+        shard._removed.discard(key)
+        shard._store(key, user)
+
+    def _evict(self, key: str) -> None:
+        """
+        Drops a User from the shard holding its key
+        Args:
+            key: str key of the user
+
+        Returns:
+            None
+        """
+        self._shard(key)._evict(key)
+
+    def _remove(self, key: str) -> None:
+        """
+        Drops a User from the shard holding its key and records its removal there
+        Args:
+            key: str key of the user
+
+        Returns:
+            None
+        """
+        self._shard(key)._remove(key)
+
+    @property
+    def dirty_count(self) -> int:
+        """
+        Gets the number of users changed since the last flush across every shard
+        Returns:
+            int
+        """
+        return sum(shard.dirty_count for shard in self._shards)
+
+    @property
+    def bytes_written(self) -> int:
+        """
+        Gets the total number of bytes written by every shard
+        Returns:
+            int
+        """
+        return sum(shard.bytes_written for shard in self._shards)
+
+    def set_dirty_listener(self, listener: Optional[Callable[[int], None]]) -> None:
+        """
+        Registers a callback invoked with the dirty count of the whole store
+        whenever a user in any shard is marked dirty
+        Args:
+            listener: Optional[Callable[[int], None]] callback, or None to remove it
+
+        Returns:
+            None
+        """
+        for shard in self._shards:
+            shard.set_dirty_listener(
+                (lambda _: listener(self.dirty_count)) if listener else None
+            )
+
+    def _mark(self, key: str) -> None:
+        """
+        Flags a user as changed in the shard holding its key
+        Args:
+            key: str key of the changed user
+
+        Returns:
+            None
+        """
+        self._shard(key)._mark(key)
+
+    def values(self) -> Iterator[User]:
+        """
+        Iterates over the Users of every shard
+        Returns:
+            Iterator[User]
+        """
+        for shard in self._shards:
+            yield from shard.values()
+
+    def flush(self) -> int:
+        """
+        Flushes every shard holding dirty users
+        Returns:
+            int number of records written
+        """
+        return sum(shard.flush() for shard in self._shards)
+
+    def _resident(self, name: str) -> Optional[User]:
+        """
+        Gets a User from the shard holding its key
+        Args:
+            name: str key of the user
+
+        Returns:
+            Optional[User]
+        """
+        return self._shard(name)._fetch(name)
+
+    def _shard(self, name: str) -> JsonUserStore:
+        """
+        Gets the shard a key belongs to
+        Args:
+            name: str key of the user
+
+        Returns:
+            JsonUserStore
+        """
+        return self._shards[shard_for(name, len(self._shards))]
+
+    def _migrate(self, loaded: List[Dict[str, User]]) -> None:
+        """
+        Merges users stored under display names, possibly in different shards, and
+        rewrites every shard with the records keyed and placed by their keys
+        Args:
+            loaded: List[Dict[str, User]] users read from each shard
+
+        Returns:
+            None
+        """
+        merged: Dict[str, User] = merge_duplicates(
+            user for users in loaded for user in users.values()
+        )
+        split: List[Dict[str, User]] = [{} for _ in self._shards]
+        for key, user in merged.items():
+            split[shard_for(key, len(self._shards))][key] = user
+        for shard, users in zip(self._shards, split):
+            shard.migrate(users)
+
+    def _split_legacy(self) -> None:
+        """
+        Distributes the records of an unsharded JSON store across fresh shards
+        Returns:
+            None
+        """
+        if not self._legacy_paths:
+            return
+        legacy: StatsJournal = StatsJournal(*self._legacy_paths, self._compact_bytes)
+        if not legacy.exists():
+            return
+        split: List[Dict[str, Dict]] = [{} for _ in self._shards]
+        for name, values in legacy.load().items():
+            split[shard_for(name, len(self._shards))][name] = values
+        for shard, records in zip(self._shards, split):
+            atomic_write(shard.paths[0], CODEC.dumps(records))
+        logging.info(
+            "Split %s into %s shards", self._legacy_paths[0], len(self._shards)
+        )
+
+    def __len__(self) -> int:
+        return sum(len(shard) for shard in self._shards)
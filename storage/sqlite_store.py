@@ -0,0 +1,349 @@
+import logging
+import os
+import sqlite3
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+from weakref import WeakValueDictionary
+
+from data_types import User
+from storage.base import UserStore, merge_duplicates
+from storage.codec import CODEC, Codec
+from storage.hot_set import HotSet
+from storage.json_store import read_legacy_users
+
+
+class SqliteUserStore(UserStore):
+    """
+    UserStore backed by a SQLite database in WAL mode. Users are hydrated on first
+    access into a bounded hot set, so memory stays flat no matter how many users
+    have ever chatted. Dirty users evicted from the hot set are held until the
+    next flush has written them in a single batched transaction, and every evicted
+    user stays reachable by weak reference while a handler still holds it, so
+    changes made to it afterwards are written rather than lost.
+
+    The name column holds each user's key, and an indexed login column lets users
+    be found by name without hydrating them.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        hot_set_size: int,
+        codec: Codec = CODEC,
+        legacy_paths: Optional[List[str]] = None,
+    ) -> None:
+        """
+        Args:
+            path: str database file
+            hot_set_size: int most users held in memory
+            codec: Codec serializing each user's data column
+            legacy_paths: Optional[List[str]] snapshot and journal of a JSON store
+                to import the first time the database is created
+        """
+        super().__init__()
+        self._path: str = path
+        self._codec: Codec = codec
+        self._legacy_paths: Optional[List[str]] = legacy_paths
+        self._connection: Optional[sqlite3.Connection] = None
+        self._hot: HotSet[User] = HotSet(hot_set_size)
+        self._pending: Dict[str, User] = {}
+        self._flushing: Dict[str, User] = {}
+        self._evicted: "WeakValueDictionary[str, User]" = WeakValueDictionary()
+
+    def load(self, default_user: Optional[User]) -> None:
+        """
+        Opens the database, creating it from the JSON store if there is one and
+        otherwise seeding it with the provided User
+        Args:
+            default_user: Optional[User] to create a brand-new store with
+
+        Returns:
+            None
+        """
+        created: bool = not os.path.exists(self._path)
+        connection: sqlite3.Connection = sqlite3.connect(
+            self._path, check_same_thread=False
+        )
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS users "
+            "(name TEXT PRIMARY KEY, data TEXT, login TEXT)"
+        )
+        columns: Set[str] = {
+            row[1] for row in connection.execute("PRAGMA table_info(users)")
+        }
+        if "login" not in columns:
+            self._migrate(connection)
+        connection.execute("CREATE INDEX IF NOT EXISTS users_login ON users (login)")
+        if created:
+            self._import(connection, read_legacy_users(self._legacy_paths))
+        with self._mutex:
+            self._connection = connection
+            if (
+                default_user
+                and not connection.execute("SELECT 1 FROM users LIMIT 1").fetchone()
+            ):
+                self.add(default_user)
+                self.flush()
+
+    def _migrate(self, connection: sqlite3.Connection) -> None:
+        """
+        Adds the login column to a table created before users were keyed by id,
+        merging the rows of users stored under differently cased names
+        Args:
+            connection: sqlite3.Connection to the database
+
+        Returns:
+            None
+        """
+        users: Dict[str, User] = merge_duplicates(
+            User.from_dict(name, self._codec.loads(data))
+            for name, data in connection.execute("SELECT name, data FROM users")
+        )
+        with connection:
+            connection.execute("ALTER TABLE users ADD COLUMN login TEXT")
+            connection.execute("DELETE FROM users")
+            connection.executemany(
+                "INSERT INTO users (name, login, data) VALUES (?, ?, ?)",
+                [self._row(user) for user in users.values()],
+            )
+        logging.info("Migrated %s users in %s", len(users), self._path)
+
+    def _import(self, connection: sqlite3.Connection, users: Dict[str, User]) -> None:
+        """
+        Writes the users of another store into a brand-new database
+        Args:
+            connection: sqlite3.Connection to the database
+            users: Dict[str, User] of key to User
+
+        Returns:
+            None
+        """
+        if not users:
+            return
+        with connection:
+            connection.executemany(
+                "INSERT INTO users (name, login, data) VALUES (?, ?, ?)",
+                [self._row(user) for user in users.values()],
+            )
+        logging.info("Imported %s users into %s", len(users), self._path)
+
+    def _fetch(self, key: str) -> Optional[User]:
+        """
+        Gets a User by key from memory, or hydrates it from the database into the
+        hot set
+        Args:
+            key: str key of the user
+
+        Returns:
+            Optional[User]
+        """
+        with self._mutex:
+            user: Optional[User] = self._resident(key)
+            if user is None:
+                row: Optional[Tuple[str]] = self._connection.execute(
+                    "SELECT data FROM users WHERE name = ?", (key,)
+                ).fetchone()
+                if row is None:
+                    return None
+                user = User.from_dict(key, self._codec.loads(row[0]))
+            self._cache(key, user)
+            return user
+
+    def _store(self, key: str, user: User) -> None:
+        """
+        Holds a User in the hot set until it is flushed
+        Args:
+            key: str key of the user
+            user: User to be stored
+
+        Returns:
+            None
+        """
+        self._cache(key, user)
+
+    def _evict(self, key: str) -> None:
+        """
+        Drops a User from memory
+        Args:
+            key: str key of the user
+
+        Returns:
+            None
+        """
+        self._hot.pop(key)
+        self._pending.pop(key, None)
+        self._evicted.pop(key, None)
+
+    def _lookup_login(self, login: str) -> Optional[str]:
+        """
+        Finds the key of a login through the login column, newest row first
+        Args:
+            login: str normalized login
+
+        Returns:
+            Optional[str]
+        """
+        with self._mutex:
+            row: Optional[Tuple[str]] = self._connection.execute(
+                "SELECT name FROM users WHERE login = ? ORDER BY rowid DESC",
+                (login,),
+            ).fetchone()
+        return row[0] if row else None
+
+    def values(self) -> Iterator[User]:
+        """
+        Iterates over every stored User, hydrating each one in turn
+        Returns:
+            Iterator[User]
+        """
+        with self._mutex:
+            keys: Set[str] = {
+                row[0] for row in self._connection.execute("SELECT name FROM users")
+            }
+            keys.update(self._dirty)
+        for key in keys:
+            user: Optional[User] = self._fetch(key)
+            if user:
+                yield user
+
+    def flush(self) -> int:
+        """
+        Writes every dirty User and deletes every removed one in one transaction
+        Returns:
+            int number of users written
+        """
+        with self._flush_mutex:
+            with self._mutex:
+                self._flushing = self._pending
+                self._pending = {}
+                snapshots, removed = self._swap_dirty()
+            if not snapshots and not removed:
+                self._flushing = {}
+                return 0
+            rows: List[Tuple[str, str, str]] = [self._row(user) for user in snapshots]
+            self._write_flush(
+                lambda: self._write_rows(rows, removed), snapshots, removed
+            )
+        return len(rows)
+
+    def _write_rows(self, rows: List[Tuple[str, str, str]], removed: List[str]) -> int:
+        """
+        Writes the rows of dirty users and deletes removed ones in one transaction
+        Args:
+            rows: List[Tuple[str, str, str]] of key, login and data
+            removed: List[str] keys of removed users
+
+        Returns:
+            int number of bytes of data written
+        """
+        with self._mutex:
+            with self._connection:
+                self._connection.executemany(
+                    "DELETE FROM users WHERE name = ?", [(key,) for key in removed]
+                )
+                self._connection.executemany(
+                    "INSERT OR REPLACE INTO users (name, login, data) VALUES (?, ?, ?)",
+                    rows,
+                )
+            self._flushing = {}
+        return sum(len(data) for _, _, data in rows)
+
+    def _restore_dirty(self, snapshots: List[User], removed: List[str]) -> None:
+        """
+        Marks the users of a flush that failed dirty again, keeping the evicted
+        ones it was writing in memory until they are retried
+        Args:
+            snapshots: List[User] copies taken by _swap_dirty
+            removed: List[str] keys of removed users taken by _swap_dirty
+
+        Returns:
+            None
+        """
+        with self._mutex:
+            for key, user in self._flushing.items():
+                if key not in self._hot:
+                    self._pending.setdefault(key, user)
+            self._flushing = {}
+            super()._restore_dirty(snapshots, removed)
+
+    def _row(self, user: User) -> Tuple[str, str, str]:
+        """
+        Serializes a User into the values of its row
+        Args:
+            user: User to serialize
+
+        Returns:
+            Tuple[str, str, str] of key, login and data
+        """
+        key: str = user.key
+        return (
+            key,
+            user.login,
+            self._codec.dumps(user.to_dict()[key]).decode("utf-8"),
+        )
+
+    def _resident(self, name: str) -> Optional[User]:
+        """
+        Gets a User held in the hot set, waiting to be flushed, or evicted but still
+        referenced elsewhere
+        Args:
+            name: str key of the user
+
+        Returns:
+            Optional[User]
+        """
+        return (
+            self._hot.get(name)
+            or self._pending.get(name)
+            or self._flushing.get(name)
+            or self._evicted.get(name)
+        )
+
+    def close(self) -> None:
+        """
+        Flushes any pending changes and closes the database
+        Returns:
+            None
+        """
+        super().close()
+        with self._mutex:
+            if self._connection:
+                self._connection.close()
+                self._connection = None
+
+    def _cache(self, key: str, user: User) -> None:
+        """
+        Places a user in the hot set. An evicted user is held until the next flush if
+        it still has unsaved changes, and weakly referenced either way.
+        Args:
+            key: str key of the user
+            user: User to cache
+
+        Returns:
+            None
+        """
+        self._pending.pop(key, None)
+        self._evicted.pop(key, None)
+        evicted: Optional[Tuple[str, User]] = self._hot.put(key, user)
+        if evicted:
+            self._evicted[evicted[0]] = evicted[1]
+            if evicted[0] in self._dirty:
+                self._pending[evicted[0]] = evicted[1]
+
+    def __len__(self) -> int:
+        with self._mutex:
+            count: int = self._connection.execute(
+                "SELECT COUNT(*) FROM users"
+            ).fetchone()[0]
+            for key in self._dirty:
+                exists: bool = bool(
+                    self._connection.execute(
+                        "SELECT 1 FROM users WHERE name = ?", (key,)
+                    ).fetchone()
+                )
+                if key in self._removed:
+                    count -= exists
+                elif not exists and self._resident(key) is not None:
+                    count += 1
+        return count
@@ -1,17 +1,21 @@
 """ Entrypoint for Twitchy """
 
 import argparse
-import json
 import logging
 import os
-from json import JSONDecodeError
-from typing import List, Dict, Optional
+import signal
+from threading import Event
+from typing import List, Dict, Optional, Union
 
 import requests
 from requests import Response
 
-from bot import Twitchy
-from util.constants import TOKENS_PATH
+from bot import ChannelGroup, PartitionedTwitchy
+from storage import STORE_BACKENDS
+from storage.atomic import atomic_write
+from storage.codec import CODEC
+from util.constants import METRICS_PORT, TOKENS_PATH, STORAGE_BACKEND
+from util.metrics import MetricsServer
 
 
 def _get_new_refresh_token(
@@ -41,9 +45,9 @@ def _get_new_refresh_token(
         response: Response = requests.post(
             "https://id.twitch.tv/oauth2/token", headers=headers, data=data
         )
-        with open(TOKENS_PATH, "w") as file:
-            file.write(json.dumps(json.loads(response.text), indent=4))
-        return response.json().get("refresh_token", "")
+        tokens: Dict[str, str] = CODEC.loads(response.content)
+        atomic_write(TOKENS_PATH, CODEC.dumps(tokens, pretty=True))
+        return tokens.get("refresh_token", "")
     except requests.exceptions.RequestException as e:
         logging.error("Unable to get refresh token: %s", e)
         return ""
@@ -54,14 +58,14 @@ def _load_tokens(
 ) -> Optional[str]:
     access_token: Optional[str] = None
     try:
-        with open(TOKENS_PATH, "r") as file:
-            data: Dict[str, str] = json.loads(file.read())
+        with open(TOKENS_PATH, "rb") as file:
+            data: Dict[str, str] = CODEC.loads(file.read())
 
         access_token = data.get("access_token")
         refresh_token = data.get("refresh_token", refresh_token)
     except FileNotFoundError as e:
         logging.error("Error opening %s: %s", TOKENS_PATH, e)
-    except JSONDecodeError as e:
+    except ValueError as e:
         logging.error("Error parsing %s: %s", TOKENS_PATH, e)
 
     if not access_token:
@@ -69,20 +73,24 @@ def _load_tokens(
     return access_token
 
 
-def boot() -> None:
+def _argument_parser() -> argparse.ArgumentParser:
     """
-    Twitchy entrypoint
+    Builds the parser of Twitchy's command-line arguments
     Returns:
-        None
+        argparse.ArgumentParser
     """
-    parser = argparse.ArgumentParser(
+    parser: argparse.ArgumentParser = argparse.ArgumentParser(
         description="Initialize Twitchy with command-line arguments."
     )
     parser.add_argument(
         "--username", type=str, help="Twitch username", default="default_username"
     )
     parser.add_argument(
-        "--channel", type=str, help="Twitch channel", default="default_channel"
+        "--channel",
+        type=str,
+        nargs="+",
+        help="Twitch channels, the first owned by --username",
+        default=["default_channel"],
     )
     parser.add_argument(
         "--bot_name", type=str, help="Bot name", default="default_bot_name"
@@ -111,69 +119,166 @@ def boot() -> None:
         help="Token for refreshing access token",
         default="default_refresh_token",
     )
+    parser.add_argument(
+        "--storage",
+        type=str,
+        help="Backend used to persist user stats",
+        choices=list(STORE_BACKENDS),
+        default=STORAGE_BACKEND,
+    )
+    parser.add_argument(
+        "--moderator",
+        action="store_true",
+        help="The bot account is a channel moderator, allowing it to send faster",
+    )
+    parser.add_argument(
+        "--metrics_port",
+        type=int,
+        help="Local port serving Prometheus metrics at /metrics, 0 to disable",
+        default=METRICS_PORT,
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        help="Partition one channel's chat across this many worker processes, "
+        "0 to handle it in this process. Only faster with a free core per worker "
+        "and more chat than one process keeps up with",
+        default=0,
+    )
     parser.add_argument("--debug", action="store_true", help="Enable debug logging")
+    return parser
 
-    args: argparse.Namespace = parser.parse_args()
 
-    # Set logging level
-    logging.basicConfig(
-        level=logging.DEBUG if args.debug else logging.INFO,
-        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-    )
-    logger: logging.Logger = logging.getLogger()
+def _read_environment(args: argparse.Namespace) -> None:
+    """
+    Replaces the account arguments with the TWITCH_BOT environment variable if it
+    is set, which holds them as 7 comma-separated values
+    Args:
+        args: argparse.Namespace parsed command-line arguments
 
+    Returns:
+        None
+
+    Raises:
+        ValueError: if the variable does not hold 7 values
+    """
     env_var: Optional[str] = os.getenv("TWITCH_BOT")
-    if env_var:
-        params: List[str] = env_var.split(",")
-        if len(params) != 7:
-            raise ValueError(
-                "TWITCH_BOT environment variable must contain 7 comma-separated values"
-            )
-        #
-        (
-            username,
-            channel,
-            bot_name,
-            oauth_token,
-            client_id,
-            client_secret,
-            refresh_token,
-        ) = params
-        logger.info("Using parameters from TWITCH_BOT environment variable")
-    else:
-        (
-            username,
-            channel,
-            bot_name,
-            oauth_token,
-            client_id,
-            client_secret,
-            refresh_token,
-        ) = (
+    if not env_var:
+        logging.info("Using parameters from command-line arguments")
+        return
+    params: List[str] = env_var.split(",")
+    if len(params) != 7:
+        raise ValueError(
+            "TWITCH_BOT environment variable must contain 7 comma-separated values"
+        )
+    (
+        args.username,
+        channel,
+        args.bot_name,
+        args.oauth_token,
+        args.client_id,
+        args.client_secret,
+        args.refresh_token,
+    ) = params
+    # Several channels are separated by spaces
+    args.channel = channel.split()
+    logging.info("Using parameters from TWITCH_BOT environment variable")
+
+
+def _start_bot(args: argparse.Namespace) -> Union[ChannelGroup, PartitionedTwitchy]:
+    """
+    Starts the bot in every channel, or partitioned across worker processes
+    Args:
+        args: argparse.Namespace parsed command-line arguments
+
+    Returns:
+        Union[ChannelGroup, PartitionedTwitchy]
+    """
+    if args.workers:
+        bot: PartitionedTwitchy = PartitionedTwitchy(
             args.username,
-            args.channel,
+            f"#{args.channel[0]}",
             args.bot_name,
             args.oauth_token,
             args.client_id,
             args.client_secret,
-            args.refresh_token,
+            args.storage,
+            args.workers,
+            args.moderator,
         )
-        logger.info("Using parameters from command-line arguments")
+        logging.info("Twitchy initialized with %s workers", args.workers)
+        return bot
+    # Every channel after the first is owned by the account of the same name
+    owners: Dict[str, str] = {name: name for name in args.channel}
+    owners[args.channel[0]] = args.username
+    group: ChannelGroup = ChannelGroup(
+        owners,
+        args.bot_name,
+        args.oauth_token,
+        args.client_id,
+        args.client_secret,
+        args.storage,
+        args.moderator,
+    )
+    logging.info("Twitchy initialized in %s channels", len(group.bots))
+    return group
 
-    logger.info("Starting Twitchy")
 
-    new_oauth: Optional[str] = _load_tokens(client_id, client_secret, refresh_token)
-    oauth_token = new_oauth if new_oauth else oauth_token
+def _serve(group: Union[ChannelGroup, PartitionedTwitchy], metrics_port: int) -> None:
+    """
+    Serves metrics until Ctrl+C or SIGTERM, then stops the bot so unsaved stats are
+    flushed before exiting
+    Args:
+        group: Union[ChannelGroup, PartitionedTwitchy] running bot
+        metrics_port: int port serving Prometheus metrics, 0 to disable
 
-    bot: Twitchy = Twitchy(
-        username,
-        f"#{channel}",
-        bot_name,
-        oauth_token,
-        client_id,
-        client_secret,
+    Returns:
+        None
+    """
+    metrics: Optional[MetricsServer] = None
+    if metrics_port:
+        metrics = MetricsServer(group.registries, metrics_port)
+        metrics.start()
+        logging.info("Serving metrics on port %s", metrics.port)
+
+    stopping: Event = Event()
+    signal.signal(signal.SIGTERM, lambda *_: stopping.set())
+    try:
+        while not stopping.wait(1):
+            pass
+    except KeyboardInterrupt:
+        pass
+    if metrics:
+        metrics.stop()
+    group.stop()
+
+
+def boot() -> None:
+    """
+    Twitchy entrypoint
+    Returns:
+        None
+    """
+    parser: argparse.ArgumentParser = _argument_parser()
+    args: argparse.Namespace = parser.parse_args()
+
+    # Set logging level
+    logging.basicConfig(
+        level=logging.DEBUG if args.debug else logging.INFO,
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
     )
-    logger.info("Twitchy initialized %s", bot)
+    _read_environment(args)
+
+    logging.info("Starting Twitchy")
+
+    new_oauth: Optional[str] = _load_tokens(
+        args.client_id, args.client_secret, args.refresh_token
+    )
+    args.oauth_token = new_oauth if new_oauth else args.oauth_token
+
+    if args.workers and len(args.channel) > 1:
+        parser.error("--workers only supports a single channel")
+    _serve(_start_bot(args), args.metrics_port)
 
 
 if __name__ == "__main__":
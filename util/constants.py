@@ -1,5 +1,44 @@
+DATA_DIRECTORY: str = ".data"
+# Every channel after the first keeps its stats in its own directory
+CHANNEL_DIRECTORY_FORMAT: str = ".data/channels/{channel}"
+# Each worker process of a partitioned bot keeps its share of users in its own directory
+PARTITIONS_DIRECTORY: str = ".data/partitions"
+PARTITION_DIRECTORY_FORMAT: str = ".data/partitions/{index}"
 STATS_PATH: str = ".data/stats.json"
+JOURNAL_PATH: str = ".data/stats.journal"
+SQLITE_PATH: str = ".data/stats.db"
+INDEX_PATH: str = ".data/stats.idx"
+INDEX_JOURNAL_PATH: str = ".data/stats.idx.journal"
+# Running polls and broadcasts, kept across restarts
+EVENTS_PATH: str = ".data/events.json"
+EVENTS_JOURNAL_PATH: str = ".data/events.journal"
+SHARD_PATH_FORMAT: str = ".data/stats.{index}.{suffix}"
+SHARD_COUNT: int = 8
 TOKENS_PATH: str = ".data/.tokens.json"
+STORAGE_BACKEND: str = "json"
+HOT_SET_SIZE: int = 10000
 WRITE_DELAY_SECONDS: int = 10
-SPLIT_COMMAND_NAME: int = 0
-SPLIT_COMMAND_ARGS: int = 1
+FLUSH_DIRTY_USERS: int = 500
+INGESTION_WORKERS: int = 4
+INGESTION_QUEUE_SIZE: int = 2000
+# Most chat messages a partitioned bot's reader passes to a worker process at once
+PARTITION_BATCH_SIZE: int = 256
+# Handler threads shared by every channel when running in several at once
+SHARED_HANDLER_THREADS: int = 8
+# Twitch allows 20 chat messages per 30 seconds, or 100 while the bot is a moderator
+OUTBOUND_LIMIT: int = 20
+OUTBOUND_MOD_LIMIT: int = 100
+OUTBOUND_PERIOD_SECONDS: int = 30
+# Twitch allows an account 20 channel joins per 10 seconds
+JOIN_LIMIT: int = 20
+JOIN_PERIOD_SECONDS: int = 10
+OUTBOUND_QUEUE_SIZE: int = 200
+# Polls running at once in one channel, and the least time between two status
+# messages of one poll however fast votes arrive
+MAX_POLLS: int = 5
+POLL_STATUS_SECONDS: int = 15
+CHATTERS_POLL_SECONDS: int = 5
+# Local Prometheus endpoint, 0 disables it
+METRICS_PORT: int = 9464
+JOURNAL_COMPACT_BYTES: int = 4 * 1024 * 1024
+EVENTS_COMPACT_BYTES: int = 1024 * 1024
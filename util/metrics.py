@@ -0,0 +1,525 @@
+""" In-process metrics rendered in the Prometheus text exposition format """
+
+import bisect
+import logging
+import math
+from abc import ABC, abstractmethod
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Lock, Thread
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+# Histogram buckets are log-linear, like an HDR histogram: every power of two from
+# about 1 microsecond to 128 seconds is split into SUB_BUCKETS equal steps, so any
+# latency is placed within roughly 1 / SUB_BUCKETS of its true value.
+MIN_EXPONENT: int = -19
+MAX_EXPONENT: int = 7
+SUB_BUCKETS: int = 4
+BOUNDS: Tuple[float, ...] = (math.ldexp(0.5, MIN_EXPONENT),) + tuple(
+    math.ldexp(0.5 + (step + 1) / (2 * SUB_BUCKETS), exponent)
+    for exponent in range(MIN_EXPONENT, MAX_EXPONENT + 1)
+    for step in range(SUB_BUCKETS)
+)
+
+COUNTER: str = "counter"
+GAUGE: str = "gauge"
+HISTOGRAM: str = "histogram"
+CONTENT_TYPE: str = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(
+    names: Tuple[str, ...],
+    values: Tuple[str, ...],
+    extra: str = "",
+    const: Tuple[Tuple[str, str], ...] = (),
+) -> str:
+    pairs: List[str] = [
+        f'{name}="{_escape(value)}"' for name, value in (*const, *zip(names, values))
+    ]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    value = float(value)
+    if value == math.inf:
+        return "+Inf"
+    return str(int(value)) if value.is_integer() else repr(value)
+
+
+class _CounterChild:
+    """
+    One labelled series of a Counter
+    """
+
+    __slots__ = ("value", "_mutex")
+
+    def __init__(self) -> None:
+        self.value: float = 0.0
+        self._mutex: Lock = Lock()
+
+    def inc(self, amount: float = 1.0) -> None:
+        """
+        Adds to the counter
+        Args:
+            amount: float to add, never negative
+
+        Returns:
+            None
+        """
+        with self._mutex:
+            self.value += amount
+
+
+class _HistogramChild:
+    """
+    One labelled series of a Histogram, counting observations per bucket
+    """
+
+    __slots__ = ("counts", "total", "_mutex")
+
+    def __init__(self) -> None:
+        self.counts: List[int] = [0] * (len(BOUNDS) + 1)
+        self.total: float = 0.0
+        self._mutex: Lock = Lock()
+
+    def observe(self, value: float) -> None:
+        """
+        Records one observation
+        Args:
+            value: float observed, usually seconds
+
+        Returns:
+            None
+        """
+        index: int = bisect.bisect_left(BOUNDS, value)
+        with self._mutex:
+            self.counts[index] += 1
+            self.total += value
+
+    def merge(self, counts: List[int], total: float) -> None:
+        """
+        Adds observations recorded elsewhere, such as by another process
+        Args:
+            counts: List[int] per bucket, as returned by snapshot
+            total: float sum of the observations
+
+        Returns:
+            None
+        """
+        with self._mutex:
+            self.counts = [mine + theirs for mine, theirs in zip(self.counts, counts)]
+            self.total += total
+
+    def quantile(self, fraction: float) -> float:
+        """
+        Estimates a quantile as the upper bound of the bucket it falls in
+        Args:
+            fraction: float between 0 and 1, e.g. 0.99
+
+        Returns:
+            float, 0 if nothing was observed
+        """
+        counts, _ = self.snapshot()
+        rank: float = fraction * sum(counts)
+        seen: int = 0
+        for index, count in enumerate(counts):
+            seen += count
+            if count and seen >= rank:
+                return BOUNDS[index] if index < len(BOUNDS) else math.inf
+        return 0.0
+
+    def snapshot(self) -> Tuple[List[int], float]:
+        """
+        Gets a consistent copy of the bucket counts and sum
+        Returns:
+            Tuple[List[int], float]
+        """
+        with self._mutex:
+            return list(self.counts), self.total
+
+
+class _Metric(ABC):
+    """
+    A named family of series
+    """
+
+    KIND: str = ""
+
+    def __init__(self, name: str, description: str, labels: Tuple[str, ...]) -> None:
+        self.name: str = name
+        self.description: str = description
+        self.kind: str = self.KIND
+        self.const_labels: Tuple[Tuple[str, str], ...] = ()
+        self._label_names: Tuple[str, ...] = labels
+
+    def _label_text(self, values: Tuple[str, ...], extra: str = "") -> str:
+        return _labels(self._label_names, values, extra, self.const_labels)
+
+    @abstractmethod
+    def render_series(self) -> List[str]:
+        """
+        Renders every series of the family, without its HELP and TYPE lines
+        Returns:
+            List[str] lines
+        """
+        raise NotImplementedError
+
+
+class _LabelledMetric(_Metric, ABC):
+    """
+    A family of series recorded in process, one per combination of label values
+    """
+
+    def __init__(self, name: str, description: str, labels: Tuple[str, ...]) -> None:
+        super().__init__(name, description, labels)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        self._mutex: Lock = Lock()
+        if not labels:
+            # Unlabelled series are exported from the start, even while still zero
+            self._children[()] = self._new_child()
+
+    def _child(self, values: Tuple[str, ...]) -> object:
+        child: Optional[object] = self._children.get(values)
+        if child is None:
+            if len(values) != len(self._label_names):
+                raise ValueError(
+                    f"{self.name} expects labels {self._label_names}, got {values}"
+                )
+            with self._mutex:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    @abstractmethod
+    def _new_child(self) -> object:
+        """
+        Creates the series of one combination of label values
+        Returns:
+            object
+        """
+        raise NotImplementedError
+
+    def _series(self) -> List[Tuple[Tuple[str, ...], object]]:
+        with self._mutex:
+            return sorted(self._children.items())
+
+
+class Counter(_LabelledMetric):
+    """
+    Monotonically increasing total, optionally split by labels
+    """
+
+    KIND: str = COUNTER
+
+    def _new_child(self) -> _CounterChild:
+        return _CounterChild()
+
+    def labels(self, *values: str) -> _CounterChild:
+        """
+        Gets the series for a combination of label values, creating it on first use
+        Args:
+            *values: str label values, in the order the labels were declared
+
+        Returns:
+            _CounterChild
+        """
+        return self._child(values)
+
+    def inc(self, amount: float = 1.0) -> None:
+        """
+        Adds to an unlabelled counter
+        Args:
+            amount: float to add
+
+        Returns:
+            None
+        """
+        self._child(()).inc(amount)
+
+    def render_series(self) -> List[str]:
+        return [
+            f"{self.name}{self._label_text(values)} {_number(child.value)}"
+            for values, child in self._series()
+        ]
+
+
+class Histogram(_LabelledMetric):
+    """
+    Distribution of observations, typically latencies in seconds, over log-linear
+    buckets shared by every histogram
+    """
+
+    KIND: str = HISTOGRAM
+
+    def _new_child(self) -> _HistogramChild:
+        return _HistogramChild()
+
+    def labels(self, *values: str) -> _HistogramChild:
+        """
+        Gets the series for a combination of label values, creating it on first use
+        Args:
+            *values: str label values, in the order the labels were declared
+
+        Returns:
+            _HistogramChild
+        """
+        return self._child(values)
+
+    def quantile(self, fraction: float) -> float:
+        """
+        Estimates a quantile of an unlabelled histogram
+        Args:
+            fraction: float between 0 and 1, e.g. 0.99
+
+        Returns:
+            float
+        """
+        return self._child(()).quantile(fraction)
+
+    def observe(self, value: float) -> None:
+        """
+        Records one observation in an unlabelled histogram
+        Args:
+            value: float observed
+
+        Returns:
+            None
+        """
+        self._child(()).observe(value)
+
+    def render_series(self) -> List[str]:
+        lines: List[str] = []
+        for values, child in self._series():
+            counts, total = child.snapshot()
+            cumulative: int = 0
+            for bound, count in zip(BOUNDS + (math.inf,), counts):
+                cumulative += count
+                le: str = "+Inf" if bound == math.inf else f"{bound:.6g}"
+                labels: str = self._label_text(values, f'le="{le}"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            label_text: str = self._label_text(values)
+            lines.append(f"{self.name}_sum{label_text} {_number(total)}")
+            lines.append(f"{self.name}_count{label_text} {cumulative}")
+        return lines
+
+
+class Callback(_Metric):
+    """
+    Counter or gauge whose value is read from a function at scrape time, for totals
+    a component already keeps such as queue depths
+    """
+
+    def __init__(
+        self, name: str, description: str, kind: str, read: Callable[[], float]
+    ) -> None:
+        super().__init__(name, description, ())
+        self.kind = kind
+        self._read: Callable[[], float] = read
+
+    def render_series(self) -> List[str]:
+        return [f"{self.name}{self._label_text(())} {_number(self._read())}"]
+
+
+class Registry:
+    """
+    Collection of metrics rendered together for one scrape. Labels given to the
+    registry are added to every series in it, so several registries holding the
+    same metrics, such as one per channel, can be served side by side.
+    """
+
+    def __init__(self, labels: Optional[Dict[str, str]] = None) -> None:
+        """
+        Args:
+            labels: Optional[Dict[str, str]] added to every series
+        """
+        self._metrics: Dict[str, _Metric] = {}
+        self._labels: Tuple[Tuple[str, str], ...] = tuple((labels or {}).items())
+        self._mutex: Lock = Lock()
+
+    def _register(self, metric: _Metric) -> _Metric:
+        metric.const_labels = self._labels
+        with self._mutex:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} is already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(
+        self, name: str, description: str, labels: Tuple[str, ...] = ()
+    ) -> Counter:
+        """
+        Registers a counter
+        Args:
+            name: str metric name, ending in _total
+            description: str help text
+            labels: Tuple[str, ...] label names
+
+        Returns:
+            Counter
+        """
+        return self._register(Counter(name, description, labels))
+
+    def histogram(
+        self, name: str, description: str, labels: Tuple[str, ...] = ()
+    ) -> Histogram:
+        """
+        Registers a histogram
+        Args:
+            name: str metric name, ending in the unit such as _seconds
+            description: str help text
+            labels: Tuple[str, ...] label names
+
+        Returns:
+            Histogram
+        """
+        return self._register(Histogram(name, description, labels))
+
+    def callback(
+        self, name: str, description: str, kind: str, read: Callable[[], float]
+    ) -> Callback:
+        """
+        Registers a value read from a function whenever the registry is rendered
+        Args:
+            name: str metric name
+            description: str help text
+            kind: str COUNTER or GAUGE
+            read: Callable[[], float] returning the current value
+
+        Returns:
+            Callback
+        """
+        return self._register(Callback(name, description, kind, read))
+
+    def get(self, name: str) -> Optional[_Metric]:
+        """
+        Gets a registered metric by name
+        Args:
+            name: str metric name
+
+        Returns:
+            Optional[_Metric]
+        """
+        with self._mutex:
+            return self._metrics.get(name)
+
+    def metrics(self) -> List[_Metric]:
+        """
+        Gets every registered metric, in registration order
+        Returns:
+            List[_Metric]
+        """
+        with self._mutex:
+            return list(self._metrics.values())
+
+    def render(self) -> str:
+        """
+        Renders every metric in the Prometheus text format
+        Returns:
+            str
+        """
+        return render([self])
+
+
+def render(registries: Sequence[Registry]) -> str:
+    """
+    Renders several registries as one scrape, merging families of the same name
+    Args:
+        registries: Sequence[Registry] to render
+
+    Returns:
+        str in the Prometheus text format
+    """
+    families: Dict[str, List[_Metric]] = {}
+    for registry in registries:
+        for metric in registry.metrics():
+            families.setdefault(metric.name, []).append(metric)
+    lines: List[str] = []
+    for name, metrics in families.items():
+        lines.append(f"# HELP {name} {metrics[0].description}")
+        lines.append(f"# TYPE {name} {metrics[0].kind}")
+        for metric in metrics:
+            try:
+                lines.extend(metric.render_series())
+            except Exception as e:
+                logging.error("Error rendering metric %s: %s", name, e)
+    return "\n".join(lines) + "\n"
+
+
+class MetricsServer:
+    """
+    Serves one or more Registries at /metrics over HTTP from a background thread
+    """
+
+    def __init__(
+        self, registries: Sequence[Registry], port: int, host: str = "127.0.0.1"
+    ) -> None:
+        """
+        Args:
+            registries: Sequence[Registry] to serve
+            port: int to listen on, 0 picks a free port
+            host: str interface to bind, local only by default
+        """
+        served: List[Registry] = list(registries)
+
+        class Handler(BaseHTTPRequestHandler):
+            """
+            Answers scrapes of /metrics
+            """
+
+            def do_GET(self) -> None:  # pylint: disable=invalid-name
+                """
+                Handles a GET request
+                Returns:
+                    None
+                """
+                if self.path.split("?", 1)[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body: bytes = render(served).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", CONTENT_TYPE)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format: str, *args) -> None:  # pylint: disable=W0622
+                if logging.getLogger().isEnabledFor(logging.DEBUG):
+                    logging.debug("Metrics request: %s", format % args)
+
+        self._server: ThreadingHTTPServer = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        self._thread: Thread = Thread(
+            target=self._server.serve_forever, name="metrics", daemon=True
+        )
+
+    @property
+    def port(self) -> int:
+        """
+        Gets the port being listened on
+        Returns:
+            int
+        """
+        return self._server.server_address[1]
+
+    def start(self) -> None:
+        """
+        Starts serving
+        Returns:
+            None
+        """
+        self._thread.start()
+
+    def stop(self) -> None:
+        """
+        Stops serving and closes the socket
+        Returns:
+            None
+        """
+        if self._thread.is_alive():
+            self._server.shutdown()
+            self._thread.join()
+        self._server.server_close()
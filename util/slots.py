@@ -0,0 +1,57 @@
+import dataclasses
+from typing import Any, Dict, Optional, Tuple, Type, TypeVar
+
+T = TypeVar("T")
+
+
+def slotted(cls: Optional[Type[T]] = None, *, weakref_slot: bool = False) -> Any:
+    """
+    Rebuilds a dataclass with __slots__ so instances carry no per-instance __dict__,
+    equivalent to @dataclass(slots=True) on Python 3.10+. Apply it above @dataclass,
+    bare or as @slotted(weakref_slot=True) for instances that can be weakly
+    referenced. Only fields not already slotted by a base class are added, and field
+    defaults live on in the generated __init__.
+    Args:
+        cls: dataclass to rebuild
+        weakref_slot: bool whether to add a __weakref__ slot
+
+    Returns:
+        Type[T] slotted copy of the class, or a decorator making one
+    """
+    if cls is None:
+        return lambda wrapped: _rebuild(wrapped, weakref_slot)
+    return _rebuild(cls, weakref_slot)
+
+
+def _rebuild(cls: Type[T], weakref_slot: bool) -> Type[T]:
+    inherited: set = set()
+    for base in cls.__mro__[1:]:
+        inherited.update(getattr(base, "__slots__", ()))
+
+    all_names: Tuple[str, ...] = tuple(field.name for field in dataclasses.fields(cls))
+    namespace: Dict[str, Any] = dict(cls.__dict__)
+    slots: Tuple[str, ...] = tuple(name for name in all_names if name not in inherited)
+    if weakref_slot and "__weakref__" not in inherited:
+        slots += ("__weakref__",)
+    namespace["__slots__"] = slots
+    for name in all_names:
+        namespace.pop(name, None)
+    namespace.pop("__dict__", None)
+    namespace.pop("__weakref__", None)
+    if cls.__dataclass_params__.frozen:
+        namespace["__getstate__"] = _get_state
+        namespace["__setstate__"] = _set_state
+
+    rebuilt = type(cls)(cls.__name__, cls.__bases__, namespace)
+    rebuilt.__qualname__ = cls.__qualname__
+    return rebuilt
+
+
+def _get_state(self) -> Tuple[Any, ...]:
+    return tuple(getattr(self, field.name) for field in dataclasses.fields(self))
+
+
+def _set_state(self, state: Tuple[Any, ...]) -> None:
+    # Frozen dataclasses reject setattr, so pickling restores fields directly
+    for field, value in zip(dataclasses.fields(self), state):
+        object.__setattr__(self, field.name, value)